@@ -0,0 +1,235 @@
+"""
+Command line entry, every subcommand imports only what it needs.
+`--profile-memory` before the subcommand adds allocation peaks to the metrics report.
+
+    python cli.py run          # convert, download and restore, same as main.py
+    python cli.py convert      # 1-SourceFile -> 2-ConvertedParatranzFile, --dedup to share identical originals
+    python cli.py restore      # 3-TranslatedParatranzFile -> 4-SourceTranslatedFile, --pack for one zip per mod
+    python cli.py progress     # translated / missing entries per mod, folder and file type
+    python cli.py merge        # combine outputs of `convert --shard i/N` / `restore --shard i/N` runs
+    python cli.py pull         # download translated files from Paratranz
+    python cli.py push         # upload converted files to Paratranz
+    python cli.py delta        # translations added / removed / changed between two exports
+    python cli.py sync-wiki    # same as sync.py
+    python cli.py wash         # change source files to utf-8
+    python cli.py watch        # reconvert source files on change
+    python cli.py bench        # convert / restore scaling on synthetic trees, --codec for the json backends
+    python cli.py verify       # source files survive convert -> restore unchanged
+    python cli.py standin      # offline paratranz api, point PARATRANZ_BASE_URL to it
+    python cli.py daemon       # local http api converting / restoring / previewing single files
+"""
+import argparse
+import asyncio
+from pathlib import Path
+from typing import Callable, Sequence
+
+
+def _run(args: argparse.Namespace):
+    from main import main
+
+    asyncio.run(main())
+
+
+def _convert(args: argparse.Namespace):
+    from src.config import settings
+    from src.core import Project
+
+    if args.dedup:
+        settings.dedup.enabled = True
+    Project().convert(prune=not args.keep, shard=_shard(args.shard))
+
+
+def _restore(args: argparse.Namespace):
+    from src.config import settings
+    from src.core import Project
+
+    if args.pack or args.compression:
+        settings.pack.enabled = True
+        settings.pack.compression = args.compression or settings.pack.compression
+    Project().restore(prune=not args.keep, shard=_shard(args.shard))
+    _progress(args)
+
+
+def _progress(args: argparse.Namespace):
+    from src.progress import Progress
+
+    progress = Progress()
+    progress.update()
+    progress.save()
+
+
+def _shard(spec: str | None):
+    from src.shard import Shard
+
+    return Shard.parse(spec) if spec else None
+
+
+def _merge(args: argparse.Namespace):
+    from src.shard import merge
+
+    merge(args.stage, args.roots, prune=not args.keep)
+
+
+def _pull(args: argparse.Namespace):
+    import httpx
+
+    from src.config import settings
+    from src.core import Project
+    from src.paratranz import Paratranz
+
+    Project.clean(settings.filepath.root / settings.filepath.tmp)
+    with httpx.Client() as client:
+        Paratranz(client=client).download(prune=not args.keep)
+
+
+def _push(args: argparse.Namespace):
+    import httpx
+
+    from src.paratranz import Paratranz
+
+    with httpx.Client() as client:
+        if Paratranz(client=client).upload():
+            raise SystemExit(1)
+
+
+def _delta(args: argparse.Namespace):
+    from src.delta import report
+
+    report(args.old, args.new, format=args.format, filepath=args.output)
+
+
+def _sync_wiki(args: argparse.Namespace):
+    from sync import main
+
+    asyncio.run(main(force=args.force))
+
+
+def _wash(args: argparse.Namespace):
+    from src.core import Project
+
+    Project.wash_encoding()
+
+
+def _watch(args: argparse.Namespace):
+    from src.watch import SourceWatcher
+
+    SourceWatcher().run()
+
+
+def _bench(args: argparse.Namespace):
+    from src.benchmark import Benchmark, CodecBenchmark
+    from src.core import FileType
+
+    if args.codec:
+        benchmark = CodecBenchmark()
+        benchmark.run()
+        benchmark.save()
+        return
+
+    benchmark = Benchmark(args.sizes, [FileType[_] for _ in args.types] if args.types else list(FileType), seed=args.seed, keep=args.keep)
+    benchmark.run()
+    benchmark.save()
+
+
+def _verify(args: argparse.Namespace):
+    from src.verify import Verification
+
+    verification = Verification(jobs=args.jobs)
+    verification.run()
+    verification.save()
+    if not verification.ok:
+        raise SystemExit(1)
+
+
+def _standin(args: argparse.Namespace):
+    from src.standin import serve
+
+    serve(args)
+
+
+def _daemon(args: argparse.Namespace):
+    from src.daemon import Daemon
+
+    Daemon(**{key: value for key in ("host", "port") if (value := getattr(args, key)) is not None}).serve_forever()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="半自动化汉化 Minecraft 模组小工具")
+    parser.add_argument("--profile-memory", action="store_true", help="trace allocations, report peaks per stage and file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add(name: str, function: Callable[[argparse.Namespace], None], help_: str) -> argparse.ArgumentParser:
+        subparser = subparsers.add_parser(name, help=help_)
+        subparser.set_defaults(function=function)
+        return subparser
+
+    add("run", _run, "convert, download and restore")
+    convert = add("convert", _convert, "convert source files to paratranz files")
+    convert.add_argument("--keep", action="store_true", help="keep converted files whose source is gone")
+    convert.add_argument("--shard", metavar="i/N", help="only files hashing to shard i of N, see merge")
+    convert.add_argument("--dedup", action="store_true", help="untranslated identical originals go once to a shared file per mod")
+    restore = add("restore", _restore, "restore downloaded paratranz files to source files")
+    restore.add_argument("--keep", action="store_true", help="keep restored files whose download is gone")
+    restore.add_argument("--shard", metavar="i/N", help="only files hashing to shard i of N, see merge")
+    restore.add_argument("--pack", action="store_true", help="write one zip per mod instead of loose files")
+    restore.add_argument("--compression", choices=["stored", "deflated", "bzip2", "lzma"], help="compression of the zips, implies --pack")
+    add("progress", _progress, "count translated and missing entries of the downloaded files")
+    merge = add("merge", _merge, "combine the outputs of sharded convert or restore runs")
+    merge.add_argument("stage", choices=["convert", "restore"])
+    merge.add_argument("roots", type=Path, nargs="+", help="root folder of every shard, with its output folder and data/shards")
+    merge.add_argument("--keep", action="store_true", help="keep output files no shard wrote")
+    add("pull", _pull, "download translated files from paratranz").add_argument(
+        "--keep", action="store_true", help="keep downloaded files no longer in the export"
+    )
+    add("push", _push, "upload converted files to paratranz")
+    delta = add("delta", _delta, "report translations added, removed and changed between two paratranz exports")
+    delta.add_argument("old", type=Path, help="export zip or folder like 3-TranslatedParatranzFile")
+    delta.add_argument("new", type=Path, help="export zip or folder like 3-TranslatedParatranzFile")
+    delta.add_argument("--format", choices=["jsonl", "markdown"], default="jsonl")
+    delta.add_argument("--output", type=Path, help="report file, data/reports by default")
+    add("sync-wiki", _sync_wiki, "sync LoTRWiki terms with paratranz").add_argument(
+        "--force", action="store_true", help="fetch the wiki again even if translations.json exists"
+    )
+    add("wash", _wash, "change non utf-8 source files to utf-8")
+    add("watch", _watch, "reconvert source files when they change")
+    bench = add("bench", _bench, "benchmark convert and restore on synthetic trees")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="entries per file type, up to 1000000")
+    bench.add_argument("--types", nargs="+", help="file type names, all by default")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--keep", action="store_true", help="keep the synthetic trees in the temp folder")
+    bench.add_argument("--codec", action="store_true", help="compare the json backends on the converted and downloaded files instead")
+    add("verify", _verify, "round trip every source file through convert and restore in memory").add_argument(
+        "--jobs", type=int, help="worker processes, one per cpu by default"
+    )
+    standin = add("standin", _standin, "serve an offline stand-in of the paratranz api")
+    standin.add_argument("--host")
+    standin.add_argument("--port", type=int)
+    standin.add_argument("--seed-dir", type=Path, help="load paratranz json files from this folder, e.g. 3-TranslatedParatranzFile")
+    standin.add_argument("--latency", type=float, help="seconds added to every response")
+    standin.add_argument("--jitter", type=float, help="random extra seconds up to this")
+    standin.add_argument("--rate-limit", type=float, help="requests per second, 0 for no limit")
+    standin.add_argument("--failure-rate", type=float, help="chance of answering 500")
+    daemon = add("daemon", _daemon, "serve convert, restore and preview of single files over local http")
+    daemon.add_argument("--host")
+    daemon.add_argument("--port", type=int)
+    return parser
+
+
+def main(argv: Sequence[str] | None = None):
+    args = build_parser().parse_args(argv)
+
+    from src.config import settings
+    from src.log import setup_logger
+    from src.metrics import metrics
+
+    setup_logger()
+    if args.profile_memory or settings.project.profile_memory:
+        metrics.profile_memory()
+    try:
+        args.function(args)
+    finally:
+        metrics.finish()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,68 @@
+import asyncio
+import queue
+from pathlib import Path
+
 import httpx
 
 from src.config import settings
 from src.core import Project
+from src.log import setup_logger
+from src.metrics import metrics
 from src.paratranz import Paratranz
+from src.pipeline import Pipeline
+from src.progress import Progress
+
 
+async def main():
+    """
+    clean ─ memory ─┬─ convert
+                    ├─ download ┐
+                    └─ restore ─┘ (each file as soon as it is downloaded)
 
-def main():
+    the translation memory reads the last download before downloading writes over it
+    output folders are updated in place, only files whose sources are gone get removed
+    """
     project = Project()
-    project.clean(
-        settings.filepath.root / settings.filepath.converted,
-        settings.filepath.root / settings.filepath.download,
-        settings.filepath.root / settings.filepath.result,
-        settings.filepath.root / settings.filepath.tmp,
-    )
-    # project.wash_encoding()
-    project.convert()
+    downloaded: queue.Queue[Path | None] = queue.Queue()
+
+    async def clean():
+        await asyncio.to_thread(project.clean, settings.filepath.root / settings.filepath.tmp)
+
+    async def memory():
+        await asyncio.to_thread(project.conversion.load_memory)
+
+    async def convert():
+        # project.wash_encoding()
+        await asyncio.to_thread(project.convert)
+
+    async def download():
+        try:
+            with httpx.Client() as client:
+                paratranz = Paratranz(client=client)
+                await asyncio.to_thread(paratranz.download, downloaded.put)
+        finally:
+            downloaded.put(None)
 
-    with httpx.Client() as client:
-        paratranz = Paratranz(client=client)
-        paratranz.download()
+    async def restore():
+        await asyncio.to_thread(project.restoration.restore_iter, iter(downloaded.get, None))
+        progress = Progress()
+        await asyncio.to_thread(progress.update)
+        progress.save()
 
-    project.restore()
+    pipeline = Pipeline()
+    pipeline.add("clean", clean)
+    pipeline.add("memory", memory, depends=("clean",))
+    pipeline.add("convert", convert, depends=("memory",))
+    pipeline.add("download", download, depends=("memory",))
+    pipeline.add("restore", restore, depends=("memory",))
+    await pipeline.run()
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    setup_logger()
+    if settings.project.profile_memory:
+        metrics.profile_memory()
+    try:
+        asyncio.run(main())
+    finally:
+        metrics.finish()
@@ -1,6 +1,73 @@
-from .config import *
-from .core import *
-from .exception import *
-from .huijiwiki import *
-from .log import *
-from .paratranz import *
+"""Names are imported from their submodules on first access, so heavy dependencies load only when used."""
+import importlib
+
+_EXPORTS = {
+    "Alignment": "align",
+    "LineAligner": "align",
+    "aligner": "align",
+    "Benchmark": "benchmark",
+    "CodecBenchmark": "benchmark",
+    "ParseCache": "cache",
+    "parse_cache": "cache",
+    "Codec": "codec",
+    "codec": "codec",
+    "Settings": "config",
+    "settings": "config",
+    "Project": "core",
+    "Conversion": "core",
+    "Restoration": "core",
+    "FileTypeClassifier": "core",
+    "FileTypeRule": "core",
+    "FormatHandler": "core",
+    "classifier": "core",
+    "handlers": "core",
+    "register_handler": "core",
+    "Daemon": "daemon",
+    "DownloadIndex": "daemon",
+    "Deduplicator": "dedup",
+    "shared_key": "dedup",
+    "Change": "delta",
+    "Export": "delta",
+    "ProjectStructureException": "exception",
+    "ShardException": "exception",
+    "UnknownFileTypeException": "exception",
+    "LoTRWiki": "huijiwiki",
+    "log_enabled": "log",
+    "logger": "log",
+    "setup_logger": "log",
+    "FileMetric": "metrics",
+    "Metrics": "metrics",
+    "StageMetric": "metrics",
+    "metrics": "metrics",
+    "Suggestion": "memory",
+    "TranslationMemory": "memory",
+    "OutputTree": "output",
+    "PackWriter": "pack",
+    "Paratranz": "paratranz",
+    "Pipeline": "pipeline",
+    "PipelineStage": "pipeline",
+    "Counts": "progress",
+    "Progress": "progress",
+    "Issue": "qa",
+    "QAScanner": "qa",
+    "qa": "qa",
+    "ParatranzStandin": "standin",
+    "StandinFile": "standin",
+    "Shard": "shard",
+    "Stage": "store",
+    "CorpusGenerator": "synthetic",
+    "StringStore": "store",
+    "Verification": "verify",
+    "SourceWatcher": "watch",
+}
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+__all__ = list(_EXPORTS)
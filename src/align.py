@@ -0,0 +1,190 @@
+"""Line alignment of reference / translation files whose line count differs from the original."""
+import math
+import re
+from dataclasses import dataclass
+from typing import Sequence
+
+from src.config import settings
+
+NUMBER = re.compile(r"\d+")
+MARKUP = re.compile(r"§.|%(?:\d+\$)?[sd]|\{\d+}|\\n")  # formatting codes survive translation untouched
+WORD = re.compile(r"[^\W\d_]{3,}")
+
+GAP = -0.4  # a line without counterpart
+BLANK = 2.0  # blank lines on both sides, the strongest anchor
+BLANK_MISMATCH = -1.5
+
+
+@dataclass
+class Alignment:
+    index: int | None  # line in the other file, None if the original line has no counterpart
+    confidence: float
+
+
+class _Line:
+    __slots__ = ("blank", "length", "numbers", "markup", "words")
+
+    def __init__(self, line: str, mean: float):
+        line = line.strip()
+        self.blank = not line
+        self.length = len(line) / mean
+        self.numbers = frozenset(NUMBER.findall(line))
+        self.markup = tuple(sorted(MARKUP.findall(line)))
+        self.words = frozenset(_.lower() for _ in WORD.findall(line))
+
+
+class LineAligner:
+    """
+    Banded dynamic programming over lines, like aligning two sequences.
+
+    Blank lines, numbers, formatting codes, shared words and the relative
+    length of a line decide how well two lines match. Lines next to a gap
+    or matching poorly are low confidence, only a window of the other file
+    around where they should be is worth showing for them.
+    """
+    def __init__(
+        self,
+        window: int = settings.align.window,
+        band: int = settings.align.band,
+        confidence: float = settings.align.confidence,
+        max_cells: int = settings.align.max_cells,
+    ):
+        self._window = window
+        self._band = band
+        self._confidence = confidence
+        self._max_cells = max_cells
+
+    def align(self, original: Sequence[str], other: Sequence[str]) -> list[Alignment]:
+        """:return: 与 original 等长，每行在 other 中对应的行号及置信度"""
+        n, m = len(original), len(other)
+        width = abs(n - m) + self.band
+        if not n or not m or n * (2 * width + 1) > self.max_cells:
+            return [Alignment(None, 0.0) for _ in range(n)]
+
+        lines_a = self._lines(original)
+        lines_b = self._lines(other)
+        bounds = [(max(0, round(i * m / n) - width), min(m, round(i * m / n) + width)) for i in range(n + 1)]
+
+        # scores[i][j - lo] is the best score of the first i original lines against the first j other lines
+        # moves: 0 match, 1 original line skipped, 2 other line skipped
+        lo, hi = bounds[0]
+        scores = [[GAP * j for j in range(lo, hi + 1)]]
+        moves = [bytearray([2] * (hi - lo + 1))]
+        for i in range(1, n + 1):
+            (prev_lo, prev_hi), (lo, hi) = bounds[i - 1], bounds[i]
+            prev = scores[-1]
+            row = [0.0] * (hi - lo + 1)
+            move = bytearray(hi - lo + 1)
+            line_a = lines_a[i - 1]
+            for j in range(lo, hi + 1):
+                best, step = -math.inf, 0
+                if j and prev_lo <= j - 1 <= prev_hi:
+                    best = prev[j - 1 - prev_lo] + self._score(line_a, lines_b[j - 1])
+                if prev_lo <= j <= prev_hi and (score := prev[j - prev_lo] + GAP) > best:
+                    best, step = score, 1
+                if j > lo and (score := row[j - 1 - lo] + GAP) > best:
+                    best, step = score, 2
+                row[j - lo] = best
+                move[j - lo] = step
+            scores.append(row)
+            moves.append(move)
+
+        path: list[tuple[int | None, int | None, float]] = []  # (original, other, pair score) from the end
+        i, j = n, m
+        while i or j:
+            step = moves[i][j - bounds[i][0]]
+            if step == 0:
+                path.append((i - 1, j - 1, self._score(lines_a[i - 1], lines_b[j - 1])))
+                i, j = i - 1, j - 1
+            elif step == 1:
+                path.append((i - 1, None, 0.0))
+                i -= 1
+            else:
+                path.append((None, j - 1, 0.0))
+                j -= 1
+        path.reverse()
+        return self._confidences(path, n)
+
+    def _confidences(self, path: list[tuple[int | None, int | None, float]], n: int) -> list[Alignment]:
+        """pairs score on their own, scaled down the closer they are to a gap"""
+        gaps = [idx for idx, (a, b, _) in enumerate(path) if a is None or b is None]
+        result = [Alignment(None, 0.0) for _ in range(n)]
+        cursor = 0
+        for idx, (a, b, score) in enumerate(path):
+            if a is None or b is None:
+                continue
+            while cursor + 1 < len(gaps) and gaps[cursor + 1] < idx:
+                cursor += 1
+            distance = min((abs(idx - gaps[_]) for _ in (cursor, cursor + 1) if _ < len(gaps)), default=math.inf)
+            confidence = min(1.0, max(0.0, score)) * min(1.0, distance / (self.window + 1))
+            result[a] = Alignment(b, confidence)
+        return result
+
+    @staticmethod
+    def _lines(lines: Sequence[str]) -> list[_Line]:
+        lengths = [len(_.strip()) for _ in lines if _.strip()]
+        mean = sum(lengths) / len(lengths) if lengths else 1.0
+        return [_Line(line, mean) for line in lines]
+
+    @staticmethod
+    def _score(a: _Line, b: _Line) -> float:
+        if a.blank or b.blank:
+            return BLANK if a.blank and b.blank else BLANK_MISMATCH
+
+        score = max(0.0, 1 - abs(math.log((a.length or 0.01) / (b.length or 0.01))))
+        if a.numbers or b.numbers:
+            score += 1.0 if a.numbers == b.numbers else -0.5
+        if a.markup or b.markup:
+            score += 1.0 if a.markup == b.markup else -0.5
+        if a.words and b.words:
+            score += 2 * len(a.words & b.words) / len(a.words | b.words)
+        return score
+
+    def confident(self, alignment: Alignment) -> bool:
+        return alignment.index is not None and alignment.confidence >= self.confidence
+
+    def window_of(self, other: Sequence[str], alignments: list[Alignment], idx: int) -> str:
+        """lines of the other file around where the original line `idx` should be"""
+        center = alignments[idx].index
+        if center is None:  # next to the previous aligned line, or proportionally
+            previous = next((_.index for _ in reversed(alignments[:idx]) if _.index is not None), None)
+            center = previous + 1 if previous is not None else round(idx * len(other) / max(1, len(alignments)))
+        start, end = max(0, center - self.window), min(len(other), center + self.window + 1)
+        return "\n".join(_.strip() for _ in other[start:end])
+
+    def uncertain(self, alignments: list[Alignment]) -> list[tuple[int, int]]:
+        """ranges of original lines, both ends included, that are low confidence"""
+        ranges = []
+        for idx, alignment in enumerate(alignments):
+            if self.confident(alignment):
+                continue
+            if ranges and ranges[-1][1] == idx - 1:
+                ranges[-1] = (ranges[-1][0], idx)
+            else:
+                ranges.append((idx, idx))
+        return ranges
+
+    @property
+    def window(self) -> int:
+        return self._window
+
+    @property
+    def band(self) -> int:
+        return self._band
+
+    @property
+    def confidence(self) -> float:
+        return self._confidence
+
+    @property
+    def max_cells(self) -> int:
+        return self._max_cells
+
+
+aligner = LineAligner()
+
+__all__ = [
+    "Alignment",
+    "LineAligner",
+    "aligner",
+]
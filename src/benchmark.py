@@ -0,0 +1,297 @@
+"""
+Scaling benchmark of convert / restore on synthetic trees, and of the json backends on the real files.
+
+    python -m src.benchmark --sizes 1000 10000 100000 --types LANG LOTR_LEGACY_SPEECH
+    python -m src.benchmark --codec
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Sequence
+
+from src.codec import Codec, orjson
+from src.config import settings
+from src.core import FileType
+from src.log import logger, setup_logger
+from src.metrics import DIR_REPORTS
+from src.synthetic import CorpusGenerator
+
+SUPERLINEAR = 1.5  # time exponent between two sizes above which a path is flagged
+
+
+def _peak_memory() -> int:
+    """peak resident memory of this process in bytes"""
+    status = Path("/proc/self/status")
+    if status.exists():  # linux keeps ru_maxrss of the parent across exec, VmHWM starts fresh
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _child(stage: str):
+    """run one stage in a fresh interpreter, `PATH_ROOT` points to the synthetic tree"""
+    try:
+        import resource  # noqa: F401
+        tracing = False
+    except ImportError:  # windows
+        import tracemalloc
+        tracemalloc.start()
+        tracing = True
+
+    from src.core import Conversion, Restoration
+
+    start = time.perf_counter()
+    if stage == "convert":
+        Conversion().convert()
+    else:
+        Restoration().restore()
+    seconds = time.perf_counter() - start
+
+    if tracing:
+        peak = tracemalloc.get_traced_memory()[1]
+    else:
+        peak = _peak_memory()
+    print(json.dumps({"seconds": seconds, "peak": peak}))
+
+
+class Benchmark:
+    """Generate a tree per file type and size, run convert and restore in subprocesses and compare the scaling."""
+    def __init__(self, sizes: Sequence[int], types: Sequence[FileType], seed: int = 0, keep: bool = False):
+        self._sizes = sorted(sizes)
+        self._types = types
+        self._seed = seed
+        self._keep = keep
+        self._results: list[dict] = []
+
+    def run(self) -> list[dict]:
+        logger.info("")
+        logger.info("======= BENCHMARK START =======")
+        for type_ in self._types:
+            for size in self._sizes:
+                result = self.run_one(type_, size)
+                self._results.append(result)
+                logger.bind(filepath=f"{type_.name}:{size}").info(
+                    f"convert {result['convert']['seconds']:>7.2f}s {self._size(result['convert']['peak']):>9}  "
+                    f"restore {result['restore']['seconds']:>7.2f}s {self._size(result['restore']['peak']):>9}  "
+                    f"{result['entries']:>8} entries"
+                )
+        self._flag_superlinear()
+        logger.info("======= BENCHMARK END =======")
+        return self._results
+
+    def run_one(self, type_: FileType, size: int) -> dict:
+        root = Path(tempfile.mkdtemp(prefix=f"bench-{type_.name.lower()}-{size}-"))
+        try:
+            files = CorpusGenerator(root / settings.filepath.source, seed=self._seed).generate(type_, size)
+            convert = self._run_stage(root, "convert")
+            entries = self._fill_download(root)
+            restore = self._run_stage(root, "restore")
+        finally:
+            if self._keep:
+                logger.bind(filepath=root).info("Synthetic tree kept")
+            else:
+                shutil.rmtree(root, ignore_errors=True)
+
+        return {
+            "file_type": type_.name,
+            "size": size,
+            "files": files,
+            "entries": entries,
+            "convert": {**convert, "entries_per_second": entries / convert["seconds"] if convert["seconds"] else 0.0},
+            "restore": {**restore, "entries_per_second": entries / restore["seconds"] if restore["seconds"] else 0.0},
+        }
+
+    def save(self) -> Path:
+        os.makedirs(DIR_REPORTS, exist_ok=True)
+        filepath = DIR_REPORTS / f'{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.benchmark.json'
+        with open(filepath, "w", encoding="utf-8") as fp:
+            json.dump(self._results, fp, ensure_ascii=False, indent=2)
+        logger.bind(filepath=filepath).success("Benchmark report saved")
+        return filepath
+
+    @staticmethod
+    def _run_stage(root: Path, stage: str) -> dict:
+        env = {
+            **os.environ,
+            "PATH_ROOT": str(root),
+            "CACHE_ENABLED": "False",
+            "MEMORY_ENABLED": "False",
+            "STORE_ENABLED": "False",
+            "PARATRANZ_PROJECT_ID": os.environ.get("PARATRANZ_PROJECT_ID") or "0",
+        }
+        process = subprocess.run(
+            [sys.executable, "-m", "src.benchmark", "--child", stage],
+            cwd=settings.filepath.root, env=env, capture_output=True, text=True, encoding="utf-8",
+        )
+        if process.returncode:
+            logger.bind(filepath=root).error(f"Benchmark {stage} failed:\n{process.stderr}")
+            raise RuntimeError(f"{stage} failed in {root}")
+        return json.loads(process.stdout.strip().splitlines()[-1])
+
+    @staticmethod
+    def _fill_download(root: Path) -> int:
+        """fake a paratranz export: every converted entry gets a translation"""
+        converted = root / settings.filepath.converted
+        download = root / settings.filepath.download
+        entries = 0
+        for filepath in converted.rglob("*.json"):
+            with open(filepath, encoding="utf-8") as fp:
+                datas = json.load(fp)
+            for data in datas:
+                data["translation"] = data["translation"] or f"译{data['original']}"
+            entries += len(datas)
+
+            target = download / filepath.relative_to(converted)
+            os.makedirs(target.parent, exist_ok=True)
+            with open(target, "w", encoding="utf-8") as fp:
+                json.dump(datas, fp, ensure_ascii=False, indent=2)
+        return entries
+
+    def _flag_superlinear(self):
+        """time exponent between consecutive sizes, ~1 is linear and ~2 quadratic"""
+        for type_ in self._types:
+            results = [_ for _ in self._results if _["file_type"] == type_.name]
+            for small, large in zip(results, results[1:]):
+                if not small["entries"] or large["entries"] <= small["entries"]:
+                    continue
+                for stage in ("convert", "restore"):
+                    if small[stage]["seconds"] < 0.05:  # interpreter start up dominates
+                        continue
+                    exponent = math.log(large[stage]["seconds"] / small[stage]["seconds"]) / math.log(large["entries"] / small["entries"])
+                    large[stage]["exponent"] = exponent
+                    if exponent > SUPERLINEAR:
+                        logger.bind(filepath=f"{type_.name}:{small['size']}->{large['size']}").warning(
+                            f"{stage} scales superlinearly, time ~ n^{exponent:.2f}"
+                        )
+
+    @staticmethod
+    def _size(size: int) -> str:
+        return f"{size / 1024 / 1024:.1f}MB"
+
+    @property
+    def results(self) -> list[dict]:
+        return self._results
+
+
+class CodecBenchmark:
+    """Read and write every json file of the folders with each backend, best of a few rounds, and compare the text."""
+    def __init__(self, directories: Sequence[Path] | None = None, rounds: int = 3):
+        self._directories = directories or [
+            settings.filepath.root / settings.filepath.converted,
+            settings.filepath.root / settings.filepath.download,
+        ]
+        self._rounds = rounds
+        self._results: list[dict] = []
+
+    def run(self) -> list[dict]:
+        logger.info("")
+        logger.info("======= CODEC BENCHMARK START =======")
+        contents = [
+            filepath.read_text(encoding="utf-8")
+            for directory in self._directories for filepath in sorted(directory.rglob("*.json")) if filepath.is_file()
+        ]
+        size = sum(len(_.encode("utf-8")) for _ in contents)
+        expected = None
+        for backend in ("json", "orjson"):
+            if backend == "orjson" and orjson is None:
+                logger.warning("orjson is not installed, `pip install orjson` to compare")
+                continue
+            codec = Codec(backend)
+            loads, dumps = math.inf, math.inf
+            for _ in range(self._rounds):
+                start = time.perf_counter()
+                objs = [codec.loads(_) for _ in contents]
+                loads = min(loads, time.perf_counter() - start)
+                start = time.perf_counter()
+                texts = [codec.dumps(_, exact=True) for _ in objs]
+                dumps = min(dumps, time.perf_counter() - start)
+            if expected is None:
+                expected = texts
+            result = {
+                "backend": backend,
+                "files": len(contents),
+                "bytes": size,
+                "loads": loads,
+                "dumps": dumps,
+                "different": sum(a != b for a, b in zip(expected, texts)),
+            }
+            self._results.append(result)
+            logger.info(
+                f"{backend:<8}{len(contents):>7} files  loads {loads:>7.3f}s {self._speed(size, loads):>7}  "
+                f"dumps {dumps:>7.3f}s {self._speed(size, dumps):>7}  {result['different']} different"
+            )
+        if len(self._results) == 2:
+            baseline, accelerated = self._results
+            logger.success(
+                f"orjson loads {baseline['loads'] / accelerated['loads'] if accelerated['loads'] else 0:.1f}x, "
+                f"dumps {baseline['dumps'] / accelerated['dumps'] if accelerated['dumps'] else 0:.1f}x as fast as json"
+            )
+        logger.info("======= CODEC BENCHMARK END =======")
+        return self._results
+
+    def save(self) -> Path:
+        os.makedirs(DIR_REPORTS, exist_ok=True)
+        filepath = DIR_REPORTS / f'{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.codec.json'
+        with open(filepath, "w", encoding="utf-8") as fp:
+            json.dump(self._results, fp, ensure_ascii=False, indent=2)
+        logger.bind(filepath=filepath).success("Codec benchmark report saved")
+        return filepath
+
+    @staticmethod
+    def _speed(size: int, seconds: float) -> str:
+        return f"{size / 1024 / 1024 / seconds if seconds else 0:.0f}MB/s"
+
+    @property
+    def results(self) -> list[dict]:
+        return self._results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="benchmark", description="convert / restore scaling on synthetic trees")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="entries per file type, up to 1000000")
+    parser.add_argument("--types", nargs="+", choices=[_.name for _ in FileType], default=[_.name for _ in FileType])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic trees in the temp folder")
+    parser.add_argument("--codec", action="store_true", help="compare the json backends on the converted and downloaded files instead")
+    parser.add_argument("--child", choices=["convert", "restore"], help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv: Sequence[str] | None = None):
+    args = build_parser().parse_args(argv)
+    if args.child:
+        _child(args.child)
+        return
+
+    setup_logger()
+    if args.codec:
+        benchmark = CodecBenchmark()
+        benchmark.run()
+        benchmark.save()
+        return
+
+    benchmark = Benchmark(args.sizes, [FileType[_] for _ in args.types], seed=args.seed, keep=args.keep)
+    benchmark.run()
+    benchmark.save()
+
+
+__all__ = [
+    "Benchmark",
+    "CodecBenchmark",
+]
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Cache of parsed source files, skips re-reading unchanged files."""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+from src.config import settings
+from src.log import logger
+
+
+class ParseCache:
+    """
+    Pickled parsed contents keyed by (path, mtime, size, file type).
+
+    Entries live in a memory LRU capped by pickled size, and on disk as
+    one file per entry capped by total size, least recently used first out.
+    Every hit is unpickled again, so callers are free to mutate the result.
+    """
+    def __init__(
+        self,
+        directory: Path = settings.filepath.root / settings.cache.path,
+        memory_limit: int = settings.cache.memory_limit,
+        disk_limit: int = settings.cache.disk_limit,
+        enabled: bool = settings.cache.enabled,
+    ):
+        self._directory = directory
+        self._memory_limit = memory_limit
+        self._disk_limit = disk_limit
+        self._enabled = enabled
+
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_size = 0
+        self._disk_size: int | None = None  # counted on first write
+        self._lock = threading.Lock()
+
+    def get(self, filepath: Path, type_: Enum) -> Any | None:
+        if not self.enabled:
+            return None
+        try:
+            digest = self._digest(filepath, type_)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            if (content := self._memory.get(digest)) is not None:
+                self._memory.move_to_end(digest)
+        if content is not None:
+            return self._loads(digest, content)
+
+        filepath_cache = self.directory / f"{digest}.pickle"
+        try:
+            content = filepath_cache.read_bytes()
+        except FileNotFoundError:
+            return None
+        if (loaded := self._loads(digest, content)) is None:
+            return None
+        os.utime(filepath_cache)
+        with self._lock:
+            self._remember(digest, content)
+        return loaded
+
+    def _loads(self, digest: str, content: bytes) -> Any | None:
+        """a truncated or corrupt entry is dropped and counts as a miss, the file is parsed again"""
+        try:
+            return pickle.loads(content)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError, ValueError) as e:
+            logger.bind(filepath=self.directory / f"{digest}.pickle").warning(f"Parse cache entry unreadable, dropped: {type(e).__name__}")
+        with self._lock:
+            if (dropped := self._memory.pop(digest, None)) is not None:
+                self._memory_size -= len(dropped)
+            self._unlink(self.directory / f"{digest}.pickle")
+        return None
+
+    def put(self, filepath: Path, type_: Enum, content: Any):
+        if not self.enabled or content is None:
+            return
+        try:
+            digest = self._digest(filepath, type_)
+        except FileNotFoundError:
+            return
+
+        content = pickle.dumps(content, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(digest, content)
+            self._store(digest, content)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            if self.directory.exists():
+                for file in self.directory.glob("*.pickle"):
+                    file.unlink(missing_ok=True)
+            self._disk_size = 0
+
+    def _remember(self, digest: str, content: bytes):
+        if len(content) > self._memory_limit:
+            return
+        if digest in self._memory:
+            self._memory_size -= len(self._memory.pop(digest))
+        self._memory[digest] = content
+        self._memory_size += len(content)
+        while self._memory_size > self._memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _store(self, digest: str, content: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        if self._disk_size is None:
+            self._disk_size = sum(_.stat().st_size for _ in self.directory.glob("*.pickle"))
+
+        filepath_cache = self.directory / f"{digest}.pickle"
+        fd, name = tempfile.mkstemp(dir=self.directory, prefix=f"{digest}.", suffix=".tmp")  # one per writer
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(content)
+            try:
+                replaced = filepath_cache.stat().st_size  # the entry it replaces no longer counts
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(name, filepath_cache)
+        finally:
+            Path(name).unlink(missing_ok=True)
+        self._disk_size += len(content) - replaced
+
+        if self._disk_size > self._disk_limit:
+            self._evict()
+
+    def _unlink(self, filepath_cache: Path):
+        """a dropped entry no longer counts towards the disk size"""
+        try:
+            size = filepath_cache.stat().st_size
+        except FileNotFoundError:
+            return
+        filepath_cache.unlink(missing_ok=True)
+        if self._disk_size is not None:
+            self._disk_size -= size
+
+    def _evict(self):
+        """drop least recently used files until under 90% of the limit"""
+        files = sorted(
+            ((_.stat().st_mtime, _.stat().st_size, _) for _ in self.directory.glob("*.pickle")),
+            key=lambda _: _[0],
+        )
+        self._disk_size = sum(size for _, size, _ in files)
+        for _, size, file in files:
+            if self._disk_size <= self._disk_limit * 0.9:
+                break
+            file.unlink(missing_ok=True)
+            self._disk_size -= size
+        logger.bind(filepath=self.directory).debug("Parse cache evicted")
+
+    @staticmethod
+    def _digest(filepath: Path, type_: Enum) -> str:
+        stat = filepath.stat()
+        key = f"{filepath.resolve()}\0{stat.st_mtime_ns}\0{stat.st_size}\0{type_.name}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+
+parse_cache = ParseCache()
+
+__all__ = [
+    "ParseCache",
+    "parse_cache",
+]
@@ -0,0 +1,76 @@
+"""
+JSON of the hot paths, orjson when it is installed and gives the same text as the json module.
+
+    CODEC_BACKEND=json python cli.py convert     # the standard library only
+    python cli.py bench --codec                  # both backends on the converted and downloaded files
+"""
+import json
+from typing import IO, Any
+
+from src.config import settings
+from src.log import logger
+
+try:
+    import orjson
+except ImportError:  # optional, `pip install orjson`
+    orjson = None
+
+BACKENDS = ("auto", "orjson", "json")
+
+
+class Codec:
+    """
+    Text is always that of `json.dumps(obj, ensure_ascii=False, indent=2)`, or
+    with `separators=(",", ":")` when `indent` is None. orjson writes floats
+    its own way (1e16 for 1e+16, null for nan), so it only writes what the
+    caller marks `exact`, e.g. the entries of the converters, all strings.
+    Whatever orjson refuses to write or read (huge integers, other keys, lone
+    surrogates, NaN) goes to json, which also raises the errors callers expect.
+    """
+    def __init__(self, backend: str = settings.codec.backend):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend should be one of {', '.join(BACKENDS)}, got {backend!r}")
+        if backend == "orjson" and orjson is None:
+            logger.warning("orjson is not installed, json is used instead")
+        self._orjson = orjson is not None and backend != "json"
+
+    def loads(self, content: str | bytes) -> Any:
+        if self._orjson:
+            try:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
+                pass
+        return json.loads(content)
+
+    def load(self, fp: IO) -> Any:
+        """text or binary file, read at once"""
+        return self.loads(fp.read())
+
+    def dumps(self, obj: Any, indent: int | None = 2, exact: bool = False) -> str:
+        """
+        :param indent: 缩进空格数，None 为不带空格的紧凑格式
+        :param exact: 调用方保证其中没有浮点数，orjson 才会写出
+        """
+        if exact and self._orjson and indent in (2, None):
+            try:
+                return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+            except TypeError:  # integers past 64 bits, keys other than strings, lone surrogates
+                pass
+        if indent is None:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        return json.dumps(obj, ensure_ascii=False, indent=indent)
+
+    def dump(self, obj: Any, fp: IO[str], indent: int | None = 2, exact: bool = False):
+        fp.write(self.dumps(obj, indent, exact))
+
+    @property
+    def name(self) -> str:
+        return "orjson" if self._orjson else "json"
+
+
+codec = Codec()
+
+__all__ = [
+    "Codec",
+    "codec",
+]
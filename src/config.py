@@ -15,6 +15,12 @@ class ProjectSettings(BaseSettings):
     log_level: str = Field(default="INFO")
     log_format: str = Field(default="<g>{time:HH:mm:ss}</g> | [<lvl>{level:^7}</lvl>] | {extra[project_name]}{message:<35}{extra[filepath]}")
     language: str = Field(default="zh_cn")
+    log_enqueue: bool = Field(default=False)  # write logs from a background thread
+    log_debug_file: bool = Field(default=False)  # the .debug file makes every debug message get formatted
+    log_json: bool = Field(default=False)  # also write structured .jsonl logs
+    report_top: int = Field(default=10)  # slowest files listed in the metrics summary
+    profile_memory: bool = Field(default=False)  # trace allocations, much slower
+    profile_file_size: int = Field(default=1024 * 1024)  # files from this many bytes get allocation sites when profiling
 
 
 class FilepathSettings(BaseSettings):
@@ -45,6 +51,7 @@ class ParatranzSettings(BaseSettings):
 
     project_id: int = Field(default="")
     token: str = Field(default="")
+    base_url: str = Field(default="https://paratranz.cn/api")  # point to `python -m src.standin` to run offline
 
 
 class HuijiWikiSettings(BaseSettings):
@@ -56,11 +63,121 @@ class HuijiWikiSettings(BaseSettings):
     token: str = Field(default="")
 
 
+class MemorySettings(BaseSettings):
+    """About fuzzy translation memory"""
+    model_config = SettingsConfigDict(env_prefix='MEMORY_')
+
+    enabled: bool = Field(default=False)
+    ngram: int = Field(default=3)
+    threshold: float = Field(default=0.7)
+    limit: int = Field(default=3)
+    max_posting: int = Field(default=50000)  # grams occurring more often than this are not used for lookup
+
+
+class StoreSettings(BaseSettings):
+    """About sqlite string store"""
+    model_config = SettingsConfigDict(env_prefix='STORE_')
+
+    enabled: bool = Field(default=False)
+    path: Path = Field(default=Path("data/strings.sqlite3"))
+
+
+class CacheSettings(BaseSettings):
+    """About parsed source file cache"""
+    model_config = SettingsConfigDict(env_prefix='CACHE_')
+
+    enabled: bool = Field(default=False)  # a hit costs stat, sha1 and unpickle, no cheaper than parsing small files
+    path: Path = Field(default=Path("data/cache/parsed"))
+    memory_limit: int = Field(default=256 * 1024 * 1024)  # bytes of pickled contents kept in memory
+    disk_limit: int = Field(default=1024 * 1024 * 1024)  # bytes of pickled contents kept on disk
+
+
+class AlignSettings(BaseSettings):
+    """About aligning reference / translation lines when their count differs from the original"""
+    model_config = SettingsConfigDict(env_prefix='ALIGN_')
+
+    window: int = Field(default=2)  # lines on each side shown for low confidence lines
+    band: int = Field(default=10)  # lines of drift searched beyond the line count difference
+    confidence: float = Field(default=0.5)  # below this a line is shown a window, and translations are not taken
+    max_cells: int = Field(default=4_000_000)  # larger files are not aligned, every line gets a window
+
+
+class WatchSettings(BaseSettings):
+    """About watch mode"""
+    model_config = SettingsConfigDict(env_prefix='WATCH_')
+
+    debounce: float = Field(default=0.3)  # seconds without new events before converting
+    interval: float = Field(default=0.5)  # seconds between scans when watchdog is not installed
+
+
+class StandinSettings(BaseSettings):
+    """About the offline Paratranz stand-in server"""
+    model_config = SettingsConfigDict(env_prefix='STANDIN_')
+
+    host: str = Field(default="127.0.0.1")
+    port: int = Field(default=8765)
+    latency: float = Field(default=0.0)  # seconds added to every response
+    jitter: float = Field(default=0.0)  # random extra seconds up to this
+    rate_limit: float = Field(default=0.0)  # requests per second before answering 429, 0 for no limit
+    failure_rate: float = Field(default=0.0)  # chance of answering 500
+    seed: int | None = Field(default=None)
+
+
+class DaemonSettings(BaseSettings):
+    """About the local daemon serving single file convert / restore / preview"""
+    model_config = SettingsConfigDict(env_prefix='DAEMON_')
+
+    host: str = Field(default="127.0.0.1")
+    port: int = Field(default=8766)
+
+
+class PackSettings(BaseSettings):
+    """About restoring into zipped resource packs"""
+    model_config = SettingsConfigDict(env_prefix='PACK_')
+
+    enabled: bool = Field(default=False)  # restore into one zip per mod instead of loose files
+    compression: str = Field(default="deflated")  # stored, deflated, bzip2 or lzma
+    level: int | None = Field(default=None)  # compression level, None for the default of the method
+
+
+class QASettings(BaseSettings):
+    """About checking downloaded translations while restoring"""
+    model_config = SettingsConfigDict(env_prefix='QA_')
+
+    enabled: bool = Field(default=True)
+
+
+class DedupSettings(BaseSettings):
+    """About converting identical originals once"""
+    model_config = SettingsConfigDict(env_prefix='DEDUP_')
+
+    enabled: bool = Field(default=False)
+    file_types: list[str] = Field(default=["LOTR_LEGACY_NAMES", "LOTR_LEGACY_SPEECH", "CUSTOM_NPCS_DIALOGS"])
+
+
+class CodecSettings(BaseSettings):
+    """About the json backend"""
+    model_config = SettingsConfigDict(env_prefix='CODEC_')
+
+    backend: str = Field(default="auto")  # auto, orjson or json
+
+
 class Settings(BaseSettings):
     """Main settings"""
     github: GitHubSettings = GitHubSettings()
     project: ProjectSettings = ProjectSettings()
     filepath: FilepathSettings = FilepathSettings()
+    memory: MemorySettings = MemorySettings()
+    store: StoreSettings = StoreSettings()
+    cache: CacheSettings = CacheSettings()
+    align: AlignSettings = AlignSettings()
+    watch: WatchSettings = WatchSettings()
+    standin: StandinSettings = StandinSettings()
+    daemon: DaemonSettings = DaemonSettings()
+    pack: PackSettings = PackSettings()
+    qa: QASettings = QASettings()
+    dedup: DedupSettings = DedupSettings()
+    codec: CodecSettings = CodecSettings()
 
     huijiwiki: HuijiWikiSettings = HuijiWikiSettings()
     paratranz: ParatranzSettings = ParatranzSettings()
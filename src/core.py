@@ -1,19 +1,31 @@
 import io
-import json
 import os
 import re
 import shutil
+import threading
 from contextlib import suppress
 from dataclasses import dataclass, asdict
 from enum import Enum, auto
 from pathlib import Path
-from typing import Callable
-
-import chardet
+from typing import TYPE_CHECKING, Iterable, Iterator
 
+from src.align import Alignment, aligner
+from src.cache import parse_cache
+from src.codec import codec
 from src.config import settings
+from src.dedup import FILEPATH_PUSHED, Deduplicator
 from src.exception import ProjectStructureException, UnknownFileTypeException
-from src.log import logger
+from src.log import log_enabled, logger
+from src.metrics import metrics
+from src.output import OutputTree
+from src.pack import PackWriter
+from src.qa import qa
+from src.store import Stage, StringStore
+
+if TYPE_CHECKING:
+	from src.memory import TranslationMemory
+	from src.daemon import SourceIndex
+	from src.shard import Shard
 
 # from src.libs.openapi_client import ApiClient as ParatranzClient, FilesApi, Configuration
 
@@ -22,8 +34,13 @@ DIR_REFERENCE = settings.filepath.root / settings.filepath.source / "reference"
 DIR_TRANSLATION = settings.filepath.root / settings.filepath.source / "translation"
 DIR_TRANSLATION_EXTRA = settings.filepath.root / settings.filepath.source / "translation_extra"
 
+_encoding_lock = threading.Lock()
+
 FileContent = str | list[str] | list | dict
 
+REFERENCE_UNCERTAIN = "Reference aligned with low confidence, nearby lines:"
+TRANSLATION_UNCERTAIN = "Translation aligned with low confidence, nearby lines:"
+
 
 @dataclass
 class Data:
@@ -47,796 +64,1141 @@ class FileType(Enum):
 	LOTR_RENEWED_SPEECH = auto()
 
 
-class Conversion:
-	def convert(self):
-		"""local raw texts to paratranz jsons"""
-		logger.info("")
-		logger.info("======= CONVERSION START =======")
-		if not DIR_ORIGINAL.exists():
-			logger.bind(filepath=DIR_ORIGINAL).error("Filepath does not exist!")
-			raise ProjectStructureException(DIR_ORIGINAL)
+@dataclass(frozen=True)
+class FileTypeRule:
+	"""
+	Every given condition has to hold, folders are the parent components of
+	the relative path so the file name itself never matches them.
+	"""
+	file_type: FileType
+	names: frozenset[str] = frozenset()  # exact file names
+	suffixes: frozenset[str] = frozenset()
+	folders: frozenset[str] = frozenset()  # each one is a folder on the path, case sensitive
+	folder_contains: str = ""  # some folder contains this, case insensitive
 
-		for root, dirs, files in os.walk(DIR_ORIGINAL, topdown=False):
-			for file in files:
-				filepath = Path(root) / file
-				relative_path = filepath.relative_to(DIR_ORIGINAL)
-				converted_path = relative_path.parent / f"{relative_path.name}.json"
-				os.makedirs(settings.filepath.root / settings.filepath.converted / relative_path.parent, exist_ok=True)
-
-				logger.bind(filepath=relative_path).debug("Converting file")
-				file_type = Project.categorize(relative_path)
-				if not file_type:
-					continue
+	def match(self, name: str, suffix: str, folders: frozenset[str], folders_lower: str) -> bool:
+		return (
+			(not self.names or name in self.names)
+			and (not self.suffixes or suffix in self.suffixes)
+			and self.folders <= folders
+			and (not self.folder_contains or self.folder_contains in folders_lower)
+		)
 
-				match file_type:
-					case FileType.LANG:
-						datas = self._convert_lang(relative_path, file_type)
-					case FileType.JSON_LANG:
-						datas = self._convert_json_lang(relative_path, file_type)
-					case _:
-						datas = self._convert_misc(relative_path, file_type)
 
-				if datas is None:
-					logger.bind(filepath=relative_path).error("Converting file failed")
-					continue
+class FileTypeClassifier:
+	"""
+	Ordered rules, the first matching one decides. Rules are grouped by suffix
+	once, and the result is remembered per relative path.
+	"""
+	def __init__(self, rules: Iterable[FileTypeRule]):
+		self._rules = list(rules)
+		self._by_suffix: dict[str, list[FileTypeRule]] = {}
+		self._any_suffix: list[FileTypeRule] = []
+		self._cache: dict[Path, FileType | None] = {}
+		self._compile()
+
+	def register(self, rule: FileTypeRule, index: int = 0):
+		"""
+		:param rule: 新的分类规则
+		:param index: 规则的位置，默认放在最前以优先匹配
+		"""
+		self._rules.insert(index, rule)
+		self._compile()
+
+	def classify(self, filepath: Path) -> FileType | None:
+		if (file_type := self._cache.get(filepath, ...)) is not ...:
+			return file_type
+		folders = frozenset(filepath.parent.parts)
+		folders_lower = "\0".join(folders).lower()  # one search covers every folder
+		for rule in self._by_suffix.get(filepath.suffix, self._any_suffix):
+			if rule.match(filepath.name, filepath.suffix, folders, folders_lower):
+				file_type = rule.file_type
+				break
+		else:
+			file_type = None
+		self._cache[filepath] = file_type
+		return file_type
+
+	def cached(self, filepath: Path) -> bool:
+		return filepath in self._cache
+
+	def __len__(self) -> int:
+		"""paths classified so far"""
+		return len(self._cache)
+
+	def _compile(self):
+		suffixes = {suffix for rule in self._rules for suffix in rule.suffixes}
+		suffixes |= {Path(name).suffix for rule in self._rules for name in rule.names}
+		self._by_suffix = {
+			suffix: [rule for rule in self._rules if not rule.suffixes or suffix in rule.suffixes]
+			for suffix in suffixes
+		}
+		self._any_suffix = [rule for rule in self._rules if not rule.suffixes]
+		self._cache.clear()
 
-				with open(settings.filepath.root / settings.filepath.converted / converted_path, "w", encoding="utf-8") as fp:
-					json.dump([asdict(_) for _ in datas], fp, ensure_ascii=False, indent=2)
-				logger.bind(filepath=relative_path).debug("Converting file successfully")
+	@property
+	def rules(self) -> list[FileTypeRule]:
+		return self._rules
+
+
+classifier = FileTypeClassifier([
+	FileTypeRule(FileType.CUSTOM_NPCS_DIALOGS, suffixes=frozenset({".json"}), folders=frozenset({"CustomNPCs", "dialogs"})),
+	FileTypeRule(FileType.CUSTOM_NPCS_QUESTS, suffixes=frozenset({".json"}), folders=frozenset({"CustomNPCs", "quests"})),
+	FileTypeRule(FileType.LOTR_RENEWED_SPEECH, suffixes=frozenset({".json"}), folders=frozenset({"speech"}), folder_contains="lotr"),
+	FileTypeRule(FileType.LOTR_LEGACY_SPEECH, suffixes=frozenset({".txt"}), folders=frozenset({"speech"}), folder_contains="lotr"),
+	FileTypeRule(FileType.LOTR_LEGACY_NAMES, folders=frozenset({"names"}), folder_contains="lotr"),
+	FileTypeRule(FileType.LANG, names=frozenset({"en_US.lang", "ru_RU.lang", "zh_CN.lang"})),
+	FileTypeRule(FileType.JSON_LANG, names=frozenset({"en_us.json", "ru_ru.json", "zh_cn.json"})),
+	FileTypeRule(FileType.LANG, suffixes=frozenset({".lang"})),
+	FileTypeRule(FileType.PLAINTEXT, suffixes=frozenset({".txt"}), folders=frozenset({"lore"})),
+	FileTypeRule(FileType.PLAINTEXT_IN_LINES, suffixes=frozenset({".txt"})),
+])
+
+class LineFile:
+	"""
+	Lines of a text file read on demand, every iteration reopens the file.
+	Stands in for `fp.readlines()` where lines are only iterated and counted.
+	"""
+	def __init__(self, filepath: Path):
+		self._filepath = filepath
+		self._length: int | None = None
+
+	def __iter__(self) -> Iterator[str]:
+		with open(self._filepath, "r", encoding="utf-8") as fp:
+			yield from fp
+
+	def __len__(self) -> int:
+		if self._length is None:
+			self._length = sum(1 for _ in self)
+		return self._length
+
+	def __bool__(self) -> bool:
+		return len(self) > 0
 
-			if Path(root).parent.parent == DIR_ORIGINAL:
-				logger.bind(filepath=Path(root).relative_to(DIR_ORIGINAL)).success("Converting mod folder successfully")
-			elif Path(root).parent == DIR_ORIGINAL:
-				logger.bind(filepath=Path(root).name).success("Converting mod successfully.")
+	@property
+	def filepath(self) -> Path:
+		return self._filepath
+
+
+class FormatHandler:
+	"""
+	Everything about one file type: reading and writing its files, extracting
+	entries from them and putting translations back. Conversion and restoration
+	only walk the folders and hand each file to the handler of its type.
+
+	Both phases get the path relative to the original folder, keys are built
+	by the same `key` method on either side.
+	"""
+	file_type: FileType
+	reference_name: str | None = None  # sibling file names when they differ from the original
+	translation_name: str | None = None
+	lines = False  # streamed line by line from a `LineFile`
+	fixed_lines = False  # restored files keep the line count of the original, checked by QA
+
+	""" FILES """
+	def read(self, fp: io.TextIOBase) -> FileContent:
+		return fp.read()
+
+	def write(self, content: FileContent | Iterable[str], fp: io.TextIOBase):
+		fp.write(content)
+
+	def parse(self, filepath: Path) -> FileContent | LineFile | None:
+		"""
+		:param filepath: 文件的绝对路径，解析结果经 `parse_cache` 在转换与还原之间共用
+		"""
+		return Project.safe_read(filepath, self.file_type)
+
+	""" ENTRIES """
+	def key(self, relative_path: Path, *parts: str | int) -> str:
+		"""path of the file without suffix joined by dots, then the parts"""
+		return ".".join((*relative_path.with_suffix("").parts, *map(str, parts)))
+
+	def extract(self, relative_path: Path, **kwargs) -> Iterable[Data]:
+		"""
+		:param relative_path: 相对于 original 文件夹的路径
+		:param kwargs: original, reference, translation, translation_extra 及对应的 *_flag
+		"""
+		raise NotImplementedError
+
+	def restore(self, relative_path: Path, **kwargs) -> FileContent | Iterable[str]:
+		"""
+		:param relative_path: 相对于 original 文件夹的路径
+		:param kwargs: original, download, translation_extra_flag, filepath_translation_extra, output
+		the parsed original may be shared (see `SourceIndex`), it is copied before it is changed
+		"""
+		raise NotImplementedError
 
 	@staticmethod
-	def _convert_general(filepath: Path, type_: FileType, process_function: Callable[..., list[Data]], **kwargs) -> list[Data] | None:
-		filepath_original = DIR_ORIGINAL / filepath
-		original = Project.safe_read(filepath_original, type_)
-		if not original:
-			return None
+	def lookup(download: list[dict]) -> dict[str, str]:
+		"""restored text of the first entry of every key"""
+		lookup = {}
+		for data in download:
+			if data["key"] not in lookup:
+				lookup[data["key"]] = data["translation"] or data["original"]
+		return lookup
 
-		reference = None
-		filename_reference: str | None = kwargs.get("filename_reference", None)
-		filepath_reference = (DIR_REFERENCE / filepath.parent / filename_reference) if filename_reference else (DIR_REFERENCE / filepath)
-		if reference_flag := filepath_reference.exists():
-			logger.bind(filepath=filepath_reference.relative_to(DIR_REFERENCE)).debug("Reference file exists")
-			reference = Project.safe_read(filepath_reference, type_)
-			if not reference:
-				reference_flag = False
 
-		translation = None
-		filename_translation: str | None = kwargs.get("filename_translation", None)
-		filepath_translation = (DIR_TRANSLATION / filepath.parent / filename_translation) if filename_translation else (DIR_TRANSLATION / filepath)
-		if translation_flag := filepath_translation.exists():
-			logger.bind(filepath=filepath_translation.relative_to(DIR_TRANSLATION)).debug("Translation file exists")
-			translation = Project.safe_read(filepath_translation, type_)
-			if not translation:
-				translation_flag = False
+class LinesHandler(FormatHandler):
+	lines = True
 
-		translation_extra = None
-		filename_translation_extra: str | None = kwargs.get("filename_translation_extra", None)
-		filepath_translation_extra = (DIR_TRANSLATION_EXTRA / filepath.parent / filename_translation_extra) if filename_translation_extra else (DIR_TRANSLATION_EXTRA / filepath)
-		if translation_extra_flag := filepath_translation_extra.exists():
-			logger.bind(filepath=filepath_translation_extra.relative_to(DIR_TRANSLATION_EXTRA)).debug("Translation extra file exists")
-			translation_extra = Project.safe_read(filepath_translation_extra, type_)
-			if not translation_extra:
-				translation_extra_flag = False
+	def read(self, fp: io.TextIOBase) -> list[str]:
+		return fp.readlines()
 
-		return process_function(
-			filepath=filepath,
-			original=original,
-			reference=reference,
-			reference_flag=reference_flag,
-			translation=translation,
-			translation_flag=translation_flag,
-			translation_extra=translation_extra,
-			translation_extra_flag=translation_extra_flag,
-			**kwargs
-		)
+	def write(self, content: Iterable[str], fp: io.TextIOBase):
+		fp.writelines(content)
 
-	""" LANG """
-	def _convert_lang(self, filepath: Path, type_: FileType) -> list[Data]:
-		"""old versions"""
-		def _process(**kwargs) -> list[Data]:
-			original: list[str] = kwargs["original"]
-			reference_flag: bool = kwargs["reference_flag"]
-			reference: list[str] = kwargs["reference"]
-			translation_flag: bool = kwargs["translation_flag"]
-			translation: list[str] = kwargs["translation"]
-
-			result = []
-			for idx, line in enumerate(original):
-				line = line.strip()
-				if not line:  # blank
-					key = f"BLANK-{idx}"
-					value = line
 
-				elif "=" not in line:  # comment / misc
-					key = f"COMMENT-{idx}" if line.startswith("#") else f"MISC-{idx}"
-					value = line
+class JsonHandler(FormatHandler):
+	def read(self, fp: io.TextIOBase) -> list | dict:
+		return codec.load(fp)
+
+	def write(self, content: list | dict, fp: io.TextIOBase):
+		codec.dump(content, fp)
+
+
+class LangHandler(LinesHandler):
+	"""old versions, entries are generated while the original is read"""
+	file_type = FileType.LANG
+	reference_name = "en_US.lang"
+	translation_name = "zh_CN.lang"
+
+	def extract(self, relative_path: Path, **kwargs) -> Iterator[Data]:
+		original: LineFile = kwargs["original"]
+		reference_flag: bool = kwargs["reference_flag"]
+		reference: LineFile = kwargs["reference"]
+		translation_flag: bool = kwargs["translation_flag"]
+		translation: LineFile = kwargs["translation"]
+
+		reference_values = self._values(reference) if reference_flag else {}
+		translation_values = self._values(translation) if translation_flag else {}
+
+		keys = set()
+		for idx, line in enumerate(original):
+			line = line.strip()
+			if not line:  # blank
+				key = f"BLANK-{idx}"
+				value = line
+
+			elif "=" not in line:  # comment / misc
+				key = f"COMMENT-{idx}" if line.startswith("#") else f"MISC-{idx}"
+				value = line
+
+			else:  # normal
+				key, value = line.split("=", 1)
+
+			data = Data(
+				key=key,
+				original=value,
+				translation="",
+				context=f"{idx}"
+			)
+
+			if key in reference_values:
+				data.context = f"{data.context}\n{reference_values[key]}"
 
-				else:  # normal
-					key, value = line.split("=", 1)
+			if key in translation_values and translation_values[key] != value:
+				data.translation = translation_values[key]
+
+			keys.add(key)
+			yield data
+
+		# some keys not exist in original but do exist in reference
+		if reference_flag:
+			for line_ in reference:
+				if "=" not in line_:
+					continue
+				newkey, newvalue = line_.split("=", 1)
+				if newkey in keys:
+					continue
+				if log_enabled("DEBUG"):
+					logger.debug(f"Reference has new key-values: {newkey}={newvalue}")
 
 				data = Data(
-					key=key,
-					original=value,
+					key=newkey,
+					original=newvalue.strip(),
 					translation="",
-					context=f"{idx}"
+					context="Additional in reference"
 				)
 
-				if reference_flag:
-					potential_context = [
-						f"{data.context}\n{line_.split('=', 1)[1].strip()}"
-						for line_ in reference
-						if line_.startswith(f"{key}=")
-					]
-					data.context = potential_context[0] if potential_context else data.context
-
-				if translation_flag:
-					potential_translation = [
-						f"{line_.split('=', 1)[1].strip()}"
-						for line_ in translation
-						if line_.startswith(f"{key}=")
-					]
-					data.translation = potential_translation[0] if potential_translation and potential_translation[0] != value else data.translation
+				if newkey in translation_values:
+					data.translation = translation_values[newkey]
+				keys.add(newkey)
+				yield data
 
-				result.append(data)
+		# some keys not exist in original but do exist in translation
+		if translation_flag:
+			for line_ in translation:
+				if "=" not in line_:
+					continue
+				newkey, newvalue = line_.split("=", 1)
+				if newkey in keys:
+					continue
+				if log_enabled("DEBUG"):
+					logger.debug(f"Translation has new key-values: {newkey}={newvalue}")
 
-			# some keys not exist in original but do exist in reference
-			if reference_flag:
-				for line_ in reference:
-					if "=" not in line_:
-						continue
-					newkey, newvalue = line_.split("=", 1)
-					if newkey in {_.key for _ in result}:
-						continue
-					logger.debug(f"Reference has new key-values: {newkey}={newvalue}")
+				data = Data(
+					key=newkey,
+					original="MISSING",
+					translation=newvalue.strip(),
+					context="Additional in translation"
+				)
 
-					data = Data(
-						key=newkey,
-						original=newvalue.strip(),
-						translation="",
-						context="Additional in reference"
-					)
-
-					if translation_flag:
-						for line_r in translation:
-							if line_r.startswith(f"{newkey}="):
-								data.translation = line_r.split("=", 1)[1].strip()
-								break
-					result.append(data)
-
-			# some keys not exist in original but do exist in translation
-			if translation_flag:
-				for line_ in translation:
-					if "=" not in line_:
-						continue
-					newkey, newvalue = line_.split("=", 1)
-					if newkey in {_.key for _ in result}:
-						continue
-					logger.debug(f"Translation has new key-values: {newkey}={newvalue}")
+				if newkey in reference_values:
+					data.context = f"{data.context}\n{reference_values[newkey]}"
+				keys.add(newkey)
+				yield data
 
-					data = Data(
-						key=newkey,
-						original="MISSING",
-						translation=newvalue.strip(),
-						context="Additional in translation"
-					)
-
-					if reference_flag:
-						for line_r in reference:
-							if line_r.startswith(f"{newkey}="):
-								data.context = f"{data.context}\n{line_r.split('=', 1)[1].strip()}"
-								break
-					result.append(data)
-
-			return result
-
-		return self._convert_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-			filename_reference="en_US.lang",
-			filename_translation="zh_CN.lang",
-		)
+	def restore(self, relative_path: Path, **kwargs) -> Iterator[str]:
+		download: list[dict] = kwargs["download"]
+
+		for line in download:
+			if line["key"].startswith("BLANK"):
+				yield "\n"
+				continue
+
+			if line["key"].startswith("COMMENT") or line["key"].startswith("MISC"):
+				yield (line['translation'] or line['original']).rstrip("\n") + "\n" or line["original"]
+				continue
+
+			yield f"{line['key']}={line['translation'] or line['original']}".rstrip("\n") + "\n"
+
+	@staticmethod
+	def _values(lines: Iterable[str]) -> dict[str, str]:
+		"""value of the first line of every key, as the lookups by `startswith(f"{key}=")` found"""
+		values = {}
+		for line in lines:
+			if "=" not in line:
+				continue
+			key, value = line.split("=", 1)
+			if key not in values:
+				values[key] = value.strip()
+		return values
+
+
+class JsonLangHandler(JsonHandler):
+	"""late versions"""
+	file_type = FileType.JSON_LANG
+	reference_name = "en_us.json"
+	translation_name = "zh_cn.json"
+
+	def extract(self, relative_path: Path, **kwargs) -> list[Data]:
+		original: dict = kwargs["original"]
+		reference_flag: bool = kwargs["reference_flag"]
+		reference: dict = kwargs["reference"]
+		translation_flag: bool = kwargs["translation_flag"]
+		translation: dict = kwargs["translation"]
+
+		result = []
+		for key, value in original.items():
+			data = Data(
+				key=key,
+				original=value,
+				translation="",
+			)
+			if reference_flag:
+				data.context = reference.get(key, "Not exist in reference")
+			if translation_flag:
+				data.translation = translation.get(key, "")
+				data.translation = data.translation if data.translation != value else ""
+			result.append(data)
+
+		# some keys not exist in original but do exist in reference
+		if reference_flag:
+			for key, value in reference.items():
+				if key in original:
+					continue
+				if log_enabled("DEBUG"):
+					logger.debug(f"Reference has new key-values: {key}={value}")
 
-	def _convert_json_lang(self, filepath: Path, type_: FileType) -> list[Data]:
-		"""late versions"""
-		def _process(**kwargs) -> list[Data]:
-			original: dict = kwargs["original"]
-			reference_flag: bool = kwargs["reference_flag"]
-			reference: dict = kwargs["reference"]
-			translation_flag: bool = kwargs["translation_flag"]
-			translation: dict = kwargs["translation"]
-
-			result = []
-			for key, value in original.items():
 				data = Data(
 					key=key,
 					original=value,
 					translation="",
+					context="Additional in reference"
 				)
-				if reference_flag:
-					data.context = reference.get(key, "Not exist in reference")
-				if translation_flag:
-					data.translation = translation.get(key, "")
-					data.translation = data.translation if data.translation != value else ""
+
+				if translation_flag and key in translation:
+					data.translation = translation[key]
 				result.append(data)
 
-			# some keys not exist in original but do exist in reference
-			if reference_flag:
-				for key, value in reference.items():
-					if key in original:
-						continue
-					logger.debug(f"Reference has new key-values: {key}={value}")
+		# some keys not exist in original but do exist in translation
+		if translation_flag:
+			for key, value in translation.items():
+				if key in original:
+					continue
+				if log_enabled("DEBUG"):
+					logger.debug(f"Translation has new key-values: {key}={value}")
 
-					data = Data(
-						key=key,
-						original=value,
-						translation="",
-						context="Additional in reference"
-					)
+				data = Data(
+					key=key,
+					original="MISSING",
+					translation=value,
+					context="Additional in translation"
+				)
+				if reference_flag and key in reference:
+					data.context = f"{data.context}\n{reference[key]}"
+				result.append(data)
 
-					if translation_flag and key in translation:
-						data.translation = translation[key]
-					result.append(data)
+		return result
 
-			# some keys not exist in original but do exist in translation
-			if translation_flag:
-				for key, value in translation.items():
-					if key in original:
-						continue
-					logger.debug(f"Translation has new key-values: {key}={value}")
+	def restore(self, relative_path: Path, **kwargs) -> dict:
+		original: dict = dict(kwargs["original"])
+		download: list[dict] = kwargs["download"]
 
-					data = Data(
-						key=key,
-						original="MISSING",
-						translation=value,
-						context="Additional in translation"
-					)
-					if reference_flag and key in reference:
-						data.context = f"{data.context}\n{reference[key]}"
-					result.append(data)
-
-			return result
-
-		return self._convert_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-			filename_reference="en_us.json",
-			filename_translation="zh_cn.json",
-		)
+		for data in download:
+			if data["key"] not in original:
+				logger.bind(filepath=relative_path).warning("Extra keys in translation")
+			original[data["key"]] = data['translation'] or data['original']
+		return original
 
-	""" MISC """
-	def _convert_misc(self, filepath: Path, type_: FileType) -> list[Data]:
-		"""plaintext, generally"""
-		match type_:
-			case FileType.PLAINTEXT:
-				return self._convert_misc_plaintext(filepath, type_)
-			case FileType.PLAINTEXT_IN_LINES:
-				return self._convert_misc_plaintext_in_lines(filepath, type_)
-			case _:
-				return self._convert_special(filepath, type_)
-
-	def _convert_misc_plaintext(self, filepath: Path, type_: FileType) -> list[Data]:
-		"""plaintext, whole file"""
-		def _process(**kwargs) -> list[Data]:
-			original: str = kwargs["original"]
-			reference_flag: bool = kwargs["reference_flag"]
-			reference: str = kwargs["reference"]
-			translation_flag: bool = kwargs["translation_flag"]
-			translation: str = kwargs["translation"]
 
-			data = Data(
-				key=f"{'.'.join(filepath.with_suffix('').parts)}",
-				original=original,
-				translation=""
-			)
-			if reference_flag:
-				data.context = reference
-			if translation_flag:
-				data.translation = translation if (translation != original and translation != reference) else ""
-			return [data]
+class PlaintextHandler(FormatHandler):
+	"""plaintext, whole file"""
+	file_type = FileType.PLAINTEXT
 
-		return self._convert_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
+	def extract(self, relative_path: Path, **kwargs) -> list[Data]:
+		original: str = kwargs["original"]
+		reference_flag: bool = kwargs["reference_flag"]
+		reference: str = kwargs["reference"]
+		translation_flag: bool = kwargs["translation_flag"]
+		translation: str = kwargs["translation"]
+
+		data = Data(
+			key=self.key(relative_path),
+			original=original,
+			translation=""
 		)
+		if reference_flag:
+			data.context = reference
+		if translation_flag:
+			data.translation = translation if (translation != original and translation != reference) else ""
+		return [data]
+
+	def restore(self, relative_path: Path, **kwargs) -> str:
+		download: list[dict] = kwargs["download"]
+		return download[0]['translation'] or download[0]['original']
+
+
+class PlaintextInLinesHandler(LinesHandler):
+	"""plaintext, split in lines, reference and translation are read alongside the original"""
+	file_type = FileType.PLAINTEXT_IN_LINES
+	replace_untranslated_with_blank = False
+
+	def extract(self, relative_path: Path, **kwargs) -> Iterator[Data]:
+		original: LineFile = kwargs["original"]
+		reference_flag: bool = kwargs["reference_flag"]
+		reference: LineFile = kwargs["reference"]
+		translation_flag: bool = kwargs["translation_flag"]
+		translation: LineFile = kwargs["translation"]
+		translation_extra_flag: bool = kwargs["translation_extra_flag"]
+		translation_extra: LineFile = kwargs["translation_extra"]
+
+		reference_alignments = translation_alignments = None
+		if reference_flag and len(original) != len(reference):
+			logger.bind(filepath=relative_path).warning(f"Reference length inequal ({len(original)}/{len(reference)})")
+			original, reference = self._materialize(original), list(reference)
+			reference_alignments = self._align(relative_path, "Reference", original, reference)
+
+		if translation_flag and len(original) != len(translation):
+			logger.bind(filepath=relative_path).warning(f"Translation length inequal ({len(original)}/{len(translation)})")
+			original, translation = self._materialize(original), list(translation)
+			translation_alignments = self._align(relative_path, "Translation", original, translation)
+
+		reference_lines = iter(reference) if reference_flag and reference_alignments is None else None
+		translation_lines = iter(translation) if translation_flag and translation_alignments is None else None
+
+		for idx, line in enumerate(original):
+			line = line.strip()
+			key = self.key(relative_path, idx)
+			if not line:
+				key = f"BLANK-{key}"
 
-	def _convert_misc_plaintext_in_lines(self, filepath: Path, type_: FileType, *, replace_untranslated_with_blank: bool = False) -> list[Data]:
-		"""plaintext, split in lines"""
-		def _process(**kwargs) -> list[Data]:
-			original: list[str] = kwargs["original"]
-			reference_flag: bool = kwargs["reference_flag"]
-			reference: list[str] = kwargs["reference"]
-			translation_flag: bool = kwargs["translation_flag"]
-			translation: list[str] = kwargs["translation"]
-			translation_extra_flag: bool = kwargs["translation_extra_flag"]
-			translation_extra: list[str] = kwargs["translation_extra"]
-
-			reference_length_unequal = False
-			if reference_flag and len(original) != len(reference):
-				reference_length_unequal = len(original) != len(reference)
-				logger.bind(filepath=filepath).warning(f"Reference length inequal ({len(original)}/{len(reference)})")
-
-			translation_length_unequal = False
-			if translation_flag and len(original) != len(translation):
-				translation_length_unequal = len(original) != len(translation)
-				logger.bind(filepath=filepath).warning(f"Translation length inequal ({len(original)}/{len(translation)})")
-
-			result = []
-			for idx, line in enumerate(original):
+			data = Data(
+				key=key,
+				original=line,
+				translation=""
+			)
+			if reference_lines is not None:
+				data.context = next(reference_lines, "").strip()
+			elif reference_alignments is not None:
+				if aligner.confident(alignment := reference_alignments[idx]):
+					data.context = reference[alignment.index].strip()
+				else:
+					data.context = f"{REFERENCE_UNCERTAIN}\n{aligner.window_of(reference, reference_alignments, idx)}"
+
+			if translation_lines is not None:
+				data.translation = next(translation_lines, "").strip()
+			elif translation_alignments is not None:
+				if aligner.confident(alignment := translation_alignments[idx]):
+					data.translation = translation[alignment.index].strip()
+				else:  # a guessed translation would be taken as done, translators pick from the window instead
+					window = f"{TRANSLATION_UNCERTAIN}\n{aligner.window_of(translation, translation_alignments, idx)}"
+					data.context = f"{data.context}\n{window}" if data.context else window
+			if self.replace_untranslated_with_blank and data.translation == data.original:
+				data.translation = ""
+			yield data
+
+		if translation_extra_flag:
+			for idx, line in enumerate(translation_extra):
 				line = line.strip()
-				key = f"{'.'.join(filepath.with_suffix('').parts)}.{idx}"
-				if not line:
+				key = self.key(relative_path, idx + len(original) + 1)
+				if not line.strip():
 					key = f"BLANK-{key}"
 
-				data = Data(
+				yield Data(
 					key=key,
-					original=line,
-					translation=""
+					original="Extra keys in translation",
+					translation=line
 				)
-				if reference_flag:
-					if reference_length_unequal:
-						data.context = "".join(reference)
-					else:
-						data.context = reference[idx].strip() if len(reference) > idx else ""
-				if translation_flag and not translation_length_unequal:
-					data.translation = translation[idx].strip() if len(translation) > idx else ""
-					if replace_untranslated_with_blank and data.translation == data.original:
-						data.translation = ""
-				result.append(data)
 
-			if translation_extra_flag:
-				for idx, line in enumerate(translation_extra):
-					line = line.strip()
-					key = f"{'.'.join(filepath.with_suffix('').parts)}.{idx+len(original)+1}"
-					if not line.strip():
-						key = f"BLANK-{key}"
-
-					result.append(
-						Data(
-							key=key,
-							original="Extra keys in translation",
-							translation=line
-						)
-					)
-
-			return result
-
-		return self._convert_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
+	@staticmethod
+	def _materialize(lines: "LineFile | list[str]") -> list[str]:
+		"""aligning needs random access, only files of unequal length are read into memory"""
+		return lines if isinstance(lines, list) else list(lines)
+
+	@staticmethod
+	def _align(relative_path: Path, name: str, original: list[str], other: list[str]) -> list[Alignment]:
+		alignments = aligner.align(original, other)
+		if uncertain := aligner.uncertain(alignments):
+			lines = sum(end - start + 1 for start, end in uncertain)
+			ranges = ", ".join(str(start) if start == end else f"{start}-{end}" for start, end in uncertain[:10])
+			logger.bind(filepath=relative_path).warning(f"{name} aligned, {lines} lines low confidence: {ranges}{', ...' if len(uncertain) > 10 else ''}")
+		return alignments
+
+	def restore(self, relative_path: Path, **kwargs) -> Iterator[str]:
+		original: LineFile = kwargs["original"]
+		download: list[dict] = kwargs["download"]
+		translation_extra_flag: bool = kwargs["translation_extra_flag"]
+		filepath_translation_extra: Path = kwargs["filepath_translation_extra"]
+		output: OutputTree | PackWriter = kwargs["output"]
+
+		if translation_extra_flag:
+			download = download[:len(original)]
+			extra = download[len(original):]
+			extra = [
+				'\n' if line['key'].startswith("BLANK") else line["translation"]
+				for line in extra
+			]
+			with open(filepath_translation_extra, "w", encoding="utf-8") as fp:
+				fp.writelines(extra)
+			output.copy(filepath_translation_extra, Path("extra") / filepath_translation_extra.relative_to(DIR_TRANSLATION_EXTRA))
+
+		for line in download:
+			if line["key"].startswith("BLANK"):
+				yield "\n"
+				continue
+
+			yield (line['translation'] or line['original']).rstrip('\n') + "\n"
+
+
+class LotrLegacyNamesHandler(PlaintextInLinesHandler):
+	file_type = FileType.LOTR_LEGACY_NAMES
+	replace_untranslated_with_blank = True
+	fixed_lines = True
+
+
+class LotrLegacySpeechHandler(PlaintextInLinesHandler):
+	file_type = FileType.LOTR_LEGACY_SPEECH
+	replace_untranslated_with_blank = True
+	fixed_lines = True
+
+
+class CustomNpcsHandler(FormatHandler):
+	"""CustomNPCs json files are edited as text with precompiled regexes, they are not valid json"""
+	def key(self, relative_path: Path, *parts: str | int) -> str:
+		"""folders joined by dots, then `file` and the file name without suffix, then the parts"""
+		relative_path = relative_path.with_suffix("")
+		return ".".join((f"{'.'.join(relative_path.parts[:-1])}.file{relative_path.name}", *map(str, parts)))
+
+	@staticmethod
+	def _regex_restore(pattern: re.Pattern, lookup: dict[str, str], key: str, original: str) -> str:
+		if key not in lookup:
+			return original
+
+		title = re.search(pattern, original)
+		processed_line = title.group().replace(
+			title.groups()[0],
+			lookup[key]
 		)
+		return (
+			f"{original[:title.start()]}"
+			f"{processed_line}"
+			f"{original[title.end():]}"
+		)
+
+
+class CustomNpcsDialogsHandler(CustomNpcsHandler):
+	file_type = FileType.CUSTOM_NPCS_DIALOGS
+
+	OPTION_SLOT = re.compile(r'\"OptionSlot\": (\d+),*\n')
+	TITLE = re.compile(r'\"Title\": \"([\s\S]*?)\",*\n')
+	DIALOG_TEXT = re.compile(r'\"DialogText\": \"([\s\S]*?)(?<!\\)\",\n')
+	DIALOG_TEXT_LAST = re.compile(r'\"DialogText\": \"([\s\S]*?)(?<!\\)\"\n')
+	DIALOG_TEXT_TRANSLATION = re.compile(r'\"DialogText\": \"([\s\S]*?)\",*\n')
+
+	def extract(self, relative_path: Path, **kwargs) -> list[Data]:
+		original: str = kwargs["original"]
+		translation_flag: bool = kwargs["translation_flag"]
+		translation: str = kwargs["translation"]
 
-	""" SPECIAL """
-	def _convert_special(self, filepath: Path, type_: FileType) -> list[Data]:
-		match type_:
-			case FileType.CUSTOM_NPCS_DIALOGS:
-				return self._convert_misc_customnpcs_dialog(filepath, type_)
-			case FileType.CUSTOM_NPCS_QUESTS:
-				return self._convert_misc_customnpcs_quests(filepath, type_)
-			case FileType.LOTR_RENEWED_SPEECH:
-				return self._convert_misc_lotr_renewed_speech(filepath, type_)
-			case FileType.LOTR_LEGACY_NAMES:
-				return self._convert_misc_lotr_legacy_names(filepath, type_)
-			case FileType.LOTR_LEGACY_SPEECH:
-				return self._convert_misc_lotr_legacy_speech(filepath, type_)
-			case _:
-				logger.bind(filepath=filepath).error("Unknown file type when convert")
-				raise UnknownFileTypeException(filepath)
-
-	def _convert_misc_customnpcs_dialog(self, filepath: Path, type_: FileType) -> list[Data]:
-		def _process(**kwargs) -> list[Data]:
-			original: str = kwargs["original"]
-			translation_flag: bool = kwargs["translation_flag"]
-			translation: str = kwargs["translation"]
-
-			option_slots = re.findall(r'\"OptionSlot\": (\d+),*\n', original)
-			option_titles = re.findall(r'\"Title\": \"([\s\S]*?)\",*\n', original)
-			dialog_text = re.findall(r'\"DialogText\": \"([\s\S]*?)(?<!\\)\",\n', original) or re.findall(r'\"DialogText\": \"([\s\S]*?)(?<!\\)\"\n', original)
-
-			fetch = {
-				"DialogText": dialog_text[0] if dialog_text else "",
-				**dict(zip([f"Options.slot{idx}" for idx in option_slots], option_titles)),
+		option_slots = self.OPTION_SLOT.findall(original)
+		option_titles = self.TITLE.findall(original)
+		dialog_text = self.DIALOG_TEXT.findall(original) or self.DIALOG_TEXT_LAST.findall(original)
+
+		fetch = {
+			"DialogText": dialog_text[0] if dialog_text else "",
+			**dict(zip([f"Options.slot{idx}" for idx in option_slots], option_titles)),
+		}
+
+		if translation_flag:
+			option_slots_translation = self.OPTION_SLOT.findall(translation)
+			option_titles_translation = self.TITLE.findall(translation)
+			dialog_text_translation = self.DIALOG_TEXT_TRANSLATION.findall(translation) or self.DIALOG_TEXT_LAST.findall(translation)
+
+			fetch_translation = {
+				"DialogText": dialog_text_translation[0] if dialog_text_translation else "",
+				**dict(zip([f"Options.slot{idx}" for idx in option_slots_translation], option_titles_translation)),
 			}
 
+		result = []
+		for key, value in fetch.items():
+			data = Data(
+				key=self.key(relative_path, key),
+				original=value,
+				translation="",
+			)
 			if translation_flag:
-				option_slots_translation = re.findall(r'\"OptionSlot\": (\d+),*\n', translation)
-				option_titles_translation = re.findall(r'\"Title\": \"([\s\S]*?)\",*\n', translation)
-				dialog_text_translation = re.findall(r'\"DialogText\": \"([\s\S]*?)\",*\n', translation) or re.findall(r'\"DialogText\": \"([\s\S]*?)(?<!\\)\"\n', translation)
+				data.translation = fetch_translation.get(key, "")
+			result.append(data)
+		return result
+
+	def restore(self, relative_path: Path, **kwargs) -> str:
+		original: str = kwargs["original"]
+		lookup = self.lookup(kwargs["download"])
+
+		option_slots = self.OPTION_SLOT.findall(original)
+		option_titles = list(self.TITLE.finditer(original))
+		for slot, title in list(zip(option_slots, option_titles))[::-1]:
+			processed_line = title.group().replace(
+				title.groups()[0],
+				lookup[self.key(relative_path, f"Options.slot{slot}")]
+			)
 
-				fetch_translation = {
-					"DialogText": dialog_text_translation[0] if dialog_text_translation else "",
-					**dict(zip([f"Options.slot{idx}" for idx in option_slots_translation], option_titles_translation)),
-				}
+			original = (
+				f"{original[:title.start()]}"
+				f"{processed_line}"
+				f"{original[title.end():]}"
+			)
 
-			result = []
-			for key, value in fetch.items():
-				data = Data(
-					key=f"{'.'.join(filepath.with_suffix('').parts[:-1])}.file{filepath.with_suffix('').name}.{key}",
-					original=value,
-					translation="",
-				)
-				if translation_flag:
-					data.translation = fetch_translation.get(key, "")
-				result.append(data)
-			return result
+		return self._regex_restore(self.DIALOG_TEXT_TRANSLATION, lookup, self.key(relative_path, "DialogText"), original)
 
-		return self._convert_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-		)
 
-	def _convert_misc_customnpcs_quests(self, filepath: Path, type_: FileType) -> list[Data]:
-		def _process(**kwargs) -> list[Data]:
-			original: str = kwargs["original"]
-			translation_flag: bool = kwargs["translation_flag"]
-			translation: str = kwargs["translation"]
+class CustomNpcsQuestsHandler(CustomNpcsHandler):
+	file_type = FileType.CUSTOM_NPCS_QUESTS
+
+	TITLE = re.compile(r'\"Title\": \"([\s\S]*?)\",*\n')
+	TEXT = re.compile(r'\"Text\": \"([\s\S]*?)\",*\n')
+	COMPLETE_TEXT = re.compile(r'\"CompleteText\": \"([\s\S]*?)\",*\n')
 
-			fetch = {
-				"Text": re.findall(r'\"Text\": \"([\s\S]*?)\",*\n', original)[0],
-				"CompleteText": re.findall(r'\"CompleteText\": \"([\s\S]*?)\",*\n', original)[0],
+	def extract(self, relative_path: Path, **kwargs) -> list[Data]:
+		original: str = kwargs["original"]
+		translation_flag: bool = kwargs["translation_flag"]
+		translation: str = kwargs["translation"]
+
+		fetch = {
+			"Text": self.TEXT.findall(original)[0],
+			"CompleteText": self.COMPLETE_TEXT.findall(original)[0],
+		}
+
+		if translation_flag:
+			fetch_translation = {
+				"Title": self.TITLE.findall(translation)[0],
+				"Text": self.TEXT.findall(translation)[0],
+				"CompleteText": self.COMPLETE_TEXT.findall(translation)[0],
 			}
 
+		result = []
+		for key, value in fetch.items():
+			data = Data(
+				key=self.key(relative_path, key),
+				original=value,
+				translation="",
+			)
 			if translation_flag:
-				fetch_translation = {
-					"Title": re.findall(r'\"Title\": \"([\s\S]*?)\",*\n', translation)[0],
-					"Text": re.findall(r'\"Text\": \"([\s\S]*?)\",*\n', translation)[0],
-					"CompleteText": re.findall(r'\"CompleteText\": \"([\s\S]*?)\",*\n', translation)[0],
-				}
-
-			result = []
-			for key, value in fetch.items():
-				data = Data(
-					key=f"{'.'.join(filepath.with_suffix('').parts[:-1])}.file{filepath.with_suffix('').name}.{key}",
-					original=value,
+				data.translation = fetch_translation.get(key, "")
+			result.append(data)
+		return result
+
+	def restore(self, relative_path: Path, **kwargs) -> str:
+		original: str = kwargs["original"]
+		lookup = self.lookup(kwargs["download"])
+
+		for pattern, key in (
+			(self.TITLE, "Title"),
+			(self.TEXT, "Text"),
+			(self.COMPLETE_TEXT, "CompleteText"),
+		):
+			original = self._regex_restore(pattern, lookup, self.key(relative_path, key), original)
+		return original
+
+
+class LotrRenewedSpeechHandler(JsonHandler):
+	file_type = FileType.LOTR_RENEWED_SPEECH
+
+	def extract(self, relative_path: Path, **kwargs) -> list[Data]:
+		original: dict = kwargs["original"]
+
+		result = []
+		for idx, speech in enumerate(original["speech"]):
+			result.extend([
+				Data(
+					key=self.key(relative_path, f"speech{idx}", f"line{idx_}"),
+					original=line,
 					translation="",
 				)
-				if translation_flag:
-					data.translation = fetch_translation.get(key, "")
-				result.append(data)
-			return result
+				for idx_, line in enumerate(speech['lines'])
+			])
+		return result
 
-		return self._convert_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-		)
+	def restore(self, relative_path: Path, **kwargs) -> dict:
+		original: dict = kwargs["original"]
+		original = {**original, "speech": [{**speech, "lines": list(speech["lines"])} for speech in original["speech"]]}
+		lookup = self.lookup(kwargs["download"])
 
-	def _convert_misc_lotr_renewed_speech(self, filepath: Path, type_: FileType) -> list[Data]:
-		def _process(**kwargs) -> list[Data]:
-			original: dict = kwargs["original"]
-
-			result = []
-			for idx, speech in enumerate(original["speech"]):
-				result.extend([
-					Data(
-						key=f"{'.'.join(filepath.with_suffix('').parts)}.speech{idx}.line{idx_}",
-						original=line,
-						translation="",
-					)
-					for idx_, line in enumerate(speech['lines'])
-				])
-			return result
-
-		return self._convert_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-		)
+		for idx, speech in enumerate(original["speech"]):
+			for idx_, line in enumerate(speech["lines"]):
+				key = self.key(relative_path, f"speech{idx}", f"line{idx_}")
+				if key in lookup:
+					original["speech"][idx]["lines"][idx_] = lookup[key]
+		return original
 
-	def _convert_misc_lotr_legacy_names(self, filepath: Path, type_: FileType) -> list[Data]:
-		return self._convert_misc_plaintext_in_lines(filepath=filepath, type_=type_, replace_untranslated_with_blank=True)
 
-	def _convert_misc_lotr_legacy_speech(self, filepath: Path, type_: FileType) -> list[Data]:
-		return self._convert_misc_plaintext_in_lines(filepath=filepath, type_=type_, replace_untranslated_with_blank=True)
+handlers: dict[FileType, FormatHandler] = {}
 
 
-class Restoration:
-	def restore(self):
-		"""paratranz jsons to local raw texts"""
-		logger.info("")
-		logger.info("======= RESTORATION START =======")
-		for root, dirs, files in os.walk(settings.filepath.root / settings.filepath.download, topdown=False):
-			for file in files:
-				filepath = Path(root) / file
-				relative_path = filepath.relative_to(settings.filepath.root / settings.filepath.download)
-				relative_path = relative_path.with_suffix("")
-				converted_path = relative_path.parent / f"{relative_path.name}.json"
-				os.makedirs(settings.filepath.root / settings.filepath.result / relative_path.parent, exist_ok=True)
+def register_handler(handler: FormatHandler):
+	"""the handler replaces any other one of its file type"""
+	handlers[handler.file_type] = handler
 
-				logger.bind(filepath=converted_path).debug("Restoring file")
-				file_type = Project.categorize(relative_path)
-				if not file_type:
-					continue
 
-				match file_type:
-					case FileType.LANG:
-						flag = self._restore_lang(converted_path, file_type)
-					case FileType.JSON_LANG:
-						flag = self._restore_json_lang(converted_path, file_type)
-					case _:
-						flag = self._restore_misc(converted_path, file_type)
+for _handler in (
+	LangHandler(),
+	JsonLangHandler(),
+	PlaintextHandler(),
+	PlaintextInLinesHandler(),
+	LotrLegacyNamesHandler(),
+	LotrLegacySpeechHandler(),
+	CustomNpcsDialogsHandler(),
+	CustomNpcsQuestsHandler(),
+	LotrRenewedSpeechHandler(),
+):
+	register_handler(_handler)
 
-				if flag:
-					logger.bind(filepath=converted_path).debug("Restoring file successfully")
-				else:
-					logger.bind(filepath=converted_path).error("Restoring file failed")
 
-			if Path(root).parent.parent == settings.filepath.root / settings.filepath.download:
-				logger.bind(filepath=Path(root).relative_to(settings.filepath.root / settings.filepath.download)).success("Restoring mod folder successfully")
-			elif Path(root).parent ==  settings.filepath.root / settings.filepath.download:
-				logger.bind(filepath=Path(root).name).success("Restoring mod successfully.")
-
-	@staticmethod
-	def _restore_general(filepath: Path, type_: FileType, process_function: Callable[..., "FileContent"], **kwargs) -> bool:
-		filepath_original = DIR_ORIGINAL / filepath.with_suffix("")
-		original = Project.safe_read(filepath_original, type_)
-		if not original:
-			return False
+class Conversion:
+	def __init__(self, memory: "TranslationMemory | None" = None, store: StringStore | None = None, sources: "SourceIndex | None" = None):
+		"""
+		:param sources: 常驻服务保存在内存中的已解析文件，默认每次都解析
+		"""
+		self._memory = memory
+		self._store = store
+		self._sources = sources
+		self._output = OutputTree(settings.filepath.root / settings.filepath.converted)
+		self._dedup: Deduplicator | None = None  # only during full runs, single files are converted whole
+
+	def load_memory(self):
+		"""last download as translation memory, before anything writes the download folder again"""
+		if self.memory is None and settings.memory.enabled:
+			from src.memory import TranslationMemory  # numpy is slow to import
+			self._memory = TranslationMemory()
+			self.memory.load(settings.filepath.root / settings.filepath.download)
+
+	def convert(self, prune: bool = True, shard: "Shard | None" = None):
+		"""
+		local raw texts to paratranz jsons
+		:param prune: 删除原文件已不存在的转换文件，分片运行时不删除，由合并时处理
+		:param shard: 只转换属于该分片的文件，并写出分片清单
+		"""
+		logger.info("")
+		logger.info("======= CONVERSION START =======")
+		if not DIR_ORIGINAL.exists():
+			logger.bind(filepath=DIR_ORIGINAL).error("Filepath does not exist!")
+			raise ProjectStructureException(DIR_ORIGINAL)
 
-		filepath_download = settings.filepath.root / settings.filepath.download / filepath
-		with open(filepath_download, "r", encoding="utf-8") as fp:
-			download = json.load(fp)
+		self.load_memory()
 
-		filepath_translation_extra = DIR_TRANSLATION_EXTRA / filepath
-		translation_extra_flag = filepath_translation_extra.exists()
+		if settings.dedup.enabled:
+			if shard is not None:
+				raise ValueError("sharded runs are merged file by file, convert them without dedup")
+			self._dedup = Deduplicator()
+		elif shard is None:
+			Deduplicator().remove()  # whole files again, restoring follows the pushed index until they are pushed
 
-		result = process_function(
-			filepath=filepath,
-			original=original,
-			download=download,
-			translation_extra_flag=translation_extra_flag,
-			filepath_translation_extra=filepath_translation_extra,
-			**kwargs
-		)
+		self.output.reset()
+		try:
+			with metrics.stage("convert"):
+				for root, dirs, files in os.walk(DIR_ORIGINAL, topdown=False):
+					for file in files:
+						relative_path = (Path(root) / file).relative_to(DIR_ORIGINAL)
+						if shard is None or shard.contains(relative_path):
+							self.convert_file(relative_path)
+
+					if Path(root).parent.parent == DIR_ORIGINAL:
+						logger.bind(filepath=Path(root).relative_to(DIR_ORIGINAL)).success("Converting mod folder successfully")
+					elif Path(root).parent == DIR_ORIGINAL:
+						logger.bind(filepath=Path(root).name).success("Converting mod successfully.")
+			if self._dedup is not None:
+				for converted_path, datas in self._dedup.split():
+					with self.output.open(converted_path) as fp:
+						count = Project.write_json_array(datas, fp)
+						metrics.add(bytes_written=fp.tell(), entries=count)
+				self._dedup.save()
+		finally:
+			self._dedup = None
+		if shard is not None:
+			shard.save_manifest("convert", self.output)
+		elif prune:
+			self.output.prune()
+
+	def convert_files(self, relative_paths: Iterable[Path]) -> int:
+		"""
+		files of the same type one after another, so their handler stays warm
+		:param relative_paths: 相对于 original 文件夹的路径，同类型文件保持原有先后顺序
+		:return: 转换成功的文件数
+		"""
+		count = 0
+		for file_type, group in Project.group(relative_paths).items():
+			if log_enabled("DEBUG"):
+				logger.debug(f"Converting {len(group)} files of {file_type.name}")
+			count += sum(self.convert_file(relative_path) for relative_path in group)
+		return count
+
+	def convert_file(self, relative_path: Path) -> bool:
+		"""
+		:param relative_path: 相对于 original 文件夹的路径
+		"""
+		with metrics.file("convert", relative_path, source=DIR_ORIGINAL / relative_path) as record:
+			converted_path = relative_path.parent / f"{relative_path.name}.json"
+
+			if log_enabled("DEBUG"):
+				logger.bind(filepath=relative_path).debug("Converting file")
+			file_type = Project.categorize(relative_path)
+			if not file_type:
+				return False
+			record.file_type = file_type.name
+
+			datas = self._convert_general(relative_path, Project.handler(file_type))
+			if datas is None:
+				logger.bind(filepath=relative_path).error("Converting file failed")
+				self.output.keep(converted_path)  # not pruned, its source is still there
+				return False
+
+			if self.memory is not None:
+				datas = list(datas)  # line formats come as generators, annotating needs every entry
+				self.memory.annotate(datas)
+				self.memory.add_datas(datas)
+
+			datas = (asdict(_) for _ in datas)
+			if self._dedup is not None and self._dedup.eligible(file_type.name) and len(relative_path.parts) > 1:
+				datas = list(datas)
+				self._dedup.hold(converted_path, datas)  # written once every file of the mod is known
+				if self.store is not None:
+					self.store.write_file(Stage.CONVERTED, relative_path, datas)
+				return True
+			if self.store is not None:
+				datas = list(datas)
+			with self.output.open(converted_path) as fp:
+				count = Project.write_json_array(datas, fp)
+				metrics.add(bytes_written=fp.tell(), entries=count)
+			if self.store is not None:
+				self.store.write_file(Stage.CONVERTED, relative_path, datas)
+			if log_enabled("DEBUG"):
+				logger.bind(filepath=relative_path).debug("Converting file successfully")
+			return True
+
+	def entries(self, relative_path: Path) -> list[Data] | None:
+		"""
+		entries of one file as converting would write them, nothing is written
+		:param relative_path: 相对于 original 文件夹的路径
+		"""
+		if not (file_type := Project.categorize(relative_path)):
+			return None
+		datas = self._convert_general(relative_path, Project.handler(file_type))
+		return None if datas is None else list(datas)
 
-		filename_translation: Path | None = kwargs.get("filename_translation", None)
-		filepath_result = (settings.filepath.root / settings.filepath.result / filepath.parent / filename_translation) if filename_translation else (settings.filepath.root / settings.filepath.result / filepath.with_suffix(""))
-		with open(filepath_result, "w", encoding="utf-8") as fp:
-			Project.write(content=result, fp=fp, type_=type_)
-		return True
+	def _parse(self, handler: "FormatHandler", filepath: Path) -> "FileContent | LineFile | tuple[str, ...] | None":
+		return handler.parse(filepath) if self._sources is None else self._sources.get(filepath, handler)
 
-	""" LANG """
-	def _restore_lang(self, filepath: Path, type_: FileType):
-		def _process(**kwargs) -> "FileContent":
-			download: list[dict] = kwargs["download"]
+	def _convert_general(self, filepath: Path, handler: "FormatHandler") -> Iterable[Data] | None:
+		filepath_original = DIR_ORIGINAL / filepath
+		original = self._parse(handler, filepath_original)
+		if not original:
+			return None
 
-			result = []
-			for line in download:
-				if line["key"].startswith("BLANK"):
-					result.append("\n")
-					continue
+		reference = None
+		filepath_reference = (DIR_REFERENCE / filepath.parent / handler.reference_name) if handler.reference_name else (DIR_REFERENCE / filepath)
+		if reference_flag := filepath_reference.exists():
+			if log_enabled("DEBUG"):
+				logger.bind(filepath=filepath_reference.relative_to(DIR_REFERENCE)).debug("Reference file exists")
+			reference = self._parse(handler, filepath_reference)
+			if not reference:
+				reference_flag = False
 
-				if line["key"].startswith("COMMENT") or line["key"].startswith("MISC"):
-					result.append((line['translation'] or line['original']).rstrip("\n") + "\n" or line["original"])
-					continue
+		translation = None
+		filepath_translation = (DIR_TRANSLATION / filepath.parent / handler.translation_name) if handler.translation_name else (DIR_TRANSLATION / filepath)
+		if translation_flag := filepath_translation.exists():
+			if log_enabled("DEBUG"):
+				logger.bind(filepath=filepath_translation.relative_to(DIR_TRANSLATION)).debug("Translation file exists")
+			translation = self._parse(handler, filepath_translation)
+			if not translation:
+				translation_flag = False
 
-				result.append(
-					f"{line['key']}={line['translation'] or line['original']}".rstrip("\n") + "\n"
-				)
-			return result
+		translation_extra = None
+		filepath_translation_extra = DIR_TRANSLATION_EXTRA / filepath
+		if translation_extra_flag := filepath_translation_extra.exists():
+			if log_enabled("DEBUG"):
+				logger.bind(filepath=filepath_translation_extra.relative_to(DIR_TRANSLATION_EXTRA)).debug("Translation extra file exists")
+			translation_extra = self._parse(handler, filepath_translation_extra)
+			if not translation_extra:
+				translation_extra_flag = False
 
-		return self._restore_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-			filename_translation="zh_CN.lang"
+		return handler.extract(
+			filepath,
+			original=original,
+			reference=reference,
+			reference_flag=reference_flag,
+			translation=translation,
+			translation_flag=translation_flag,
+			translation_extra=translation_extra,
+			translation_extra_flag=translation_extra_flag,
 		)
 
-	def _restore_json_lang(self, filepath: Path, type_: FileType):
-		def _process(**kwargs) -> "FileContent":
-			filepath_: Path = kwargs["filepath"]
-			original: dict = kwargs["original"]
-			download: list[dict] = kwargs["download"]
-
-			for data in download:
-				if data["key"] not in original:
-					logger.bind(filepath=filepath).warning("Extra keys in translation")
-				original[data["key"]] = data['translation'] or data['original']
-			return original
+	@property
+	def memory(self) -> "TranslationMemory | None":
+		return self._memory
 
-		return self._restore_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-			filename_translation="zh_cn.json"
-		)
+	@property
+	def store(self) -> StringStore | None:
+		return self._store
 
-	""" MISC """
-	def _restore_misc(self, filepath: Path, type_: FileType):
-		"""plaintext, generally"""
-		match type_:
-			case FileType.PLAINTEXT:
-				return self._restore_misc_plaintext(filepath, type_)
-			case FileType.PLAINTEXT_IN_LINES:
-				return self._restore_misc_plaintext_in_lines(filepath, type_)
-			case _:
-				return self._restore_special(filepath, type_)
-
-	def _restore_misc_plaintext(self, filepath: Path, type_: FileType):
-		def _process(**kwargs) -> "FileContent":
-			download: list[dict] = kwargs["download"]
-			return download[0]['translation'] or download[0]['original']
-
-		return self._restore_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-		)
+	@property
+	def output(self) -> OutputTree:
+		return self._output
 
-	def _restore_misc_plaintext_in_lines(self, filepath: Path, type_: FileType):
-		def _process(**kwargs) -> "FileContent":
-			original: list[str] = kwargs["original"]
-			download: list[dict] = kwargs["download"]
-			translation_extra_flag: bool = kwargs["translation_extra_flag"]
-			filepath_translation_extra: Path = kwargs["filepath_translation_extra"]
-
-			if translation_extra_flag:
-				download = download[:len(original)]
-				extra = download[len(original):]
-				extra = [
-					'\n' if line['key'].startswith("BLANK") else line["translation"]
-					for line in extra
-				]
-				with open(filepath_translation_extra, "w", encoding="utf-8") as fp:
-					fp.writelines(extra)
-				shutil.copyfile(
-					filepath_translation_extra,
-					settings.filepath.root / settings.filepath.result / "extra" / filepath_translation_extra.relative_to(DIR_TRANSLATION_EXTRA)
-				)
 
-			result = []
-			for line in download:
-				if line["key"].startswith("BLANK"):
-					result.append("\n")
-					continue
+class Restoration:
+	def __init__(self, store: StringStore | None = None, pack: bool | None = None, sources: "SourceIndex | None" = None):
+		"""
+		:param pack: 是否按模组写入压缩包而非散文件，默认取 PACK_ENABLED
+		:param sources: 常驻服务保存在内存中的已解析文件，默认每次都解析
+		"""
+		self._store = store
+		self._sources = sources
+		self._dedup = Deduplicator(filepath_index=FILEPATH_PUSHED)  # the downloads are what was pushed
+		self._dedup.load()
+		if settings.pack.enabled if pack is None else pack:
+			self._output = PackWriter(settings.filepath.root / settings.filepath.result, settings.pack.compression, settings.pack.level)
+		else:
+			self._output = OutputTree(settings.filepath.root / settings.filepath.result)
+
+	def restore(self, prune: bool = True, shard: "Shard | None" = None) -> int:
+		"""
+		paratranz jsons to local raw texts
+		:param prune: 删除下载文件已不存在的还原文件，分片运行时不删除，由合并时处理
+		:param shard: 只还原属于该分片的文件，并写出分片清单
+		:return: 还原成功的文件数
+		"""
+		return self.restore_iter(self._downloaded(shard), prune=prune, shard=shard)
+
+	def restore_iter(self, converted_paths: Iterable[Path], prune: bool = True, shard: "Shard | None" = None) -> int:
+		"""
+		files restored as they come, e.g. while they are still being downloaded
+		:param converted_paths: 相对于下载文件夹的路径，可以是边下载边产生的迭代器
+		:param prune: 删除本次未还原的旧还原文件
+		:param shard: 分片运行时写出分片清单，不删除
+		:return: 还原成功的文件数
+		"""
+		logger.info("")
+		logger.info("======= RESTORATION START =======")
+		if shard is not None and isinstance(self.output, PackWriter):
+			raise ValueError("sharded runs are merged file by file, restore them without packing")
+		self.output.reset()
+		qa.reset()
+		self.dedup.load()
+		count = 0
+		with metrics.stage("restore"):
+			for converted_path in converted_paths:
+				if not self.deferred(converted_path):
+					count += self.restore_file(converted_path)
+			count += self.restore_deduplicated(shard)
+		logger.success(f"Restoring {count} files successfully.")
+		if shard is not None:
+			shard.save_manifest("restore", self.output)
+		elif prune:
+			self.output.prune()
+		self.output.close()
+		qa.save()
+		return count
+
+	def _downloaded(self, shard: "Shard | None" = None) -> Iterator[Path]:
+		"""every file of the download folder, mods logged once their files are through"""
+		directory = settings.filepath.root / settings.filepath.download
+		for root, dirs, files in os.walk(directory, topdown=False):
+			for file in files:
+				converted_path = (Path(root) / file).relative_to(directory)
+				if shard is None or shard.contains(converted_path.with_suffix("")):
+					yield converted_path
 
-				result.append(
-					(line['translation'] or line['original']).rstrip('\n') + "\n"
-				)
-			return result
+			if Path(root).parent.parent == directory:
+				logger.bind(filepath=Path(root).relative_to(directory)).success("Restoring mod folder successfully")
+			elif Path(root).parent == directory:
+				logger.bind(filepath=Path(root).name).success("Restoring mod successfully.")
 
-		return self._restore_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-		)
+	def restore_files(self, converted_paths: Iterable[Path]) -> int:
+		"""
+		:param converted_paths: 相对于下载文件夹的路径，同类型文件保持原有先后顺序
+		:return: 还原成功的文件数
+		"""
+		count = 0
+		for file_type, group in Project.group(converted_paths, suffix=True).items():
+			if log_enabled("DEBUG"):
+				logger.debug(f"Restoring {len(group)} files of {file_type.name}")
+			count += sum(self.restore_file(converted_path) for converted_path in group)
+		return count
+
+	def deferred(self, converted_path: Path) -> bool:
+		"""shared files and the files using them wait until every download is there, see `restore_deduplicated`"""
+		return self.dedup.shared(converted_path) or self.dedup.indexed(converted_path)
+
+	def restore_deduplicated(self, shard: "Shard | None" = None) -> int:
+		"""
+		files converted with dedup, their own download may not even exist
+		:return: 还原成功的文件数
+		"""
+		converted_paths = [_ for _ in self.dedup.files() if shard is None or shard.contains(_.with_suffix(""))]
+		if converted_paths:
+			logger.info(f"Restoring {len(converted_paths)} files using shared entries")
+		return self.restore_files(converted_paths)
+
+	def restore_file(self, converted_path: Path, download: list[dict] | None = None) -> bool:
+		"""
+		:param converted_path: 相对于下载文件夹的路径，即原文件路径加上 .json 后缀
+		:param download: 已读入的下载文件内容，不传则从下载文件夹读取
+		"""
+		with metrics.file("restore", converted_path, source=DIR_ORIGINAL / converted_path.with_suffix("")) as record:
+			relative_path = converted_path.with_suffix("")
+
+			if log_enabled("DEBUG"):
+				logger.bind(filepath=converted_path).debug("Restoring file")
+			file_type = Project.categorize(relative_path)
+			if not file_type:
+				return False
+			record.file_type = file_type.name
+
+			flag = self._restore_general(converted_path, Project.handler(file_type), download)
+			if flag:
+				if log_enabled("DEBUG"):
+					logger.bind(filepath=converted_path).debug("Restoring file successfully")
+			else:
+				logger.bind(filepath=converted_path).error("Restoring file failed")
+			return flag
+
+	def preview(self, converted_path: Path, download: list[dict] | None = None) -> tuple[Path, str] | None:
+		"""
+		restored text of one file, nothing is written
+		:param converted_path: 相对于下载文件夹的路径，即原文件路径加上 .json 后缀
+		:param download: 已读入的下载文件内容，不传则从下载文件夹读取
+		:return: 还原后相对于结果文件夹的路径与文本，无法还原时为 None
+		"""
+		if not (file_type := Project.categorize(converted_path.with_suffix(""))):
+			return None
+		handler = Project.handler(file_type)
+		if (restored := self._restored(converted_path, handler, download, extra=False)) is None:
+			return None
 
-	""" SPECIAL """
-	def _restore_special(self, filepath: Path, type_: FileType):
-		match type_:
-			case FileType.CUSTOM_NPCS_DIALOGS:
-				return self._restore_misc_customnpcs_dialog(filepath, type_)
-			case FileType.CUSTOM_NPCS_QUESTS:
-				return self._restore_misc_customnpcs_quests(filepath, type_)
-			case FileType.LOTR_RENEWED_SPEECH:
-				return self._restore_misc_lotr_renewed_speech(filepath, type_)
-			case FileType.LOTR_LEGACY_NAMES:
-				return self._restore_misc_lotr_legacy_names(filepath, type_)
-			case FileType.LOTR_LEGACY_SPEECH:
-				return self._restore_misc_lotr_legacy_speech(filepath, type_)
-			case _:
-				raise UnknownFileTypeException(filepath)
-
-	def _restore_misc_customnpcs_dialog(self, filepath: Path, type_: FileType):
-		def _process(**kwargs) -> "FileContent":
-			original: str = kwargs["original"]
-			download: list[dict] = kwargs["download"]
-
-			option_slots = re.findall(r'\"OptionSlot\": (\d+),*\n', original)
-			option_titles = list(re.finditer(r'\"Title\": \"([\s\S]*?)\",*\n', original))
-			for slot, title in list(zip(option_slots, option_titles))[::-1]:
-				key = f"{'.'.join(filepath.with_suffix('').with_suffix('').parts[:-1])}.file{filepath.with_suffix('').with_suffix('').name}.Options.slot{slot}"
-				processed_line = title.group().replace(
-					title.groups()[0],
-					[
-						_['translation'] or _['original']
-						for _ in download
-						if _['key'] == key
-					][0]
-				)
+		result_path, result = restored
+		fp = io.StringIO()
+		handler.write(result, fp)
+		return result_path, fp.getvalue()
 
-				original = (
-					f"{original[:title.start()]}"
-					f"{processed_line}"
-					f"{original[title.end():]}"
-				)
+	def _parse(self, handler: "FormatHandler", filepath: Path) -> "FileContent | LineFile | tuple[str, ...] | None":
+		return handler.parse(filepath) if self._sources is None else self._sources.get(filepath, handler)
 
-			for pattern, key in {
-				re.compile(r'\"DialogText\": \"([\s\S]*?)\",*\n'): f"{'.'.join(filepath.with_suffix('').with_suffix('').parts[:-1])}.file{filepath.with_suffix('').with_suffix('').name}.DialogText"
-			}.items():
-				original = self._regex_restore(pattern, download, key, original)
-			return original
+	def _restore_general(self, filepath: Path, handler: "FormatHandler", download: list[dict] | None = None) -> bool:
+		if (restored := self._restored(filepath, handler, download)) is None:
+			self.output.keep(self._result_path(filepath, handler))  # not pruned, its download is still there
+			return False
 
-		return self._restore_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-		)
+		result_path, result = restored
+		with self.output.open(result_path) as fp:
+			handler.write(result, fp)
+			metrics.add(bytes_written=fp.tell())
+		return True
 
-	def _restore_misc_customnpcs_quests(self, filepath: Path, type_: FileType):
-		def _process(**kwargs) -> "FileContent":
-			original: str = kwargs["original"]
-			download: list[dict] = kwargs["download"]
-
-			key_prefix = f"{'.'.join(filepath.with_suffix('').with_suffix('').parts[:-1])}.file{filepath.with_suffix('').with_suffix('').name}"
-			for pattern, key in {
-				re.compile(r'\"Title\": \"([\s\S]*?)\",*\n'): f"{key_prefix}.Title",
-				re.compile(r'\"Text\": \"([\s\S]*?)\",*\n'): f"{key_prefix}.Text",
-				re.compile(r'\"CompleteText\": \"([\s\S]*?)\",*\n'): f"{key_prefix}.CompleteText",
-			}.items():
-				original = self._regex_restore(pattern, download, key, original)
-			return original
+	def _restored(self, filepath: Path, handler: "FormatHandler", download: list[dict] | None, extra: bool = True) -> "tuple[Path, FileContent | Iterable[str]] | None":
+		"""
+		:param extra: 是否处理 translation_extra，预览时不写任何文件
+		"""
+		relative_path = filepath.with_suffix("")
+		original = self._parse(handler, DIR_ORIGINAL / relative_path)
+		if not original:
+			return None
 
-		return self._restore_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
-		)
+		filepath_download = settings.filepath.root / settings.filepath.download / filepath
+		if download is None and self.dedup.indexed(filepath) and not filepath_download.exists():
+			download = []  # every entry went to the shared file
+		if download is None:
+			with open(filepath_download, "r", encoding="utf-8") as fp:
+				download = codec.load(fp)
+				metrics.add(bytes_read=fp.tell(), entries=len(download))
+		else:
+			metrics.add(entries=len(download))
+		if self.dedup.indexed(filepath):
+			if (download := self.dedup.expand(filepath, download, settings.filepath.root / settings.filepath.download)) is None:
+				return None
+		if self.store is not None and extra:
+			self.store.write_file(Stage.DOWNLOADED, relative_path, download)
 
-	def _restore_misc_lotr_renewed_speech(self, filepath: Path, type_: FileType):
-		def _process(**kwargs) -> "FileContent":
-			original: dict = kwargs["original"]
-			download: list[dict] = kwargs["download"]
-
-			for idx, speech in enumerate(original["speech"]):
-				for idx_, line in enumerate(speech["lines"]):
-					key = f"{'.'.join(filepath.with_suffix('').with_suffix('').parts)}.speech{idx}.line{idx_}"
-					if result := [
-						_["translation"] or _["original"]
-						for _ in download
-						if _["key"] == key
-					]:
-						original["speech"][idx]["lines"][idx_] = result[0]
-			return original
+		filepath_translation_extra = DIR_TRANSLATION_EXTRA / filepath
+		translation_extra_flag = extra and filepath_translation_extra.exists()
+		if extra:
+			qa.scan(relative_path, download, len(original) if handler.fixed_lines else None, translation_extra_flag)
 
-		return self._restore_general(
-			filepath=filepath,
-			type_=type_,
-			process_function=_process,
+		result = handler.restore(
+			relative_path,
+			original=original,
+			download=download,
+			translation_extra_flag=translation_extra_flag,
+			filepath_translation_extra=filepath_translation_extra,
+			output=self.output,
 		)
+		return self._result_path(filepath, handler), result
 
-	def _restore_misc_lotr_legacy_names(self, filepath: Path, type_: FileType):
-		return self._restore_misc_plaintext_in_lines(filepath=filepath, type_=type_)
+	@staticmethod
+	def _result_path(filepath: Path, handler: "FormatHandler") -> Path:
+		""":param filepath: 相对于下载文件夹的路径"""
+		return (filepath.parent / handler.translation_name) if handler.translation_name else filepath.with_suffix("")
 
-	def _restore_misc_lotr_legacy_speech(self, filepath: Path, type_: FileType):
-		return self._restore_misc_plaintext_in_lines(filepath=filepath, type_=type_)
+	@property
+	def dedup(self) -> Deduplicator:
+		return self._dedup
 
-	@staticmethod
-	def _regex_restore(pattern: re.Pattern, content: list[dict], key: str, original: str):
-		# logger.debug("Restoring regex")
-		title = re.search(pattern, original)
-		replaced = [
-			_["translation"] or _["original"]
-			for _ in content
-			if _["key"] == key
-		]
-		if not replaced:
-			return original
+	@property
+	def store(self) -> StringStore | None:
+		return self._store
 
-		processed_line = title.group().replace(
-			title.groups()[0],
-			replaced[0]
-		)
-		return (
-			f"{original[:title.start()]}"
-			f"{processed_line}"
-			f"{original[title.end():]}"
-		)
+	@property
+	def output(self) -> OutputTree | PackWriter:
+		return self._output
 
 
 class Project:
 	def __init__(self):
-		self._convert = Conversion().convert
-		self._restore = Restoration().restore
+		store = StringStore() if settings.store.enabled else None
+		self._conversion = Conversion(store=store)
+		self._restoration = Restoration(store=store)
+		self._convert = self._conversion.convert
+		self._restore = self._restoration.restore
 
 	@staticmethod
 	def clean(*filepaths: Path):
@@ -848,62 +1210,47 @@ class Project:
 
 	@staticmethod
 	def categorize(filepath: Path) -> FileType | None:
-		filepath_str = str(filepath)
-		filepath_str_lower = filepath_str.lower()
-		suffix = filepath.suffix or Path(filepath.name).suffix
-		""" special """
-		if "CustomNPCs" in filepath_str:
-			if "dialogs" in filepath_str and suffix == ".json":
-				logger.bind(filepath=filepath).debug(f"Type: {FileType.CUSTOM_NPCS_DIALOGS.name}")
-				return FileType.CUSTOM_NPCS_DIALOGS
-			if "quests" in filepath_str and suffix == ".json":
-				logger.bind(filepath=filepath).debug(f"Type: {FileType.CUSTOM_NPCS_QUESTS.name}")
-				return FileType.CUSTOM_NPCS_QUESTS
-
-		if "lotr" in filepath_str_lower:
-			if "speech" in filepath_str:
-				if suffix == ".json":
-					logger.bind(filepath=filepath).debug(f"Type: {FileType.LOTR_RENEWED_SPEECH.name}")
-					return FileType.LOTR_RENEWED_SPEECH
-				if suffix == ".txt":
-					logger.bind(filepath=filepath).debug(f"Type: {FileType.LOTR_LEGACY_SPEECH.name}")
-					return FileType.LOTR_LEGACY_SPEECH
-
-			if "names" in filepath_str:
-				logger.bind(filepath=filepath).debug(f"Type: {FileType.LOTR_LEGACY_NAMES.name}")
-				return FileType.LOTR_LEGACY_NAMES
-
-		match filepath.name:
-			case "en_US.lang" | "ru_RU.lang" | "zh_CN.lang":
-				logger.bind(filepath=filepath).debug(f"Type: {FileType.LANG.name}")
-				return FileType.LANG
-			case "en_us.json" | "ru_ru.json" | "zh_cn.json":
-				logger.bind(filepath=filepath).debug(f"Type: {FileType.JSON_LANG.name}")
-				return FileType.JSON_LANG
-			case _:
-				pass
-
-		match suffix:
-			case ".lang":
-				logger.bind(filepath=filepath).debug(f"Type: {FileType.LANG.name}")
-				return FileType.LANG
-			case ".txt":
-				if "lore" in filepath_str:
-					logger.bind(filepath=filepath).debug(f"Type: {FileType.PLAINTEXT.name}")
-					return FileType.PLAINTEXT
-				logger.bind(filepath=filepath).debug(f"Type: {FileType.PLAINTEXT_IN_LINES.name}")
-				return FileType.PLAINTEXT_IN_LINES
-			case _:
-				pass
-
-		logger.bind(filepath=filepath).error("Unknown filetype when categorize")
-		return None
+		"""
+		:param filepath: 相对于 original 文件夹的路径，规则见 `classifier`
+		"""
+		logged = classifier.cached(filepath)
+		file_type = classifier.classify(filepath)
+		if file_type is None:
+			logger.bind(filepath=filepath).error("Unknown filetype when categorize")
+		elif not logged and log_enabled("DEBUG"):
+			logger.bind(filepath=filepath).debug(f"Type: {file_type.name}")
+		return file_type
+
+	@staticmethod
+	def handler(type_: FileType) -> FormatHandler:
+		if (handler := handlers.get(type_)) is None:
+			raise UnknownFileTypeException(type_)
+		return handler
 
 	@staticmethod
-	def safe_read(filepath: Path, type_: FileType) -> FileContent | None:
+	def group(filepaths: Iterable[Path], suffix: bool = False) -> dict[FileType, list[Path]]:
+		"""
+		:param suffix: 路径带有 .json 后缀，即下载文件夹中的路径
+		:return: 按类型分组的路径，未知类型的文件被跳过
+		"""
+		groups: dict[FileType, list[Path]] = {}
+		for filepath in filepaths:
+			if file_type := Project.categorize(filepath.with_suffix("") if suffix else filepath):
+				groups.setdefault(file_type, []).append(filepath)
+		return groups
+
+	@staticmethod
+	def safe_read(filepath: Path, type_: FileType) -> FileContent | LineFile | None:
+		"""line formats are not read here but streamed from a `LineFile`"""
+		if Project.handler(type_).lines:
+			return Project.safe_lines(filepath)
+		if (content := parse_cache.get(filepath, type_)) is not None:
+			return content
+
 		try:
 			with open(filepath, "r", encoding="utf-8") as fp:
-				return Project.read(fp, type_)
+				content = Project.read(fp, type_)
+				metrics.add(bytes_read=os.fstat(fp.fileno()).st_size)
 		except FileNotFoundError as e:
 			logger.bind(filepath=filepath).error("File not found when reading")
 			return None
@@ -914,32 +1261,84 @@ class Project:
 				return None
 
 			with open(filepath, "r", encoding="utf-8") as fp:
-				return Project.read(fp, type_)
+				content = Project.read(fp, type_)
+
+		parse_cache.put(filepath, type_, content)
+		return content
+
+	@staticmethod
+	def safe_lines(filepath: Path) -> LineFile | None:
+		lines = LineFile(filepath)
+		try:
+			len(lines)  # counting once checks the encoding
+			metrics.add(bytes_read=filepath.stat().st_size)
+		except FileNotFoundError as e:
+			logger.bind(filepath=filepath).error("File not found when reading")
+			return None
+
+		except UnicodeDecodeError as e:
+			logger.bind(filepath=filepath).warning("File encoding is not utf-8")
+			if not Project.change_encoding(filepath):
+				return None
+			lines = LineFile(filepath)
+		return lines
 
 	@staticmethod
 	def read(fp: io.TextIOBase, type_: FileType) -> list[str] | str | list | dict:
-		match type_:
-			case FileType.LANG | FileType.PLAINTEXT_IN_LINES | FileType.LOTR_LEGACY_NAMES | FileType.LOTR_LEGACY_SPEECH:
-				return fp.readlines()
-			case FileType.JSON_LANG | FileType.LOTR_RENEWED_SPEECH:
-				return json.load(fp)
-			case _:
-				return fp.read()
+		return Project.handler(type_).read(fp)
 
 	@staticmethod
 	def write(content: "FileContent", fp: io.TextIOBase, type_: FileType):
-		match type_:
-			case FileType.LANG | FileType.PLAINTEXT_IN_LINES | FileType.LOTR_LEGACY_NAMES | FileType.LOTR_LEGACY_SPEECH:
-				fp.writelines(content)
-			case FileType.JSON_LANG | FileType.LOTR_RENEWED_SPEECH:
-				json.dump(content, fp, ensure_ascii=False, indent=2)
-			case _:
-				fp.write(content)
+		Project.handler(type_).write(content, fp)
+
+	@staticmethod
+	def write_json_array(items: Iterable, fp: io.TextIOBase) -> int:
+		"""
+		same text as `json.dump(list(items), fp, ensure_ascii=False, indent=2)`, one item in memory at a time
+		:return: 写入的条目数
+		"""
+		count = 0
+		for item in items:
+			fp.write(",\n  " if count else "[\n  ")
+			fp.write(codec.dumps(item, exact=True).replace("\n", "\n  "))  # entries of the converters, strings only
+			count += 1
+		fp.write("\n]" if count else "[]")
+		return count
+
+	@staticmethod
+	def wash_encoding(*filepaths: Path) -> int:
+		"""change every non utf-8 file under the source folders to utf-8"""
+		count = 0
+		for directory in filepaths or (DIR_ORIGINAL, DIR_REFERENCE, DIR_TRANSLATION, DIR_TRANSLATION_EXTRA):
+			for root, dirs, files in os.walk(directory):
+				for file in files:
+					filepath = Path(root) / file
+					try:
+						with open(filepath, "r", encoding="utf-8") as fp:
+							fp.read()
+					except UnicodeDecodeError:
+						logger.bind(filepath=filepath).warning("File encoding is not utf-8")
+						count += Project.change_encoding(filepath)
+		logger.success(f"Washing encoding completes, {count} files changed")
+		return count
 
 	@staticmethod
 	def change_encoding(filepath: Path) -> bool:
+		"""converting and restoring may both find the same file, the second one finds it done"""
+		with _encoding_lock:
+			return Project._change_encoding(filepath)
+
+	@staticmethod
+	def _change_encoding(filepath: Path) -> bool:
+		import chardet  # only needed for non utf-8 files
+
 		with open(filepath, "rb") as fp:
-			encoding = chardet.detect(fp.read())
+			content = fp.read()
+		with suppress(UnicodeDecodeError):
+			content.decode("utf-8")
+			return True
+
+		encoding = chardet.detect(content)
 
 		encoding, confidence, language = encoding["encoding"], encoding["confidence"], encoding["language"]
 		if encoding == "utf-8":
@@ -954,8 +1353,10 @@ class Project:
 		with open(filepath, "r", encoding=encoding) as fp:
 			content = fp.read()
 
-		with open(filepath, "w", encoding="utf-8") as fp:
+		filepath_tmp = filepath.with_name(f".{filepath.name}.{os.getpid()}.tmp")
+		with open(filepath_tmp, "w", encoding="utf-8") as fp:  # readers never see half a file
 			fp.write(content)
+		os.replace(filepath_tmp, filepath)
 		logger.bind(filepath=filepath).success("Encoding successfully changed to utf-8")
 		return True
 
@@ -967,9 +1368,23 @@ class Project:
 	def restore(self):
 		return self._restore
 
+	@property
+	def conversion(self) -> Conversion:
+		return self._conversion
+
+	@property
+	def restoration(self) -> Restoration:
+		return self._restoration
+
 
 __all__ = [
 	"Project",
 	"Conversion",
-	"Restoration"
+	"Restoration",
+	"FileTypeClassifier",
+	"FileTypeRule",
+	"FormatHandler",
+	"classifier",
+	"handlers",
+	"register_handler",
 ]
@@ -0,0 +1,336 @@
+"""
+Long running local server converting, restoring and previewing single files.
+
+    python cli.py daemon
+    curl "http://127.0.0.1:8766/preview?path=LOTRReworked/lang/ru_RU.lang"
+    curl -X POST http://127.0.0.1:8766/convert -d '{"path": "LOTRReworked/lang/ru_RU.lang"}'
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path, PurePosixPath
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+from src.codec import codec
+from src.config import settings
+from src.core import DIR_ORIGINAL, Conversion, FileContent, FormatHandler, LineFile, Restoration, classifier
+from src.log import logger
+from src.metrics import metrics
+from src.qa import qa
+
+DIR_DOWNLOAD = settings.filepath.root / settings.filepath.download
+
+Response = tuple[int, dict]
+
+
+class DaemonError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class DownloadIndex:
+    """Parsed download files kept in memory, reloaded only when the file on disk changes."""
+    def __init__(self, directory: Path = DIR_DOWNLOAD):
+        self._directory = directory
+        self._entries: dict[Path, tuple[tuple[int, int], list[dict]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, converted_path: Path) -> list[dict] | None:
+        """
+        :param converted_path: 相对于下载文件夹的路径
+        :return: 文件内容，文件不存在时为 None，调用方不应修改
+        """
+        filepath = self.directory / converted_path
+        try:
+            stat = filepath.stat()
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(converted_path, None)
+            return None
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if (cached := self._entries.get(converted_path)) is not None and cached[0] == signature:
+                return cached[1]
+        with open(filepath, "r", encoding="utf-8") as fp:
+            download = codec.load(fp)
+        with self._lock:
+            self._entries[converted_path] = (signature, download)
+        return download
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+
+class SourceIndex:
+    """
+    Parsed source files kept in memory, parsed again only when the file on
+    disk changes. Lines of the line formats are kept as a tuple instead of
+    a `LineFile` reading the file again on every pass.
+    """
+    def __init__(self):
+        self._entries: dict[Path, tuple[tuple[int, int], FileContent | tuple[str, ...]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filepath: Path, handler: FormatHandler) -> FileContent | tuple[str, ...] | None:
+        """
+        :param filepath: 文件的绝对路径
+        :param handler: 解析该文件的格式
+        :return: 解析结果，无法解析时为 None，调用方不应修改
+        """
+        try:
+            stat = filepath.stat()
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(filepath, None)
+            return None
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if (cached := self._entries.get(filepath)) is not None and cached[0] == signature:
+                return cached[1]
+        if (content := handler.parse(filepath)) is None:
+            return None
+        if isinstance(content, LineFile):
+            content = tuple(content)
+        stat = filepath.stat()  # files not in utf-8 were rewritten while parsed
+        with self._lock:
+            self._entries[filepath] = ((stat.st_mtime_ns, stat.st_size), content)
+        return content
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Daemon:
+    """
+    Keeps settings, logging, file type classification, parsed sources and
+    downloaded files warm between requests, so one file is converted or
+    previewed without walking or re-reading the trees.
+
+    Paths in requests are relative to the original folder, as the files of
+    1-SourceFile/original. Converting and restoring write their output
+    like the full runs do, one file at a time.
+    """
+    def __init__(self, host: str = settings.daemon.host, port: int = settings.daemon.port):
+        self._sources = SourceIndex()
+        self._conversion = Conversion(sources=self._sources)
+        self._restoration = Restoration(sources=self._sources)
+        self._downloads = DownloadIndex()
+        self._lock = threading.Lock()  # writes of one file at a time
+        self._started = time.monotonic()
+
+        self._routes: dict[tuple[str, str], Callable[[Path], Response]] = {
+            ("GET", "/entries"): self._entries,
+            ("GET", "/preview"): self._preview,
+            ("POST", "/convert"): self._convert,
+            ("POST", "/restore"): self._restore,
+        }
+
+        self._server = ThreadingHTTPServer((host, port), _DaemonHandler)
+        self._server.daemon_threads = True
+        self._server.app = self
+        self._thread: threading.Thread | None = None
+
+    """ LIFECYCLE """
+    def start(self) -> "Daemon":
+        """serve in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="daemon", daemon=True)
+        self._thread.start()
+        logger.bind(filepath=self.base_url).success("Daemon started")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def serve_forever(self):
+        logger.bind(filepath=self.base_url).success("Daemon started")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def __enter__(self) -> "Daemon":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    """ ROUTES """
+    def _entries(self, relative_path: Path) -> Response:
+        self._exists(DIR_ORIGINAL / relative_path)
+        if (datas := self.conversion.entries(relative_path)) is None:
+            raise DaemonError(422, f"Cannot convert {relative_path.as_posix()}")
+        return 200, {"path": relative_path.as_posix(), "entries": [asdict(_) for _ in datas]}
+
+    def _preview(self, relative_path: Path) -> Response:
+        self._exists(DIR_ORIGINAL / relative_path)
+        converted_path = self._converted_path(relative_path)
+        download = self._download(converted_path)
+        if (previewed := self.restoration.preview(converted_path, download)) is None:
+            raise DaemonError(422, f"Cannot restore {relative_path.as_posix()}")
+        result_path, content = previewed
+        return 200, {"path": relative_path.as_posix(), "result_path": result_path.as_posix(), "content": content}
+
+    def _convert(self, relative_path: Path) -> Response:
+        self._exists(DIR_ORIGINAL / relative_path)
+        with self._lock:
+            self.conversion.output.reset()  # every request is a run of its own, nothing is pruned
+            flag = self.conversion.convert_file(relative_path)
+            metrics.reset()  # nothing is reported, per file metrics would only pile up
+        if not flag:
+            raise DaemonError(422, f"Cannot convert {relative_path.as_posix()}")
+        return 200, {"path": relative_path.as_posix(), "converted_path": self._converted_path(relative_path).as_posix()}
+
+    def _restore(self, relative_path: Path) -> Response:
+        self._exists(DIR_ORIGINAL / relative_path)
+        converted_path = self._converted_path(relative_path)
+        download = self._download(converted_path)
+        with self._lock:
+            self.restoration.output.reset()  # every request is a run of its own, nothing is pruned
+            qa.reset()
+            flag = self.restoration.restore_file(converted_path, download)
+            self.restoration.output.close()  # packs are rebuilt here, loose files are already written
+            issues = [asdict(_) for _ in qa.issues.get(relative_path, [])]  # answered instead of saved
+            qa.reset()
+            metrics.reset()
+        if not flag:
+            raise DaemonError(422, f"Cannot restore {relative_path.as_posix()}")
+        return 200, {"path": relative_path.as_posix(), "issues": issues}
+
+    def _health(self) -> Response:
+        return 200, {
+            "uptime": time.monotonic() - self._started,
+            "sources": len(self.sources),
+            "downloads": len(self.downloads),
+            "classified": len(classifier),
+        }
+
+    """ HTTP """
+    def handle(self, method: str, url: str, body: bytes) -> Response:
+        split = urlsplit(url)
+        route = split.path.rstrip("/")
+        if (method, route) == ("GET", "/health"):
+            return self._health()
+        if (function := self._routes.get((method, route))) is None:
+            return 404, {"message": f"No route for {method} {split.path}"}
+
+        try:
+            relative_path = self._relative_path(self._path(method, split.query, body))
+            started = time.perf_counter()
+            status, payload = function(relative_path)
+            return status, {**payload, "ms": (time.perf_counter() - started) * 1000}
+        except DaemonError as e:
+            return e.status, {"message": e.message}
+        except Exception as e:
+            logger.bind(filepath=split.path).exception("Daemon request failed")
+            return 500, {"message": f"{type(e).__name__}: {e}"}
+
+    @staticmethod
+    def _path(method: str, query: str, body: bytes) -> object:
+        """path of the query string, or of the json object in the body"""
+        if method == "GET":
+            return {key: values[-1] for key, values in parse_qs(query).items()}.get("path")
+        try:
+            request = json.loads(body or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise DaemonError(400, f"Body is not json: {e}")
+        if not isinstance(request, dict):
+            raise DaemonError(400, "Body must be a json object")
+        return request.get("path")
+
+    @staticmethod
+    def _relative_path(path: object) -> Path:
+        """paths stay inside the original folder"""
+        if not path:
+            raise DaemonError(400, "Missing path")
+        if not isinstance(path, str):
+            raise DaemonError(400, f"Path must be a string, got {type(path).__name__}")
+        if "\0" in path:
+            raise DaemonError(400, "Path must not contain null characters")
+        posix = PurePosixPath(path.replace("\\", "/"))
+        if posix.is_absolute() or ".." in posix.parts:
+            raise DaemonError(400, f"Path must be relative to the original folder: {path}")
+        return Path(*posix.parts)
+
+    def _download(self, converted_path: Path) -> list[dict]:
+        """own download of the file, restoring expands the shared entries of deduplicated files as full runs do"""
+        self.restoration.dedup.load()
+        if (download := self.downloads.get(converted_path)) is not None:
+            return download
+        if self.restoration.dedup.indexed(converted_path):
+            return []  # every entry went to the shared file
+        raise DaemonError(404, f"No download for {converted_path.with_suffix('').as_posix()}")
+
+    @staticmethod
+    def _converted_path(relative_path: Path) -> Path:
+        return relative_path.parent / f"{relative_path.name}.json"
+
+    @staticmethod
+    def _exists(filepath: Path):
+        if not os.path.isfile(filepath):
+            raise DaemonError(404, f"File not found: {filepath.relative_to(DIR_ORIGINAL).as_posix()}")
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def conversion(self) -> Conversion:
+        return self._conversion
+
+    @property
+    def restoration(self) -> Restoration:
+        return self._restoration
+
+    @property
+    def sources(self) -> SourceIndex:
+        return self._sources
+
+    @property
+    def downloads(self) -> DownloadIndex:
+        return self._downloads
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status, payload = self.server.app.handle(self.command, self.path, body)
+        content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, format: str, *args):
+        logger.bind(filepath=self.path).debug(f"{self.command} {args[1] if len(args) > 1 else ''}")
+
+
+__all__ = [
+    "Daemon",
+    "DownloadIndex",
+    "SourceIndex",
+]
@@ -0,0 +1,236 @@
+"""
+Identical originals converted once: a shared file per mod keyed by content hash, an index to expand them again.
+
+    DEDUP_ENABLED=true python cli.py convert
+    python cli.py push          # the index of what is on paratranz now
+    python cli.py restore       # expands the shared translations of the pushed files
+
+Converting writes index.json for the converted folder, pushing copies it to
+pushed.json. Restoring only reads pushed.json: the downloads are whatever
+was pushed last, whatever has been converted since.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import Counter
+from pathlib import Path, PurePosixPath
+from typing import Iterable, Iterator
+
+from src.config import settings
+from src.log import logger
+
+SHARED_NAME = "_shared.json"  # in every mod folder of the converted / download trees
+FILEPATH_INDEX = settings.filepath.root / settings.filepath.data / "dedup" / "index.json"
+FILEPATH_PUSHED = settings.filepath.root / settings.filepath.data / "dedup" / "pushed.json"
+OCCURRENCES = 3  # places listed in the context of a shared entry
+
+
+def shared_key(original: str) -> str:
+    """same original, same key, in every run"""
+    return f"shared.{hashlib.sha1(original.encode('utf-8')).hexdigest()[:16]}"
+
+
+class Deduplicator:
+    """
+    Converting: the files of the deduplicated file types are held until the
+    walk is over. An untranslated original found at least twice in a mod then
+    leaves its files for the shared file of the mod, once. Whatever is left
+    stays in the file, which is not written at all when nothing is left. The
+    index keeps every (file, key) of the files that lost entries, in order,
+    with the shared key it went to, or null.
+
+    Restoring: a file in the index is put back together from its own
+    download, by key, and the shared download of its mod, by shared key.
+    """
+    def __init__(self, file_types: Iterable[str] = settings.dedup.file_types, filepath_index: Path = FILEPATH_INDEX):
+        self._file_types = frozenset(file_types)
+        self._filepath_index = filepath_index
+        self._index: dict[str, list[list[str | None]]] = {}
+        self._index_signature: tuple[int, int] | None = None
+        self._held: dict[str, list[dict]] = {}  # converted path -> entries, while converting
+        self._shared: dict[str, dict[str, dict]] = {}  # mod -> shared key -> entry, after splitting
+        self._downloads: dict[Path, tuple[tuple[int, int], dict[str, dict]]] = {}  # shared downloads by signature
+        self._lock = threading.Lock()
+
+    """ CONVERTING """
+    def reset(self):
+        with self._lock:
+            self._index = {}
+            self._index_signature = None
+            self._held = {}
+            self._shared = {}
+
+    def eligible(self, file_type_name: str) -> bool:
+        return file_type_name in self._file_types
+
+    def hold(self, converted_path: Path, datas: Iterable[dict]):
+        """
+        :param converted_path: 相对于转换文件夹的路径，须在某个模组文件夹下
+        :param datas: 转换出的词条
+        """
+        datas = list(datas)
+        with self._lock:
+            self._held[converted_path.as_posix()] = datas
+
+    @staticmethod
+    def _shareable(data: dict) -> bool:
+        return not data["translation"] and data["original"] and not data["key"].startswith("BLANK")
+
+    def split(self) -> Iterator[tuple[Path, list[dict]]]:
+        """
+        every held file with the entries left in it, files left empty are skipped,
+        then the shared file of every mod, all relative to the converted folder
+        """
+        counts: dict[str, Counter] = {}
+        for file, datas in self._held.items():
+            counter = counts.setdefault(file.split("/", 1)[0], Counter())
+            counter.update(data["original"] for data in datas if self._shareable(data))
+
+        for file, datas in self._held.items():
+            mod = file.split("/", 1)[0]
+            shared, counter = self._shared.setdefault(mod, {}), counts[mod]
+            rows, kept = [], []
+            for data in datas:
+                if not self._shareable(data) or counter[data["original"]] < 2:
+                    rows.append([data["key"], None])
+                    kept.append(data)
+                    continue
+
+                key = shared_key(data["original"])
+                rows.append([data["key"], key])
+                if (entry := shared.get(key)) is None:
+                    shared[key] = {"key": key, "original": data["original"], "translation": "", "context": data["context"], "occurrences": [f"{file}#{data['key']}"]}
+                else:
+                    entry["occurrences"].append(f"{file}#{data['key']}")
+            if len(kept) < len(datas):
+                self._index[file] = rows
+            if kept:
+                yield Path(PurePosixPath(file)), kept
+        self._held = {}
+
+        for mod, shared in sorted(self._shared.items()):
+            if shared:
+                yield Path(mod) / SHARED_NAME, [self._entry(_) for _ in shared.values()]
+
+    def save(self):
+        """write the index, after the files"""
+        count = sum(len(_) for _ in self._shared.values())
+        occurrences = sum(len(_["occurrences"]) for shared in self._shared.values() for _ in shared.values())
+        os.makedirs(self._filepath_index.parent, exist_ok=True)
+        filepath_tmp = self._filepath_index.with_suffix(".tmp")
+        with open(filepath_tmp, "w", encoding="utf-8") as fp:
+            json.dump(self._index, fp, ensure_ascii=False, separators=(",", ":"))
+        os.replace(filepath_tmp, self._filepath_index)
+        logger.bind(filepath=self._filepath_index).success(
+            f"Dedup: {occurrences} entries of {len(self._index)} files share {count} originals"
+        )
+
+    @staticmethod
+    def _entry(entry: dict) -> dict:
+        occurrences = entry["occurrences"]
+        places = "\n".join(occurrences[:OCCURRENCES]) + (f"\n... {len(occurrences) - OCCURRENCES} more" if len(occurrences) > OCCURRENCES else "")
+        context = f"{entry['context']}\n" if entry["context"] else ""
+        return {
+            "key": entry["key"],
+            "original": entry["original"],
+            "translation": entry["translation"],
+            "context": f"{context}Shared by {len(occurrences)} entries:\n{places}",
+        }
+
+    def remove(self):
+        """converting without dedup, the files are whole again"""
+        self._filepath_index.unlink(missing_ok=True)
+        self.reset()
+
+    def publish(self, filepath_pushed: Path = FILEPATH_PUSHED):
+        """after every converted file is pushed, restoring follows the index of the converted folder"""
+        if not self._filepath_index.exists():
+            filepath_pushed.unlink(missing_ok=True)
+            return
+        os.makedirs(filepath_pushed.parent, exist_ok=True)
+        filepath_tmp = filepath_pushed.with_suffix(".tmp")
+        shutil.copyfile(self._filepath_index, filepath_tmp)
+        os.replace(filepath_tmp, filepath_pushed)
+        logger.bind(filepath=filepath_pushed).success("Dedup index of the pushed files saved")
+
+    """ RESTORING """
+    def load(self) -> bool:
+        """reload the index when it changed on disk, :return: 是否有索引"""
+        try:
+            stat = self._filepath_index.stat()
+        except FileNotFoundError:
+            with self._lock:
+                self._index, self._index_signature = {}, None
+            return False
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._index_signature:
+            with open(self._filepath_index, "r", encoding="utf-8") as fp:
+                index = json.load(fp)
+            with self._lock:
+                self._index, self._index_signature = index, signature
+        return True
+
+    def indexed(self, converted_path: Path) -> bool:
+        return converted_path.as_posix() in self._index
+
+    @staticmethod
+    def shared(converted_path: Path) -> bool:
+        return converted_path.name == SHARED_NAME and len(converted_path.parts) == 2
+
+    def files(self) -> list[Path]:
+        return [Path(PurePosixPath(_)) for _ in self._index]
+
+    def expand(self, converted_path: Path, download: list[dict], directory: Path) -> list[dict] | None:
+        """
+        :param converted_path: 相对于下载文件夹的路径
+        :param download: 文件自己的下载内容，没有时为空列表
+        :param directory: 下载文件夹，共用文件从中读取
+        :return: 原样顺序的完整词条，共用文件缺失时为 None
+        """
+        rows = self._index[converted_path.as_posix()]
+        own = {}
+        for data in download:
+            own.setdefault(data["key"], data)
+        if all(key in own for key, _ in rows):  # pushed whole again since
+            return download
+        shared = None
+        result = []
+        for key, key_shared in rows:
+            if (data := own.get(key)) is not None:  # converted without dedup since, or kept in the file
+                result.append(data)
+            elif key_shared is None:
+                result.append({"key": key, "original": "", "translation": ""})
+            else:
+                if shared is None and (shared := self._download(directory / converted_path.parts[0] / SHARED_NAME)) is None:
+                    return None
+                if (entry := shared.get(key_shared)) is None:
+                    logger.bind(filepath=converted_path).error(f"Shared entry {key_shared} of {key} not downloaded")
+                    return None
+                result.append({"key": key, "original": entry["original"], "translation": entry["translation"]})
+        return result
+
+    def _download(self, filepath: Path) -> dict[str, dict] | None:
+        try:
+            stat = filepath.stat()
+        except FileNotFoundError:
+            logger.bind(filepath=filepath).error("Shared file not downloaded")
+            return None
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if (cached := self._downloads.get(filepath)) is not None and cached[0] == signature:
+                return cached[1]
+        with open(filepath, "r", encoding="utf-8") as fp:
+            shared = {data["key"]: data for data in json.load(fp)}
+        with self._lock:
+            self._downloads[filepath] = (signature, shared)
+        return shared
+
+
+__all__ = [
+    "Deduplicator",
+    "shared_key",
+]
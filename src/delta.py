@@ -0,0 +1,154 @@
+"""
+Translations added, removed and changed between two Paratranz exports.
+
+    python cli.py delta old.zip resource/3-TranslatedParatranzFile
+    python cli.py delta snapshot-2024-05 snapshot-2024-06 --format markdown
+"""
+import datetime
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path, PurePosixPath
+from typing import IO, Iterator
+from zipfile import ZipFile, is_zipfile
+
+from src.log import logger
+from src.metrics import DIR_REPORTS
+
+FORMATS = {
+    "jsonl": "jsonl",
+    "markdown": "md",
+}
+MARKS = {"added": "+", "removed": "-", "changed": "~"}
+
+
+@dataclass
+class Change:
+    file: str  # relative to the export, as in 3-TranslatedParatranzFile
+    key: str
+    kind: str  # added, removed or changed
+    original: str
+    old: str
+    new: str
+
+
+class Export:
+    """
+    A zip as downloaded from Paratranz (its utf8/ folder) or a folder like
+    3-TranslatedParatranzFile. Files are read one at a time, so comparing
+    two exports never holds more than one file of each in memory.
+    """
+    def __init__(self, path: Path):
+        self._path = path
+        self._zip: ZipFile | None = ZipFile(path) if path.is_file() and is_zipfile(path) else None
+        self._prefix = ""
+        if self._zip is not None and any(_.startswith("utf8/") for _ in self._zip.namelist()):
+            self._prefix = "utf8/"
+        elif self._zip is None and not path.is_dir():
+            raise FileNotFoundError(path)
+
+    def files(self) -> list[str]:
+        """:return: 相对路径，posix 格式"""
+        if self._zip is not None:
+            return [
+                _.filename[len(self._prefix):] for _ in self._zip.infolist()
+                if not _.is_dir() and _.filename.startswith(self._prefix) and _.filename.endswith(".json")
+            ]
+        return [_.relative_to(self.path).as_posix() for _ in self.path.rglob("*.json") if _.is_file()]
+
+    def load(self, relative_path: str) -> dict[str, dict]:
+        """:return: 按 key 索引的词条，重复的 key 取第一条"""
+        if self._zip is not None:
+            with self._zip.open(self._prefix + relative_path) as fp:
+                datas = json.load(fp)
+        else:
+            with open(self.path / PurePosixPath(relative_path), "r", encoding="utf-8") as fp:
+                datas = json.load(fp)
+        entries = {}
+        for data in datas:
+            entries.setdefault(data["key"], data)
+        return entries
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+
+    def __enter__(self) -> "Export":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+
+def compare(old: Export, new: Export) -> Iterator[Change]:
+    """
+    files in path order, entries in the order of the new export, removed ones after them
+    only translations count, an entry that appears untranslated is not added
+    """
+    files_old, files_new = set(old.files()), set(new.files())
+    for relative_path in sorted(files_old | files_new):
+        entries_old = old.load(relative_path) if relative_path in files_old else {}
+        entries_new = new.load(relative_path) if relative_path in files_new else {}
+        for key, data in entries_new.items():
+            translation = data.get("translation") or ""
+            before = (entries_old.pop(key, None) or {}).get("translation") or ""
+            if translation == before:
+                continue
+            kind = "changed" if translation and before else "added" if translation else "removed"
+            yield Change(relative_path, key, kind, data.get("original") or "", before, translation)
+        for key, data in entries_old.items():
+            if translation := data.get("translation") or "":
+                yield Change(relative_path, key, "removed", data.get("original") or "", translation, "")
+
+
+def report(old_path: Path, new_path: Path, format: str = "jsonl", filepath: Path | None = None) -> Path:
+    """
+    :param format: jsonl 每行一条变化，markdown 按文件分节的表格
+    :param filepath: 报告路径，默认写入 data/reports
+    """
+    if format not in FORMATS:
+        raise ValueError(f"format should be one of {', '.join(FORMATS)}, got {format!r}")
+    if filepath is None:
+        filepath = DIR_REPORTS / f'{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.delta.{FORMATS[format]}'
+    os.makedirs(filepath.parent, exist_ok=True)
+
+    logger.info("")
+    logger.info("======= DELTA START =======")
+    counts = {"added": 0, "removed": 0, "changed": 0}
+    with Export(old_path) as old, Export(new_path) as new, open(filepath, "w", encoding="utf-8") as fp:
+        if format == "markdown":
+            fp.write(f"# {old_path.name} → {new_path.name}\n")
+        current = None
+        for change in compare(old, new):
+            counts[change.kind] += 1
+            if format == "jsonl":
+                fp.write(json.dumps(asdict(change), ensure_ascii=False))
+                fp.write("\n")
+                continue
+            if change.file != current:
+                current = change.file
+                fp.write(f"\n## {current}\n\n| | key | old | new |\n|---|---|---|---|\n")
+            _markdown_row(fp, change)
+        if format == "markdown":
+            fp.write(f"\n{counts['added']} added, {counts['removed']} removed, {counts['changed']} changed\n")
+    logger.bind(filepath=filepath).success(
+        f"Delta: {counts['added']} added, {counts['removed']} removed, {counts['changed']} changed"
+    )
+    return filepath
+
+
+def _markdown_row(fp: IO[str], change: Change):
+    cells = (MARKS[change.kind], f"`{change.key}`", change.old, change.new)
+    fp.write("| " + " | ".join(_.replace("|", "\\|").replace("\n", "<br>") for _ in cells) + " |\n")
+
+
+__all__ = [
+    "Change",
+    "Export",
+    "compare",
+    "report",
+]
@@ -8,7 +8,13 @@ class UnknownFileTypeException(Exception):
         super().__init__("Unknown file type", *args, **kwargs)
 
 
+class ShardException(Exception):
+    def __init__(self, *args, **kwargs):
+        super().__init__("Shards do not add up", *args, **kwargs)
+
+
 __all__ = [
     "ProjectStructureException",
+    "ShardException",
     "UnknownFileTypeException",
 ]
\ No newline at end of file
@@ -1,16 +1,19 @@
-import json
 import os
 from datetime import datetime
 from enum import Enum, auto
+from typing import TYPE_CHECKING
 from urllib.parse import unquote
 
-from loguru._logger import Logger
 from pydantic import BaseModel, Field, field_serializer
-from selenium import webdriver
-from selenium.webdriver.common.by import By
 
+from src.codec import codec
 from src.config import settings
 from src.log import logger
+from src.metrics import metrics
+
+if TYPE_CHECKING:
+    from loguru._logger import Logger
+    from selenium import webdriver
 
 
 class ParatranzTermPos(Enum):
@@ -72,7 +75,7 @@ class TableModel(BaseModel, extra="allow"):
 
 
 class LoTRWiki:
-    def __init__(self, driver: webdriver):
+    def __init__(self, driver: "webdriver"):
         self._project_name = "LoTRWiki"
         self._driver = driver
         self._logger = logger.bind(project_name=self.project_name)
@@ -81,6 +84,8 @@ class LoTRWiki:
         os.makedirs(settings.filepath.root / settings.filepath.resource / self.project_name, exist_ok=True)
 
     def get_target_urls(self) -> dict[str, str]:
+        from selenium.webdriver.common.by import By
+
         url = "https://lotr.huijiwiki.com/wiki/模板:译名表目录"
         self.driver.get(url)
         self.driver.add_cookie({'name': 'huijiUserName', 'value': settings.huijiwiki.username})
@@ -98,6 +103,12 @@ class LoTRWiki:
         }
 
     def get_data(self, urls: dict[str, str]) -> list[TableModel]:
+        with metrics.stage("wiki.get_data"):
+            datas = self._get_data(urls)
+            metrics.add(entries=len(datas))
+        return datas
+
+    def _get_data(self, urls: dict[str, str]) -> list[TableModel]:
         datas: list[TableModel] = []
         for url in urls.values():
             data = self._get_each_data(url)
@@ -117,6 +128,8 @@ class LoTRWiki:
         return datas
 
     def _get_each_data(self, url: str) -> zip | None:
+        from selenium.webdriver.common.by import By
+
         self.driver.implicitly_wait(1)
         self.driver.get(url)
         original_name_elements = self.driver.find_elements(By.XPATH, '//tr/td[1]')
@@ -136,7 +149,7 @@ class LoTRWiki:
         result_models = self._process_generate_results(mappings)
 
         with open(settings.filepath.root / settings.filepath.resource / self.project_name / "translations.json", "w", encoding="utf-8") as fp:
-            json.dump([_.model_dump(exclude_unset=True) for _ in result_models], fp=fp, indent=4, ensure_ascii=False)
+            codec.dump([_.model_dump(exclude_unset=True) for _ in result_models], fp, indent=4)
         self.logger.success(f"Result saved, {len(result_models)} elements in total.")
         return result_models
 
@@ -165,11 +178,11 @@ class LoTRWiki:
         return self._project_name
 
     @property
-    def driver(self) -> webdriver:
+    def driver(self) -> "webdriver":
         return self._driver
 
     @property
-    def logger(self) -> Logger:
+    def logger(self) -> "Logger":
         return self._logger
 
 
@@ -1,5 +1,6 @@
 """Output infos during running."""
 import datetime
+import json
 import os
 import sys
 
@@ -8,29 +9,81 @@ from loguru import logger as logger_
 from src.config import settings
 
 DIR_LOGS = settings.filepath.root / settings.filepath.data / "logs"
-os.makedirs(DIR_LOGS, exist_ok=True)
 
 
-def add_project_name(record):
+def add_extras(record):
     if record["extra"].get("project_name", False):
         record["extra"]["project_name"] = f"[{record['extra']['project_name']}] | "
     else:
         record["extra"]["project_name"] = ""
 
-
-def add_filepath(record):
     if record["extra"].get("filepath", False):
         record["extra"]["filepath"] = f" | {record['extra']['filepath']}"
     else:
         record["extra"]["filepath"] = ""
 
+
+def format_jsonl(record) -> str:
+    """one json object per line, extras without the decorations added for text sinks"""
+    extra = record["extra"]
+    extra["jsonl"] = json.dumps({
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "project_name": extra.get("project_name", "").removeprefix("[").removesuffix("] | "),
+        "filepath": extra.get("filepath", "").removeprefix(" | "),
+        "module": record["module"],
+        "function": record["function"],
+        "line": record["line"],
+        "thread": record["thread"].name,
+    }, ensure_ascii=False)
+    return "{extra[jsonl]}\n"
+
+
 logger_.remove()
-logger_ = logger_.patch(add_project_name)
-logger_ = logger_.patch(add_filepath)
-logger_.add(sink=sys.stdout, format=settings.project.log_format, colorize=True, level=settings.project.log_level)
-logger_.add(sink=DIR_LOGS / f'{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.log', format=settings.project.log_format, colorize=False, level="INFO", encoding='utf-8')
-logger_.add(sink=DIR_LOGS / f'{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.debug', format=settings.project.log_format, colorize=False, level="DEBUG", encoding='utf-8')
+logger_ = logger_.patch(add_extras)
 
 logger = logger_
 
-__all__ = ["logger"]
+LEVELS = ("TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL")
+
+_sinks: list[int] = []
+_enabled: frozenset[str] = frozenset()  # levels accepted by any sink, none before setup
+
+
+def setup_logger():
+    """add stdout and timestamped file sinks, called once by entry points instead of at import"""
+    global _enabled
+    if _sinks:
+        return
+    os.makedirs(DIR_LOGS, exist_ok=True)
+    filename = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    enqueue = settings.project.log_enqueue
+
+    sinks = [
+        dict(sink=sys.stdout, colorize=True, level=settings.project.log_level),
+        dict(sink=DIR_LOGS / f"{filename}.log", colorize=False, level="INFO", encoding="utf-8"),
+    ]
+    if settings.project.log_debug_file:
+        sinks.append(dict(sink=DIR_LOGS / f"{filename}.debug", colorize=False, level="DEBUG", encoding="utf-8"))
+    for sink in sinks:
+        _sinks.append(logger_.add(format=settings.project.log_format, enqueue=enqueue, **sink))
+
+    if settings.project.log_json:
+        _sinks.append(logger_.add(sink=DIR_LOGS / f"{filename}.jsonl", format=format_jsonl, level="DEBUG", enqueue=enqueue, encoding="utf-8"))
+        levelno = logger_.level("DEBUG").no
+    else:
+        levelno = min(logger_.level(sink["level"]).no for sink in sinks)
+    _enabled = frozenset(_ for _ in LEVELS if logger_.level(_).no >= levelno)
+
+
+def log_enabled(level: str) -> bool:
+    """cheap check before building messages in hot loops, levels are resolved once in `setup_logger`"""
+    return level in _enabled
+
+
+__all__ = [
+    "log_enabled",
+    "logger",
+    "setup_logger",
+]
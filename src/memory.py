@@ -0,0 +1,232 @@
+"""Fuzzy translation memory, suggests translations of similar originals."""
+import json
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+from src.codec import codec
+from src.config import settings
+from src.log import logger
+
+try:
+    import numpy as np
+except ImportError:  # optional, falls back to pure python scoring
+    np = None
+
+if TYPE_CHECKING:
+    from src.core import Data
+
+WHITESPACE = re.compile(r"\s+")
+
+
+class _IntArray:
+    """int32 numpy array grown in place, doubling its capacity, so appends are amortized"""
+    __slots__ = ("_buffer", "_length")
+
+    def __init__(self, values: list[int]):
+        self._buffer = np.asarray(values, dtype=np.int32)
+        self._length = len(values)
+
+    def append(self, value: int):
+        if self._length == len(self._buffer):
+            buffer = np.empty(max(8, 2 * self._length), dtype=np.int32)
+            buffer[:self._length] = self._buffer[:self._length]
+            self._buffer = buffer
+        self._buffer[self._length] = value
+        self._length += 1
+
+    @property
+    def array(self) -> "np.ndarray":
+        return self._buffer[:self._length]
+
+
+@dataclass
+class Suggestion:
+    original: str
+    translation: str
+    score: float
+
+
+class TranslationMemory:
+    """
+    Character n-gram inverted index over (original, translation) pairs.
+
+    Candidates are the segments sharing at least one n-gram with the query,
+    they are scored all at once by dice coefficient of their n-gram sets.
+    """
+    def __init__(
+        self,
+        ngram: int = settings.memory.ngram,
+        threshold: float = settings.memory.threshold,
+        limit: int = settings.memory.limit,
+        max_posting: int = settings.memory.max_posting,
+    ):
+        self._ngram = ngram
+        self._threshold = threshold
+        self._limit = limit
+        self._max_posting = max_posting
+
+        self._originals: list[str] = []
+        self._translations: list[str] = []
+        self._sizes: list[int] = []
+        self._seen: dict[str, int] = {}
+        self._postings: dict[str, list[int]] = {}
+
+        # numpy copies of the postings, built on first lookup, then appended to as segments are added
+        self._arrays: dict[str, _IntArray] = {}
+        self._sizes_array: _IntArray | None = None
+
+    def __len__(self) -> int:
+        return len(self._originals)
+
+    def add(self, original: str, translation: str):
+        if not original.strip() or not translation.strip():
+            return
+        if original in self._seen:  # keep the first translation met
+            return
+
+        grams = self._grams(original)
+        if not grams:
+            return
+
+        idx = len(self._originals)
+        self._seen[original] = idx
+        self._originals.append(original)
+        self._translations.append(translation)
+        self._sizes.append(len(grams))
+        for gram in grams:
+            posting = self._postings.setdefault(gram, [])
+            posting.append(idx)
+            if (array := self._arrays.get(gram)) is not None:
+                if len(posting) > self._max_posting:
+                    del self._arrays[gram]  # never looked up again
+                else:
+                    array.append(idx)
+        if self._sizes_array is not None:
+            self._sizes_array.append(len(grams))
+
+    def add_datas(self, datas: Iterable["Data"]):
+        for data in datas:
+            if data.translation and data.original != "MISSING":
+                self.add(data.original, data.translation)
+
+    def load(self, directory: Path):
+        """load translated paratranz jsons, e.g. the last export"""
+        if not directory.exists():
+            return
+        for root, dirs, files in os.walk(directory):
+            for file in files:
+                if not file.endswith(".json"):
+                    continue
+                try:
+                    with open(Path(root) / file, "r", encoding="utf-8") as fp:
+                        items = codec.load(fp)
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    logger.bind(filepath=Path(root) / file).warning("Not a paratranz file, skipped in memory")
+                    continue
+                for item in items:
+                    if isinstance(item, dict):
+                        self.add(item.get("original", ""), item.get("translation", ""))
+        logger.bind(filepath=directory).debug(f"Translation memory loaded, {len(self)} segments in total")
+
+    def suggest(self, original: str) -> list[Suggestion]:
+        grams = self._grams(original)
+        if not grams or not self._originals:
+            return []
+
+        if np is None:
+            return self._score_python(original, grams)
+        return self._score_numpy(original, grams)
+
+    def annotate(self, datas: list["Data"]):
+        """append suggestions to the context of untranslated datas"""
+        for data in datas:
+            if data.translation or not data.original.strip() or data.original == "MISSING":
+                continue
+            suggestions = self.suggest(data.original)
+            if not suggestions:
+                continue
+            lines = "\n".join(
+                f"[TM {suggestion.score:.0%}] {suggestion.original} => {suggestion.translation}"
+                for suggestion in suggestions
+            )
+            data.context = f"{data.context}\n{lines}" if data.context else lines
+
+    def _score_numpy(self, original: str, grams: set[str]) -> list[Suggestion]:
+        arrays = [
+            array
+            for gram in grams
+            if (array := self._posting_array(gram)) is not None
+        ]
+        if not arrays:
+            return []
+        if self._sizes_array is None:
+            self._sizes_array = _IntArray(self._sizes)
+        sizes = self._sizes_array.array
+
+        # dice >= threshold needs at least this many shared grams whatever the candidate size
+        least = math.ceil(self._threshold * len(grams) / (2 - self._threshold))
+        counts = np.bincount(np.concatenate(arrays), minlength=len(self))
+        ids = np.flatnonzero(counts >= least)
+        scores = 2 * counts[ids] / (len(grams) + sizes[ids])
+        mask = scores >= self._threshold
+        ids, scores = ids[mask], scores[mask]
+        if not ids.size:
+            return []
+
+        if ids.size > self._limit:
+            top = np.argpartition(-scores, self._limit)[:self._limit]
+            ids, scores = ids[top], scores[top]
+        order = np.lexsort((ids, -scores))
+        return self._suggestions(original, ((int(ids[i]), float(scores[i])) for i in order))
+
+    def _score_python(self, original: str, grams: set[str]) -> list[Suggestion]:
+        shared = Counter(
+            idx
+            for gram in grams
+            if len(posting := self._postings.get(gram, ())) <= self._max_posting
+            for idx in posting
+        )
+        scores = [
+            (idx, 2 * count / (len(grams) + self._sizes[idx]))
+            for idx, count in shared.items()
+        ]
+        scores = sorted(
+            (_ for _ in scores if _[1] >= self._threshold),
+            key=lambda _: (-_[1], _[0]),
+        )
+        return self._suggestions(original, scores[:self._limit])
+
+    def _suggestions(self, original: str, scores: Iterable[tuple[int, float]]) -> list[Suggestion]:
+        return [
+            Suggestion(
+                original=self._originals[idx],
+                translation=self._translations[idx],
+                score=1.0 if self._originals[idx] == original else min(score, 0.99),
+            )
+            for idx, score in scores
+        ]
+
+    def _posting_array(self, gram: str) -> "np.ndarray | None":
+        posting = self._postings.get(gram)
+        if posting is None or len(posting) > self._max_posting:
+            return None
+        if (array := self._arrays.get(gram)) is None:
+            array = self._arrays[gram] = _IntArray(posting)
+        return array.array
+
+    def _grams(self, text: str) -> set[str]:
+        text = " " + WHITESPACE.sub(" ", text.strip().lower()) + " "
+        if len(text) <= self._ngram:
+            return {text}
+        return {text[i:i + self._ngram] for i in range(len(text) - self._ngram + 1)}
+
+
+__all__ = [
+    "Suggestion",
+    "TranslationMemory",
+]
@@ -0,0 +1,277 @@
+"""Wall time, bytes and entry counters per stage and per file."""
+import datetime
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterator
+
+from src.config import settings
+from src.log import logger
+
+DIR_REPORTS = settings.filepath.root / settings.filepath.data / "reports"
+
+
+@dataclass
+class FileMetric:
+    stage: str
+    filepath: str
+    file_type: str = ""
+    seconds: float = 0.0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    entries: int = 0
+    memory_peak: int = 0  # traced bytes, only with memory profiling
+    memory_growth: int = 0  # peak minus traced bytes when opened
+
+
+@dataclass
+class StageMetric:
+    name: str
+    seconds: float = 0.0
+    calls: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    entries: int = 0
+    memory_peak: int = 0
+    memory_growth: int = 0
+
+
+class _MemoryWindow:
+    """peak traced memory while a stage or file is open"""
+    __slots__ = ("start", "peak", "snapshot")
+
+    def __init__(self, start: int, snapshot: tracemalloc.Snapshot | None):
+        self.start = start
+        self.peak = start
+        self.snapshot = snapshot
+
+
+class Metrics:
+    """
+    Collects timings during a run, `finish` writes them as a json report
+    and logs the slowest files. Counters go to the file or stage currently
+    open in the calling thread or task.
+    """
+    def __init__(self):
+        self._stages: dict[str, StageMetric] = {}
+        self._files: list[FileMetric] = []
+        self._lock = threading.Lock()
+        self._open: ContextVar[tuple] = ContextVar("metrics", default=())
+        self._started = time.perf_counter()
+
+        self._profiling = False
+        self._windows: list[_MemoryWindow] = []
+        self._sites: dict[str, list[dict]] = {}
+
+    def profile_memory(self, frames: int = 1):
+        """
+        trace allocations from now on, every stage and file gets its peak and
+        stages and large files the allocation sites that grew the most
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._profiling = True
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageMetric]:
+        with self._lock:
+            metric = self._stages.setdefault(name, StageMetric(name=name))
+        token = self._open.set((*self._open.get(), metric))
+        window = self._open_window(snapshot=True) if self._profiling else None
+        start = time.perf_counter()
+        try:
+            yield metric
+        finally:
+            self._open.reset(token)
+            with self._lock:
+                metric.seconds += time.perf_counter() - start
+                metric.calls += 1
+            if window is not None:
+                self._close_window(window, metric, f"stage:{name}")
+
+    @contextmanager
+    def file(self, stage: str, filepath: Path | str, source: Path | None = None) -> Iterator[FileMetric]:
+        """
+        :param source: 文件在本地的路径，内存分析时大于 `profile_file_size` 的文件会记录分配位置
+        """
+        metric = FileMetric(stage=stage, filepath=Path(filepath).as_posix())
+        token = self._open.set((*self._open.get(), metric))
+        window = None
+        if self._profiling:
+            large = source is not None and source.exists() and source.stat().st_size >= settings.project.profile_file_size
+            window = self._open_window(snapshot=large)
+        start = time.perf_counter()
+        try:
+            yield metric
+        finally:
+            self._open.reset(token)
+            metric.seconds = time.perf_counter() - start
+            with self._lock:
+                self._files.append(metric)
+            if window is not None:
+                self._close_window(window, metric, f"file:{stage}:{metric.filepath}")
+
+    def _open_window(self, snapshot: bool) -> _MemoryWindow:
+        with self._lock:
+            self._fold_peak()
+            before = tracemalloc.take_snapshot() if snapshot else None
+            tracemalloc.reset_peak()  # taking the snapshot does not count towards any window
+            window = _MemoryWindow(tracemalloc.get_traced_memory()[0], before)
+            self._windows.append(window)
+        return window
+
+    def _close_window(self, window: _MemoryWindow, metric: FileMetric | StageMetric, name: str):
+        with self._lock:
+            self._fold_peak()
+            self._windows.remove(window)
+        metric.memory_peak = max(metric.memory_peak, window.peak)
+        metric.memory_growth = max(metric.memory_growth, window.peak - window.start)
+        if window.snapshot is None:
+            return
+
+        after = tracemalloc.take_snapshot()
+        sites = []
+        for diff in after.compare_to(window.snapshot, "lineno"):
+            if len(sites) >= settings.project.report_top:
+                break
+            frame = diff.traceback[0]
+            if diff.size_diff <= 0 or frame.filename == tracemalloc.__file__ or frame.filename.startswith("<"):  # the snapshots, imports
+                continue
+            sites.append({"site": f"{frame.filename}:{frame.lineno}", "size_diff": diff.size_diff, "count_diff": diff.count_diff})
+        window.snapshot = None
+        with self._lock:
+            self._sites[name] = sites
+            tracemalloc.reset_peak()
+
+    def _fold_peak(self):
+        """the peak is process wide, pass it to every open window before resetting it for the next one"""
+        peak = tracemalloc.get_traced_memory()[1]
+        for window in self._windows:
+            window.peak = max(window.peak, peak)
+        tracemalloc.reset_peak()
+
+    def add(self, *, bytes_read: int = 0, bytes_written: int = 0, entries: int = 0):
+        """count towards the innermost file or stage open in this thread or task"""
+        if not (opened := self._open.get()):
+            return
+        metric = opened[-1]
+        metric.bytes_read += bytes_read
+        metric.bytes_written += bytes_written
+        metric.entries += entries
+
+    def current(self) -> FileMetric | StageMetric | None:
+        opened = self._open.get()
+        return opened[-1] if opened else None
+
+    def report(self) -> dict:
+        with self._lock:
+            files = list(self._files)
+            stages = {name: asdict(stage) for name, stage in self._stages.items()}
+            sites = dict(self._sites)
+
+        for metric in files:  # file counters roll up into their stage
+            stage = stages.setdefault(metric.stage, asdict(StageMetric(name=metric.stage)))
+            stage["bytes_read"] += metric.bytes_read
+            stage["bytes_written"] += metric.bytes_written
+            stage["entries"] += metric.entries
+
+        file_types: dict[str, dict] = {}
+        for metric in files:
+            total = file_types.setdefault(f"{metric.stage}:{metric.file_type or 'UNKNOWN'}", {
+                "files": 0, "seconds": 0.0, "bytes_read": 0, "bytes_written": 0, "entries": 0,
+            })
+            total["files"] += 1
+            total["seconds"] += metric.seconds
+            total["bytes_read"] += metric.bytes_read
+            total["bytes_written"] += metric.bytes_written
+            total["entries"] += metric.entries
+
+        report = {
+            "seconds": time.perf_counter() - self._started,
+            "stages": stages,
+            "file_types": file_types,
+            "files": [asdict(_) for _ in sorted(files, key=lambda _: -_.seconds)],
+        }
+        if self._profiling:
+            report["memory"] = {
+                "peak": max((_["memory_peak"] for _ in stages.values()), default=0),
+                "files": [asdict(_) for _ in sorted(files, key=lambda _: -_.memory_growth)],
+                "sites": sites,
+            }
+        return report
+
+    def finish(self, top: int = settings.project.report_top) -> Path | None:
+        """write the json report and log a summary, nothing if no stage ran"""
+        report = self.report()
+        if not report["stages"]:
+            return None
+
+        os.makedirs(DIR_REPORTS, exist_ok=True)
+        filepath = DIR_REPORTS / f'{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.metrics.json'
+        with open(filepath, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=2)
+
+        logger.info("")
+        logger.info("======= METRICS =======")
+        for stage in report["stages"].values():
+            logger.info(
+                f"{stage['name']:<24}{stage['seconds']:>8.2f}s  {stage['calls']:>5} calls  "
+                f"{stage['entries']:>8} entries  {self._size(stage['bytes_read']):>9} read  {self._size(stage['bytes_written']):>9} written"
+            )
+        for name, total in sorted(report["file_types"].items()):
+            logger.info(f"{name:<36}{total['seconds']:>8.2f}s  {total['files']:>5} files  {total['entries']:>8} entries")
+        if report["files"]:
+            logger.info(f"Slowest {min(top, len(report['files']))} files:")
+            for metric in report["files"][:top]:
+                logger.bind(filepath=metric["filepath"]).info(f"{metric['stage']:<8}{metric['seconds'] * 1000:>9.1f}ms {metric['entries']:>7} entries")
+        if "memory" in report:
+            self._log_memory(report, top)
+        logger.bind(filepath=filepath).success("Metrics report saved")
+        return filepath
+
+    def _log_memory(self, report: dict, top: int):
+        memory = report["memory"]
+        logger.info(f"Memory peak {self._size(memory['peak'])}:")
+        for stage in report["stages"].values():
+            logger.info(f"{stage['name']:<24}{self._size(stage['memory_peak']):>9} peak  {self._size(stage['memory_growth']):>9} growth")
+            for site in memory["sites"].get(f"stage:{stage['name']}", [])[:3]:
+                logger.bind(filepath=site["site"]).info(f"{'':<24}{self._size(site['size_diff']):>9} in {site['count_diff']} blocks")
+        if memory["files"]:
+            logger.info(f"Largest {min(top, len(memory['files']))} files by memory growth:")
+            for metric in memory["files"][:top]:
+                logger.bind(filepath=metric["filepath"]).info(f"{metric['stage']:<8}{self._size(metric['memory_growth']):>9} growth")
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._files.clear()
+            self._sites.clear()
+            self._started = time.perf_counter()
+
+    @property
+    def profiling(self) -> bool:
+        return self._profiling
+
+    @staticmethod
+    def _size(size: int) -> str:
+        for unit in ("B", "KB", "MB"):
+            if size < 1024:
+                return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+            size /= 1024
+        return f"{size:.1f}GB"
+
+
+metrics = Metrics()
+
+__all__ = [
+    "FileMetric",
+    "Metrics",
+    "StageMetric",
+    "metrics",
+]
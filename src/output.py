@@ -0,0 +1,139 @@
+"""Output folders written in place: unchanged files are left alone, stale ones pruned."""
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+from src.log import logger
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class OutputTree:
+    """
+    Files written under one output folder during a run.
+
+    Every file goes to a temp file next to it first. Identical contents
+    are dropped, so unchanged files keep their mtime, other files are
+    renamed over the old one and never seen half written. Files neither
+    written nor kept since `reset` are stale, `prune` removes them.
+    """
+    def __init__(self, root: Path):
+        self._root = root
+        self._touched: set[Path] = set()
+        self._written = 0
+        self._unchanged = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """start a new run, nothing is touched yet"""
+        with self._lock:
+            self._touched.clear()
+            self._written = 0
+            self._unchanged = 0
+
+    @contextmanager
+    def open(self, relative_path: Path, mode: str = "w") -> Iterator[IO]:
+        """
+        :param relative_path: 相对于输出文件夹的路径
+        :param mode: "w" 写入 utf-8 文本，"wb" 写入字节
+        """
+        filepath = self.root / relative_path
+        os.makedirs(filepath.parent, exist_ok=True)
+        filepath_tmp = filepath.with_name(f".{filepath.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            with open(filepath_tmp, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as fp:
+                yield fp
+            self._commit(filepath_tmp, filepath)
+        finally:
+            if filepath_tmp.exists():
+                filepath_tmp.unlink()
+        with self._lock:
+            self._touched.add(Path(relative_path))
+
+    def keep(self, relative_path: Path):
+        """
+        a file that failed this run, its source is still there so its last output stays
+        :param relative_path: 相对于输出文件夹的路径
+        """
+        with self._lock:
+            self._touched.add(Path(relative_path))
+
+    def copy(self, source: Path, relative_path: Path):
+        """
+        :param source: 要复制的文件
+        :param relative_path: 相对于输出文件夹的路径
+        """
+        with open(source, "rb") as src, self.open(relative_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+
+    def _commit(self, filepath_tmp: Path, filepath: Path):
+        if self._same(filepath_tmp, filepath):
+            with self._lock:
+                self._unchanged += 1
+            return
+        os.replace(filepath_tmp, filepath)
+        with self._lock:
+            self._written += 1
+
+    @staticmethod
+    def _same(filepath_tmp: Path, filepath: Path) -> bool:
+        """sizes first, most changed files differ in size and are never read back"""
+        try:
+            if filepath.stat().st_size != filepath_tmp.stat().st_size:
+                return False
+        except FileNotFoundError:
+            return False
+
+        with open(filepath_tmp, "rb") as new, open(filepath, "rb") as old:
+            while chunk := new.read(CHUNK_SIZE):
+                if chunk != old.read(CHUNK_SIZE):
+                    return False
+        return True
+
+    def close(self):
+        """files are in place as soon as written, nothing is pending"""
+
+    def prune(self) -> int:
+        """remove files not written since `reset` and folders left empty, :return: 删除的文件数"""
+        if not self.root.exists():
+            return 0
+
+        count = 0
+        for root, dirs, files in os.walk(self.root, topdown=False):
+            for file in files:
+                filepath = Path(root) / file
+                if filepath.relative_to(self.root) in self.touched:
+                    continue
+                filepath.unlink()
+                count += 1
+                logger.bind(filepath=filepath.relative_to(self.root)).debug("Stale output pruned")
+            if Path(root) != self.root and not os.listdir(root):
+                os.rmdir(root)
+        logger.bind(filepath=self.root).success(
+            f"Output: {self.written} written, {self.unchanged} unchanged, {count} pruned"
+        )
+        return count
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    @property
+    def touched(self) -> set[Path]:
+        return self._touched
+
+    @property
+    def written(self) -> int:
+        return self._written
+
+    @property
+    def unchanged(self) -> int:
+        return self._unchanged
+
+
+__all__ = [
+    "OutputTree",
+]
@@ -0,0 +1,284 @@
+"""Restored files streamed into one zip per mod instead of loose files."""
+import copy
+import io
+import os
+import struct
+import tempfile
+import threading
+import warnings
+import zlib
+from contextlib import contextmanager, nullcontext
+from pathlib import Path, PurePosixPath
+from typing import IO, Iterator
+from zipfile import ZIP_BZIP2, ZIP_DEFLATED, ZIP_LZMA, ZIP_STORED, ZipFile, ZipInfo
+
+from src.config import settings
+from src.log import logger
+from src.output import CHUNK_SIZE
+
+COMPRESSIONS = {
+    "stored": ZIP_STORED,
+    "deflated": ZIP_DEFLATED,
+    "bzip2": ZIP_BZIP2,
+    "lzma": ZIP_LZMA,
+}
+DATE_TIME = (1980, 1, 1, 0, 0, 0)  # same contents give the same archive bytes
+SPOOL_SIZE = 8 * 1024 * 1024  # members larger than this are buffered on disk while compared
+LOCAL_HEADER_SIZE = 30  # fixed part of a local file header, then the name and the extra field
+
+
+class _Pack:
+    """one archive during a run"""
+    __slots__ = ("filepath", "filepath_tmp", "old", "kept", "written", "archive")
+
+    def __init__(self, filepath: Path):
+        self.filepath = filepath
+        self.filepath_tmp = filepath.with_name(f".{filepath.name}.{os.getpid()}.tmp")
+        self.old: dict[str, ZipInfo] = {}  # member name -> its entry in the archive on disk
+        if filepath.exists():
+            with ZipFile(filepath) as zfp:
+                self.old = {info.filename: info for info in zfp.infolist() if not info.is_dir()}
+        self.kept: set[str] = set()
+        self.written: dict[str, ZipInfo] = {}  # changed member -> its last entry in the temp archive
+        self.archive: ZipFile | None = None
+
+    def keep(self, member: str):
+        self.written.pop(member, None)
+        self.kept.add(member)
+
+    @property
+    def superseded(self) -> bool:
+        """a member written twice, or written back unchanged, left entries behind in the temp archive"""
+        return self.archive is not None and len(self.archive.filelist) > len(self.written)
+
+    def cleanup(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        self.filepath_tmp.unlink(missing_ok=True)
+        self.written.clear()
+
+
+class PackWriter:
+    """
+    Same interface as `OutputTree`, but the first folder of every path names
+    a zip under the result folder and the rest is the member name, e.g.
+    LOTRReworked/lang/zh_CN.lang is lang/zh_CN.lang in LOTRReworked.zip.
+
+    Members are compared with the archive on disk by crc, size and
+    compression. Changed members are compressed straight into a temp archive
+    as they are written, unchanged ones are copied over from the old archive
+    on `close` / `prune` as they are, still compressed, then the temp archive
+    replaces the old one. Archives without changed members are left untouched.
+    """
+    def __init__(
+        self,
+        root: Path = settings.filepath.root / settings.filepath.result,
+        compression: str = settings.pack.compression,
+        level: int | None = settings.pack.level,
+    ):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression should be one of {', '.join(COMPRESSIONS)}, got {compression!r}")
+        self._root = root
+        self._compression = COMPRESSIONS[compression]
+        self._level = level
+        self._packs: dict[str, _Pack] = {}
+        self._touched: set[Path] = set()
+        self._written = 0
+        self._unchanged = 0
+        self._lock = threading.RLock()
+
+    def reset(self):
+        with self._lock:
+            self._discard()
+            self._touched.clear()
+            self._written = 0
+            self._unchanged = 0
+
+    @contextmanager
+    def open(self, relative_path: Path, mode: str = "w") -> Iterator[IO]:
+        """
+        :param relative_path: 相对于结果文件夹的路径，第一层文件夹即压缩包名
+        :param mode: "w" 写入 utf-8 文本，"wb" 写入字节
+        """
+        name, member = self._split(relative_path)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            if "b" in mode:
+                yield spool
+            else:
+                fp = io.TextIOWrapper(spool, encoding="utf-8")
+                yield fp
+                fp.flush()
+                fp.detach()
+            with self._lock:
+                self._add(name, member, spool)
+                self._touched.add(Path(relative_path))
+
+    def keep(self, relative_path: Path):
+        """
+        a file that failed this run keeps its member as it is in the archive
+        :param relative_path: 相对于结果文件夹的路径
+        """
+        name, member = self._split(relative_path)
+        with self._lock:
+            if (pack := self._packs.get(name)) is None:
+                pack = self._packs[name] = _Pack(self.root / f"{name}.zip")
+            if member in pack.old and member not in pack.written:
+                pack.kept.add(member)
+            self._touched.add(Path(relative_path))
+
+    def copy(self, source: Path, relative_path: Path):
+        """
+        :param source: 要复制的文件
+        :param relative_path: 相对于结果文件夹的路径
+        """
+        with open(source, "rb") as src, self.open(relative_path, "wb") as dst:
+            while chunk := src.read(CHUNK_SIZE):
+                dst.write(chunk)
+
+    def _add(self, name: str, member: str, spool: IO[bytes]):
+        if (pack := self._packs.get(name)) is None:
+            pack = self._packs[name] = _Pack(self.root / f"{name}.zip")
+
+        spool.seek(0)
+        crc, size = 0, 0
+        while chunk := spool.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+        if (old := pack.old.get(member)) is not None and (old.CRC, old.file_size, old.compress_type) == (crc, size, self._compression):
+            pack.keep(member)
+            self._unchanged += 1
+            return
+
+        if pack.archive is None:
+            os.makedirs(self.root, exist_ok=True)
+            pack.archive = ZipFile(pack.filepath_tmp, "w")
+        spool.seek(0)
+        with warnings.catch_warnings():
+            if member in pack.archive.NameToInfo:  # the last write wins on close
+                warnings.simplefilter("ignore")
+            pack.archive.writestr(self._info(member), spool.read(), compress_type=self._compression, compresslevel=self._level)
+        pack.written[member] = pack.archive.getinfo(member)
+        pack.kept.discard(member)
+        self._written += 1
+
+    def close(self, prune: bool = False) -> int:
+        """
+        rebuild archives with changed members
+        :param prune: 同时删除本次未写入的成员，以及没有任何成员写入的压缩包
+        :return: 删除的成员数
+        """
+        count = 0
+        with self._lock:
+            for pack in self._packs.values():
+                dropped = {_ for _ in pack.old if _ not in pack.kept and _ not in pack.written} if prune else set()
+                if pack.written or dropped:  # untouched archives keep even their mtime
+                    self._finish(pack, dropped)
+                    count += len(dropped)
+                pack.cleanup()
+            self._packs.clear()
+
+            if prune and self.root.exists():
+                packed = {_.parts[0] for _ in self._touched}
+                for filepath in self.root.glob("*.zip"):
+                    if filepath.stem not in packed:
+                        filepath.unlink()
+                        logger.bind(filepath=filepath.relative_to(self.root)).debug("Stale pack pruned")
+        return count
+
+    def _finish(self, pack: _Pack, dropped: set[str]):
+        if pack.archive is None:
+            os.makedirs(self.root, exist_ok=True)
+            pack.archive = ZipFile(pack.filepath_tmp, "w")
+        elif pack.superseded:
+            pack.archive.close()
+            filepath_stale = pack.filepath_tmp.with_suffix(".stale")
+            os.replace(pack.filepath_tmp, filepath_stale)
+            pack.archive = ZipFile(pack.filepath_tmp, "w")
+            try:
+                with open(filepath_stale, "rb") as stale:
+                    for info in pack.written.values():
+                        self._copy_raw(stale, info, pack.archive)
+            finally:
+                filepath_stale.unlink()
+
+        with open(pack.filepath, "rb") if pack.old else nullcontext() as old:
+            for member, info in pack.old.items():
+                if member not in pack.written and member not in dropped:
+                    self._copy_raw(old, info, pack.archive)
+        pack.archive.close()
+        pack.archive = None
+        os.replace(pack.filepath_tmp, pack.filepath)
+        logger.bind(filepath=pack.filepath.relative_to(self.root)).debug(
+            f"Pack rebuilt, {len(pack.written)} members changed, {len(dropped)} dropped"
+        )
+
+    @staticmethod
+    def _copy_raw(old: IO[bytes], info: ZipInfo, archive: ZipFile):
+        """
+        compressed bytes of a member moved over as they are, zipfile only
+        writes members it compresses itself, so its entry is added by hand
+        """
+        old.seek(info.header_offset)
+        header = old.read(LOCAL_HEADER_SIZE)
+        name_length, extra_length = struct.unpack("<2H", header[26:30])
+        old.seek(name_length + extra_length, os.SEEK_CUR)
+
+        copied = copy.copy(info)
+        copied.flag_bits &= ~0x08  # sizes go in the local header, no data descriptor after the data
+        copied.header_offset = archive.fp.tell()
+        archive.fp.write(copied.FileHeader())
+        remaining = info.compress_size
+        while remaining and (chunk := old.read(min(CHUNK_SIZE, remaining))):
+            archive.fp.write(chunk)
+            remaining -= len(chunk)
+        archive.filelist.append(copied)
+        archive.NameToInfo[copied.filename] = copied
+        archive.start_dir = archive.fp.tell()
+
+    def prune(self) -> int:
+        """close, dropping members and packs not written since `reset`"""
+        count = self.close(prune=True)
+        logger.bind(filepath=self.root).success(
+            f"Packs: {self.written} members written, {self.unchanged} unchanged, {count} pruned"
+        )
+        return count
+
+    def _discard(self):
+        for pack in self._packs.values():
+            pack.cleanup()
+        self._packs.clear()
+
+    def _info(self, member: str) -> ZipInfo:
+        info = ZipInfo(member, date_time=DATE_TIME)
+        info.compress_type = self._compression
+        info.external_attr = 0o644 << 16
+        return info
+
+    @staticmethod
+    def _split(relative_path: Path) -> tuple[str, str]:
+        parts = PurePosixPath(Path(relative_path).as_posix()).parts
+        if len(parts) < 2:
+            raise ValueError(f"{relative_path} is not inside a mod folder")
+        return parts[0], "/".join(parts[1:])
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    @property
+    def touched(self) -> set[Path]:
+        return self._touched
+
+    @property
+    def written(self) -> int:
+        return self._written
+
+    @property
+    def unchanged(self) -> int:
+        return self._unchanged
+
+
+__all__ = [
+    "PackWriter",
+]
@@ -2,40 +2,48 @@ import contextlib
 import os
 import shutil
 from pathlib import Path
+from typing import Callable
 from zipfile import ZipFile
 
 import httpx
 
+from src.codec import codec
 from src.config import settings
+from src.dedup import Deduplicator
 from src.log import logger
+from src.metrics import metrics
+from src.output import OutputTree
+
+CHUNK_SIZE = 1024 * 1024
 
 
 class Paratranz:
-    def __init__(self, client: httpx.Client = httpx.Client()):
+    def __init__(self, client: httpx.Client | None = None):
         logger.info("")
         logger.info("======= PARATRANZ START =======")
-        self._client = client
-        self._base_url = "https://paratranz.cn/api"
+        self._client = client or httpx.Client()
+        self._base_url = settings.paratranz.base_url.rstrip("/")
         self._headers = {"Authorization": settings.paratranz.token}
         self._project_id = settings.paratranz.project_id
+        self._output = OutputTree(settings.filepath.root / settings.filepath.download)
 
     def get_files(self) -> list:
         url = f"{self.base_url}/projects/{self.project_id}/files"
         response = self.client.get(url, headers=self.headers)
-        return response.json()
+        return codec.loads(response.content)
 
     def update_file(self, file: Path | str, fileid: int):
         """
         :param file: 文件在本地的路径
         :param fileid: 唯一标识符
         """
-        file = file.__str__() if isinstance(file, Path) else file
+        file = Path(file)
 
         url = f"{self.base_url}/projects/{self.project_id}/files/{fileid}"
-        headers = {**self.headers, 'Content-Type': 'multipart/form-data'}
-        data = {"file": file}
-        response = self.client.post(url, headers=headers, data=data)
-        logger.bind(filepath=response.json()).success("Updated file successfully")
+        with open(file, "rb") as fp:
+            response = self.client.post(url, headers=self.headers, files={"file": (file.name, fp)})
+        response.raise_for_status()
+        logger.bind(filepath=file).success("Updated file successfully")
 
     def create_file(self, file: Path, path: Path | str):
         """
@@ -45,20 +53,65 @@ class Paratranz:
         path = path.__str__() if isinstance(path, Path) else path
 
         url = f"{self.base_url}/projects/{self.project_id}/files"
-        headers = {**self.headers, 'Content-Type': 'multipart/form-data'}
         data = {"path": path}
-        files = {file.name: open(file, "rb")}
-        response = self.client.post(url, headers=headers, files=files, data=data)
-        logger.bind(filepath=response.json()).success("Created file successfully")
+        with open(file, "rb") as fp:
+            response = self.client.post(url, headers=self.headers, files={"file": (file.name, fp)}, data=data)
+        response.raise_for_status()
+        logger.bind(filepath=file).success("Created file successfully")
 
-    def download(self):
+    def upload(self) -> list[Path]:
+        """
+        upload converted files, those already on paratranz are updated instead of created
+        :return: 上传失败的文件，相对于转换文件夹的路径，一个文件失败不影响其余文件
+        """
+        logger.info("Starting to upload converted files...")
+        with metrics.stage("paratranz.upload"):
+            failed = self._upload_files()
+        if failed:  # paratranz has some old, some new files, the pushed dedup index stays as it was
+            logger.error(f"Upload completes, {len(failed)} files failed.")
+        else:
+            Deduplicator().publish()
+            logger.success("Upload completes.")
+        return failed
+
+    def _upload_files(self) -> list[Path]:
+        directory = settings.filepath.root / settings.filepath.converted
+        fileids = {file["name"]: file["id"] for file in self.get_files()}
+        failed = []
+        for root, dirs, files in os.walk(directory):
+            for file in files:
+                filepath = Path(root) / file
+                relative_path = filepath.relative_to(directory)
+                try:
+                    if (fileid := fileids.get(relative_path.as_posix())) is not None:
+                        self.update_file(filepath, fileid)
+                    else:
+                        parent = relative_path.parent.as_posix()
+                        self.create_file(filepath, "" if parent == "." else parent)
+                except httpx.HTTPError as e:
+                    logger.bind(filepath=relative_path).error(f"Uploading file failed: {e}")
+                    failed.append(relative_path)
+                    continue
+                metrics.add(bytes_written=filepath.stat().st_size, entries=1)
+        return failed
+
+    def download(self, on_extracted: Callable[[Path], None] | None = None, prune: bool = True):
+        """
+        :param on_extracted: 每解压出一个文件就以其相对于下载文件夹的路径调用一次
+        :param prune: 删除导出中已不存在的下载文件
+        """
         logger.info("Starting to download translated files...")
         os.makedirs(settings.filepath.root / settings.filepath.tmp, exist_ok=True)
         os.makedirs(settings.filepath.root / settings.filepath.download, exist_ok=True)
-        with contextlib.suppress(httpx.TimeoutException):
-            self._trigger_export()
-        self._download_artifacts()
-        self._extract_artifacts()
+        with metrics.stage("paratranz.download"):
+            with metrics.stage("paratranz.trigger_export"), contextlib.suppress(httpx.TimeoutException):
+                self._trigger_export()
+            with metrics.stage("paratranz.download_artifacts"):
+                self._download_artifacts()
+            with metrics.stage("paratranz.extract_artifacts"):
+                self._extract_artifacts(on_extracted)
+            if prune:
+                self.output.prune()
         logger.success("Download completes.")
 
     def _trigger_export(self):
@@ -66,24 +119,34 @@ class Paratranz:
         self.client.post(url, headers=self.headers)
 
     def _download_artifacts(self):
+        """streamed to disk, large exports are never held in memory"""
         url = f"{self.base_url}/projects/{self.project_id}/artifacts/download"
         try:
-            content = (self.client.get(url, headers=self.headers, follow_redirects=True)).content
+            with self.client.stream("GET", url, headers=self.headers, follow_redirects=True) as response, \
+                    open(settings.filepath.root / settings.filepath.tmp / "paratranz_export.zip", "wb") as fp:
+                response.raise_for_status()
+                for chunk in response.iter_bytes(CHUNK_SIZE):
+                    fp.write(chunk)
+                metrics.add(bytes_read=fp.tell())
         except httpx.ConnectError as e:
             logger.error(f"Error downloading artifacts: {e}")
             raise
-        with open(settings.filepath.root / settings.filepath.tmp / "paratranz_export.zip", "wb") as fp:
-            fp.write(content)
 
-    def _extract_artifacts(self):
+    def _extract_artifacts(self, on_extracted: Callable[[Path], None] | None = None):
+        """only utf8/ is needed, its members go straight into the download folder one by one"""
+        self.output.reset()
         with ZipFile(settings.filepath.root / settings.filepath.tmp / "paratranz_export.zip") as zfp:
-            zfp.extractall(settings.filepath.root / settings.filepath.tmp)
-
-        shutil.copytree(
-            settings.filepath.root / settings.filepath.tmp / "utf8",
-            settings.filepath.root / settings.filepath.download,
-            dirs_exist_ok=True
-        )
+            for member in zfp.infolist():
+                if member.is_dir() or not member.filename.startswith("utf8/"):
+                    continue
+                relative_path = Path(member.filename).relative_to("utf8")
+                if ".." in relative_path.parts:
+                    continue
+                with zfp.open(member) as src, self.output.open(relative_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                metrics.add(bytes_written=member.file_size, entries=1)
+                if on_extracted is not None:
+                    on_extracted(relative_path)
 
     @property
     def client(self) -> httpx.Client:
@@ -97,6 +160,10 @@ class Paratranz:
     def headers(self) -> dict:
         return self._headers
 
+    @property
+    def output(self) -> OutputTree:
+        return self._output
+
     @property
     def project_id(self) -> int:
         return self._project_id
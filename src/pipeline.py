@@ -0,0 +1,68 @@
+"""Run pipeline stages concurrently as soon as their dependencies finish."""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from src.log import logger
+from src.metrics import metrics
+
+
+@dataclass
+class PipelineStage:
+    name: str
+    function: Callable[[], Awaitable[None]]
+    depends: tuple[str, ...] = field(default_factory=tuple)
+
+
+class Pipeline:
+    """
+    Stages are coroutines with explicit dependencies, each one starts once
+    all stages it depends on have finished, independent stages overlap.
+    """
+    def __init__(self):
+        self._stages: dict[str, PipelineStage] = {}
+
+    def add(self, name: str, function: Callable[[], Awaitable[None]], *, depends: tuple[str, ...] = ()):
+        unknown = [_ for _ in depends if _ not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stages: {', '.join(unknown)}")
+        self._stages[name] = PipelineStage(name=name, function=function, depends=tuple(depends))
+
+    async def run(self):
+        tasks: dict[str, asyncio.Task] = {}
+        for stage in self._stages.values():  # dependencies are always added before
+            tasks[stage.name] = asyncio.create_task(
+                self._run_stage(stage, [tasks[_] for _ in stage.depends]),
+                name=stage.name,
+            )
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        logger.success(f"Pipeline completes in {time.perf_counter() - start:.2f}s")
+
+    @staticmethod
+    async def _run_stage(stage: PipelineStage, depends: list[asyncio.Task]):
+        if depends:
+            await asyncio.gather(*depends)
+        start = time.perf_counter()
+        logger.bind(filepath=stage.name).debug("Stage started")
+        with metrics.stage(f"pipeline.{stage.name}"):
+            await stage.function()
+        logger.bind(filepath=stage.name).debug(f"Stage finished in {time.perf_counter() - start:.2f}s")
+
+    @property
+    def stages(self) -> dict[str, PipelineStage]:
+        return self._stages
+
+
+__all__ = [
+    "Pipeline",
+    "PipelineStage",
+]
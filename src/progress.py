@@ -0,0 +1,198 @@
+"""Translation progress of the downloaded files per mod, folder and file type."""
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+
+from src.config import settings
+from src.core import classifier
+from src.dedup import FILEPATH_PUSHED, SHARED_NAME, Deduplicator
+from src.log import logger
+from src.metrics import DIR_REPORTS
+
+DIR_DOWNLOAD = settings.filepath.root / settings.filepath.download
+FILEPATH_CACHE = settings.filepath.root / settings.filepath.data / "cache" / "progress.json"
+
+
+@dataclass
+class Counts:
+    total: int = 0
+    translated: int = 0  # translation differs from the original
+    identical: int = 0  # translated to the original text itself
+    missing: int = 0
+
+    def add(self, other: "Counts"):
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+    @property
+    def ratio(self) -> float:
+        return (self.translated + self.identical) / self.total if self.total else 1.0
+
+    @classmethod
+    def of(cls, download: list[dict]) -> "Counts":
+        """blank lines are not entries anybody translates"""
+        counts = cls()
+        for data in download:
+            if data["key"].startswith("BLANK"):
+                continue
+            counts.total += 1
+            if not (translation := data.get("translation")):
+                counts.missing += 1
+            elif translation == data.get("original"):
+                counts.identical += 1
+            else:
+                counts.translated += 1
+        return counts
+
+
+class Progress:
+    """
+    Counts per downloaded file, cached with the size, mtime and hash of the
+    file. Files with the same size and mtime are not read, files touched but
+    with the same hash are not parsed, so after a partial download only the
+    changed files are counted again.
+
+    Files pushed with dedup are counted whole: the entries moved into the
+    shared file of their mod are counted in every file they came from, as the
+    index of the pushed files lists them, and the shared file itself is not
+    counted. Their cache also holds the size and mtime of the index and of the
+    shared file.
+    """
+    def __init__(self, directory: Path = DIR_DOWNLOAD, filepath_cache: Path = FILEPATH_CACHE, filepath_index: Path = FILEPATH_PUSHED):
+        self._directory = directory
+        self._filepath_cache = filepath_cache
+        self._filepath_index = filepath_index
+        self._dedup = Deduplicator(filepath_index=filepath_index)
+        self._files: dict[str, dict] = {}  # converted path -> {"size", "mtime_ns", "sha1", "shared", "file_type", "counts"}
+        self._counted = 0
+
+    def update(self) -> int:
+        """:return: 重新统计的文件数"""
+        cache = self._load()
+        self._files = {}
+        self._counted = 0
+        self._dedup.load()
+        for root, dirs, files in os.walk(self.directory):
+            for file in files:
+                converted_path = (Path(root) / file).relative_to(self.directory)
+                if self._dedup.shared(converted_path) or self._dedup.indexed(converted_path):
+                    continue
+                self._count(converted_path, cache)
+        for converted_path in self._dedup.files():  # their own download may not even exist
+            self._count(converted_path, cache, self._signature(converted_path))
+        self._dump()
+        return self._counted
+
+    def _count(self, converted_path: Path, cache: dict[str, dict], shared: list[int] | None = None):
+        """:param shared: 索引与模组共用文件的大小和修改时间，仅去重推送的文件"""
+        filepath = self.directory / converted_path
+        try:
+            stat = filepath.stat()
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        except FileNotFoundError:  # every entry of the file went to the shared file
+            size, mtime_ns = 0, 0
+        key = converted_path.as_posix()
+        cached = cache.get(key)
+        if cached is not None and (cached["size"], cached["mtime_ns"], cached.get("shared")) == (size, mtime_ns, shared):
+            self._files[key] = cached
+            return
+
+        content = filepath.read_bytes() if size or mtime_ns else b"[]"
+        sha1 = hashlib.sha1(content).hexdigest()
+        if cached is not None and (cached["sha1"], cached.get("shared")) == (sha1, shared):
+            self._files[key] = {**cached, "size": size, "mtime_ns": mtime_ns}
+            return
+
+        download = json.loads(content)
+        if shared is not None:
+            download = self._dedup.expand(converted_path, download, self.directory) or download  # shared file not downloaded, logged
+        file_type = classifier.classify(converted_path.with_suffix(""))
+        self._files[key] = {
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "sha1": sha1,
+            "shared": shared,
+            "file_type": file_type.name if file_type else "UNKNOWN",
+            "counts": asdict(Counts.of(download)),
+        }
+        self._counted += 1
+
+    def _signature(self, converted_path: Path) -> list[int]:
+        signature = []
+        for filepath in (self._filepath_index, self.directory / converted_path.parts[0] / SHARED_NAME):
+            try:
+                stat = filepath.stat()
+                signature += [stat.st_size, stat.st_mtime_ns]
+            except FileNotFoundError:
+                signature += [0, 0]
+        return signature
+
+    def summary(self) -> dict[str, dict[str, Counts]]:
+        """totals per mod, per folder and per file type"""
+        summary: dict[str, dict[str, Counts]] = {"total": {}, "mods": {}, "folders": {}, "file_types": {}}
+        for converted_path, file in sorted(self._files.items()):
+            counts = Counts(**file["counts"])
+            parent = Path(converted_path).parent.as_posix()
+            for group, name in (
+                ("total", "total"),
+                ("mods", converted_path.split("/", 1)[0]),
+                ("folders", parent),
+                ("file_types", file["file_type"]),
+            ):
+                summary[group].setdefault(name, Counts()).add(counts)
+        return summary
+
+    def save(self, directory: Path = DIR_REPORTS) -> tuple[Path, Path]:
+        """json for tools, markdown for people, both overwritten every time"""
+        summary = self.summary()
+        os.makedirs(directory, exist_ok=True)
+        filepath_json = directory / "progress.json"
+        with open(filepath_json, "w", encoding="utf-8") as fp:
+            report = {"fields": [_.name for _ in fields(Counts)]}  # every total is a list in this order
+            report.update({group: {name: [*asdict(counts).values()] for name, counts in totals.items()} for group, totals in summary.items()})
+            json.dump(report, fp, ensure_ascii=False, separators=(",", ":"))
+
+        filepath_markdown = directory / "progress.md"
+        with open(filepath_markdown, "w", encoding="utf-8") as fp:
+            fp.write("# 翻译进度\n")
+            for group, title in (("mods", "模组"), ("file_types", "文件类型"), ("folders", "文件夹")):
+                fp.write(f"\n## {title}\n\n| | 进度 | 词条 | 已翻译 | 与原文相同 | 未翻译 |\n|---|---:|---:|---:|---:|---:|\n")
+                for name, counts in summary[group].items():
+                    fp.write(f"| {name} | {counts.ratio:.1%} | {counts.total} | {counts.translated} | {counts.identical} | {counts.missing} |\n")
+
+        for name, counts in summary["mods"].items():
+            logger.bind(filepath=name).info(f"{counts.ratio:>7.1%} done, {counts.missing} of {counts.total} entries missing")
+        logger.bind(filepath=filepath_markdown).success(f"Progress of {len(self._files)} files saved, {self._counted} counted again")
+        return filepath_json, filepath_markdown
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self._filepath_cache, "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _dump(self):
+        os.makedirs(self._filepath_cache.parent, exist_ok=True)
+        with open(self._filepath_cache, "w", encoding="utf-8") as fp:
+            json.dump(self._files, fp, ensure_ascii=False, separators=(",", ":"))
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    @property
+    def files(self) -> dict[str, dict]:
+        return self._files
+
+    @property
+    def counted(self) -> int:
+        return self._counted
+
+
+__all__ = [
+    "Counts",
+    "Progress",
+]
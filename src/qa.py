@@ -0,0 +1,140 @@
+"""Checks on downloaded translations while restoring, problems that otherwise only show up in game."""
+import datetime
+import json
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from src.config import settings
+from src.log import logger
+from src.metrics import DIR_REPORTS
+
+# %s %d %1$s %.2f, § colour / format codes, literal \n escapes and {0}, all in one pass
+PLACEHOLDER = re.compile(r"%(?:\d+\$)?[-#+0,(]*\d*(?:\.\d+)?[sdfcxX]|§[0-9a-fk-orA-FK-OR]|\\n|\{\d+}")
+
+
+def placeholders(text: str) -> list[str]:
+    """most texts have none, looking for the characters is several times faster than the regex"""
+    if "%" in text or "§" in text or "\\" in text or "{" in text:
+        return PLACEHOLDER.findall(text)
+    return []
+
+
+@dataclass
+class Issue:
+    file: str
+    key: str
+    kind: str  # placeholder, line_break or line_count
+    detail: str
+
+
+class QAScanner:
+    """
+    Compares the placeholders of every translated entry with its original,
+    as multisets: order may change in a translation, count may not. Files
+    restored line by line also keep their line count.
+
+    Issues are kept per file, restoring a file again replaces its issues.
+    """
+    def __init__(self, enabled: bool = settings.qa.enabled):
+        self._enabled = enabled
+        self._issues: dict[Path, list[Issue]] = {}
+        self._entries = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._issues.clear()
+            self._entries = 0
+
+    def scan(self, relative_path: Path, download: list[dict], lines: int | None = None, extra: bool = False) -> list[Issue]:
+        """
+        :param relative_path: 相对于 original 文件夹的路径
+        :param download: 下载文件内容
+        :param lines: 逐行还原的文件须保持的行数，即原文行数，None 时不检查
+        :param extra: 是否有 translation_extra，有则多出的词条不写入还原文件
+        """
+        if not self.enabled:
+            return []
+
+        file = relative_path.as_posix()
+        issues = []
+        for data in download:
+            translation = data.get("translation")
+            if not translation:
+                continue
+            expected, found = placeholders(data.get("original") or ""), placeholders(translation)
+            if expected != found and Counter(expected) != Counter(found):  # same order is the common case
+                issues.append(Issue(file, data["key"], "placeholder", self._difference(Counter(expected), Counter(found))))
+            if lines is not None and "\n" in translation.rstrip("\n"):
+                issues.append(Issue(file, data["key"], "line_break", "translation spans several lines"))
+
+        if lines is not None:
+            restored = min(len(download), lines) if extra else len(download)
+            if restored != lines:
+                issues.append(Issue(file, "", "line_count", f"{restored} entries for {lines} original lines"))
+
+        with self._lock:
+            self._entries += len(download)
+            if issues:
+                self._issues[relative_path] = issues
+            else:
+                self._issues.pop(relative_path, None)
+        return issues
+
+    @staticmethod
+    def _difference(expected: Counter, found: Counter) -> str:
+        missing, unexpected = expected - found, found - expected
+        parts = []
+        if missing:
+            parts.append("missing " + " ".join(sorted(missing.elements())))
+        if unexpected:
+            parts.append("unexpected " + " ".join(sorted(unexpected.elements())))
+        return ", ".join(parts)
+
+    def report(self) -> dict:
+        issues = [issue for _, file_issues in sorted(self._issues.items()) for issue in file_issues]
+        return {
+            "entries": self._entries,
+            "files": len(self._issues),
+            "kinds": dict(Counter(_.kind for _ in issues)),
+            "issues": [asdict(_) for _ in issues],
+        }
+
+    def save(self) -> Path | None:
+        """write the json report and log a summary, nothing if disabled"""
+        if not self.enabled:
+            return None
+
+        report = self.report()
+        os.makedirs(DIR_REPORTS, exist_ok=True)
+        filepath = DIR_REPORTS / f'{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.qa.json'
+        with open(filepath, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=2)
+
+        for issue in report["issues"][:settings.project.report_top]:
+            logger.bind(filepath=issue["file"]).warning(f"QA {issue['kind']} {issue['key']}: {issue['detail']}")
+        summary = ", ".join(f"{count} {kind}" for kind, count in sorted(report["kinds"].items())) or "no issues"
+        logger.bind(filepath=filepath).success(f"QA: {report['entries']} entries scanned, {summary}")
+        return filepath
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @property
+    def issues(self) -> dict[Path, list[Issue]]:
+        return self._issues
+
+
+qa = QAScanner()
+
+__all__ = [
+    "Issue",
+    "QAScanner",
+    "placeholders",
+    "qa",
+]
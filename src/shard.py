@@ -0,0 +1,141 @@
+"""
+Split convert / restore over several runners, then merge their outputs.
+
+    python cli.py convert --shard 1/4     # on every runner, 1/4 to 4/4
+    python cli.py merge convert runner1 runner2 runner3 runner4
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence
+
+from src.config import settings
+from src.exception import ShardException
+from src.log import logger
+from src.output import CHUNK_SIZE, OutputTree
+
+DIR_SHARDS = settings.filepath.data / "shards"  # relative to a root, every runner has its own
+STAGE_OUTPUTS = {
+    "convert": settings.filepath.converted,
+    "restore": settings.filepath.result,
+}
+
+
+@dataclass(frozen=True)
+class Shard:
+    """
+    One of `count` parts, `index` counts from 1. A file belongs to the part
+    its path hashes to, the same on every machine and every run.
+    """
+    index: int
+    count: int
+
+    def __post_init__(self):
+        if not 1 <= self.index <= self.count:
+            raise ValueError(f"shard {self.index} out of 1..{self.count}")
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    @classmethod
+    def parse(cls, spec: str) -> "Shard":
+        """:param spec: 形如 "1/4" """
+        index, _, count = spec.partition("/")
+        try:
+            return cls(int(index), int(count))
+        except ValueError as e:
+            raise ValueError(f"shard should look like 1/4, got {spec!r}") from e
+
+    def contains(self, relative_path: Path) -> bool:
+        """
+        :param relative_path: 相对于 original 文件夹的路径，还原时去掉 .json 后缀，两个阶段的分片一致
+        """
+        digest = hashlib.sha1(relative_path.as_posix().encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") % self.count == self.index - 1
+
+    def save_manifest(self, stage: str, output: OutputTree, root: Path = settings.filepath.root) -> Path:
+        """files this shard wrote, merging checks them against the copies it gets"""
+        filepath = root / DIR_SHARDS / f"{stage}-{self.index}-of-{self.count}.json"
+        os.makedirs(filepath.parent, exist_ok=True)
+        manifest = {
+            "stage": stage,
+            "shard": str(self),
+            "files": {
+                relative_path.as_posix(): _fingerprint(output.root / relative_path)
+                for relative_path in sorted(output.touched)
+            },
+        }
+        with open(filepath, "w", encoding="utf-8") as fp:
+            json.dump(manifest, fp, ensure_ascii=False, indent=2)
+        logger.bind(filepath=filepath).success(f"Shard {self} of {stage} wrote {len(manifest['files'])} files")
+        return filepath
+
+
+def merge(stage: str, roots: Sequence[Path], prune: bool = True) -> Path:
+    """
+    copy the outputs of every shard into this root, the shards must add up to a whole run
+    :param roots: 各分片的根目录，即各自的 PATH_ROOT，内有输出文件夹与 data/shards 下的清单
+    :param prune: 删除不属于任何分片的旧输出
+    """
+    logger.info("")
+    logger.info(f"======= MERGE {stage.upper()} START =======")
+    manifests: dict[int, tuple[Path, dict]] = {}
+    count = None
+    for root in roots:
+        for filepath in sorted((root / DIR_SHARDS).glob(f"{stage}-*-of-*.json")):
+            with open(filepath, encoding="utf-8") as fp:
+                manifest = json.load(fp)
+            shard = Shard.parse(manifest["shard"])
+            if count is not None and shard.count != count:
+                logger.bind(filepath=filepath).error(f"Shard {shard} does not split into {count}")
+                raise ShardException(filepath)
+            if shard.index in manifests:
+                logger.bind(filepath=filepath).error(f"Shard {shard} found twice")
+                raise ShardException(filepath)
+            count = shard.count
+            manifests[shard.index] = (root, manifest)
+
+    if count is None or len(manifests) != count:
+        missing = sorted(set(range(1, (count or 0) + 1)) - set(manifests))
+        logger.error(f"Shards of {stage} missing: {missing or 'all'}")
+        raise ShardException(stage, missing)
+
+    output = OutputTree(settings.filepath.root / STAGE_OUTPUTS[stage])
+    output.reset()
+    files: dict[str, dict] = {}
+    for index, (root, manifest) in sorted(manifests.items()):
+        for relative_path, fingerprint in manifest["files"].items():
+            source = root / STAGE_OUTPUTS[stage] / relative_path
+            if relative_path in files:
+                logger.bind(filepath=relative_path).error(f"Written by more than one shard, {index}/{count} included")
+                raise ShardException(relative_path)
+            if not source.exists() or _fingerprint(source) != fingerprint:
+                logger.bind(filepath=source).error(f"Differs from the manifest of shard {index}/{count}")
+                raise ShardException(source)
+            output.copy(source, Path(relative_path))
+            files[relative_path] = fingerprint
+    if prune:
+        output.prune()
+
+    filepath = settings.filepath.root / DIR_SHARDS / f"{stage}.json"
+    os.makedirs(filepath.parent, exist_ok=True)
+    with open(filepath, "w", encoding="utf-8") as fp:
+        json.dump({"stage": stage, "shards": count, "files": dict(sorted(files.items()))}, fp, ensure_ascii=False, indent=2)
+    logger.bind(filepath=filepath).success(f"Merged {len(files)} files from {count} shards")
+    return filepath
+
+
+def _fingerprint(filepath: Path) -> dict:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as fp:
+        while chunk := fp.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return {"size": filepath.stat().st_size, "sha256": digest.hexdigest()}
+
+
+__all__ = [
+    "Shard",
+    "merge",
+]
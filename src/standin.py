@@ -0,0 +1,469 @@
+"""
+Offline stand-in for the Paratranz endpoints used by this project.
+
+    python -m src.standin --seed-dir resource/3-TranslatedParatranzFile
+    PARATRANZ_BASE_URL=http://127.0.0.1:8765/api python cli.py pull
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Sequence
+from urllib.parse import parse_qs, urlsplit
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from src.config import settings
+from src.log import logger, setup_logger
+
+
+class StandinError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclass
+class StandinFile:
+    id: int
+    name: str
+    strings: list[dict] = field(default_factory=list)
+    created_at: str = ""
+    updated_at: str = ""
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "folder": self.name.rpartition("/")[0],
+            "createdAt": self.created_at,
+            "updatedAt": self.updated_at,
+            "modifiedAt": self.updated_at,
+            "format": "json",
+            "total": len(self.strings),
+            "translated": sum(1 for _ in self.strings if _["stage"] > 0),
+            "disabled": 0,
+            "checked": 0,
+            "reviewed": 0,
+            "hidden": 0,
+            "locked": 0,
+            "words": sum(len(_["original"].split()) for _ in self.strings),
+        }
+
+    def export(self) -> list[dict]:
+        """same shape as the files converted by this project"""
+        return [
+            {"key": _["key"], "original": _["original"], "translation": _["translation"], "context": _["context"]}
+            for _ in self.strings
+        ]
+
+
+Response = tuple[int, dict | list | bytes | None, dict[str, str]]
+
+
+class ParatranzStandin:
+    """
+    Keeps projects, files and strings in memory and answers the Paratranz api
+    over http, with optional latency, a token bucket rate limit answering 429
+    and random 500 failures.
+    """
+    def __init__(
+        self,
+        host: str = settings.standin.host,
+        port: int = settings.standin.port,
+        *,
+        latency: float = settings.standin.latency,
+        jitter: float = settings.standin.jitter,
+        rate_limit: float = settings.standin.rate_limit,
+        failure_rate: float = settings.standin.failure_rate,
+        seed: int | None = settings.standin.seed,
+    ):
+        self._latency = latency
+        self._jitter = jitter
+        self._rate_limit = rate_limit
+        self._failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._files: dict[int, dict[int, StandinFile]] = {}  # project id -> file id -> file
+        self._artifacts: dict[int, bytes] = {}
+        self._next_file_id = 1
+        self._next_string_id = 1
+        self._tokens = max(1.0, rate_limit)
+        self._refilled = time.monotonic()
+        self._calls: dict[str, int] = {}
+
+        self._routes: list[tuple[str, re.Pattern, Callable[..., Response]]] = [
+            ("GET", re.compile(r"/api/projects/(\d+)/files"), self._get_files),
+            ("POST", re.compile(r"/api/projects/(\d+)/files"), self._create_file),
+            ("GET", re.compile(r"/api/projects/(\d+)/files/(\d+)"), self._get_file),
+            ("POST", re.compile(r"/api/projects/(\d+)/files/(\d+)"), self._update_file),
+            ("DELETE", re.compile(r"/api/projects/(\d+)/files/(\d+)"), self._delete_file),
+            ("POST", re.compile(r"/api/projects/(\d+)/files/(\d+)/translation"), self._update_file_translation),
+            ("POST", re.compile(r"/api/projects/(\d+)/artifacts"), self._trigger_artifacts),
+            ("GET", re.compile(r"/api/projects/(\d+)/artifacts/download"), self._download_artifacts),
+            ("GET", re.compile(r"/artifacts/(\d+)/export\.zip"), self._artifacts_zip),
+            ("GET", re.compile(r"/api/projects/(\d+)/strings"), self._get_strings),
+            ("GET", re.compile(r"/api/projects/(\d+)/strings/(\d+)"), self._get_string),
+            ("PUT", re.compile(r"/api/projects/(\d+)/strings/(\d+)"), self._update_string),
+        ]
+
+        self._server = ThreadingHTTPServer((host, port), _StandinHandler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread: threading.Thread | None = None
+
+    """ LIFECYCLE """
+    def start(self) -> "ParatranzStandin":
+        """serve in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="paratranz-standin", daemon=True)
+        self._thread.start()
+        logger.bind(filepath=self.base_url).success("Paratranz stand-in started")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def serve_forever(self):
+        logger.bind(filepath=self.base_url).success("Paratranz stand-in started")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def __enter__(self) -> "ParatranzStandin":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    """ STATE """
+    def load(self, directory: Path, project_id: int = settings.paratranz.project_id) -> int:
+        """
+        :param directory: 含有 paratranz 格式 json 文件的文件夹，如 3-TranslatedParatranzFile
+        :param project_id: 载入到的项目 ID
+        :return: 载入的文件数
+        """
+        count = 0
+        for root, dirs, files in os.walk(directory):
+            for file in files:
+                filepath = Path(root) / file
+                with open(filepath, encoding="utf-8") as fp:
+                    datas = json.load(fp)
+                with self._lock:
+                    self._add_file(project_id, filepath.relative_to(directory).as_posix(), datas)
+                count += 1
+        logger.bind(filepath=directory).info(f"Loaded {count} files into project {project_id}")
+        return count
+
+    def _add_file(self, project_id: int, name: str, datas: list[dict]) -> StandinFile:
+        now = self._now()
+        file = StandinFile(id=self._next_file_id, name=name, strings=self._strings(datas), created_at=now, updated_at=now)
+        self._next_file_id += 1
+        self._files.setdefault(project_id, {})[file.id] = file
+        return file
+
+    def _strings(self, datas: list[dict]) -> list[dict]:
+        strings = []
+        for data in datas:
+            strings.append({
+                "id": self._next_string_id,
+                "key": data["key"],
+                "original": data.get("original", ""),
+                "translation": data.get("translation", ""),
+                "context": data.get("context", ""),
+                "stage": 1 if data.get("translation") else 0,
+            })
+            self._next_string_id += 1
+        return strings
+
+    def _file(self, project_id: int, file_id: int) -> StandinFile:
+        if (file := self._files.get(project_id, {}).get(file_id)) is None:
+            raise StandinError(404, f"File {file_id} not found")
+        return file
+
+    """ ROUTES """
+    def _get_files(self, project_id: str, **kwargs) -> Response:
+        with self._lock:
+            return 200, [_.to_json() for _ in self._files.get(int(project_id), {}).values()], {}
+
+    def _create_file(self, project_id: str, *, fields: dict, files: dict, **kwargs) -> Response:
+        filename, content = self._upload(files)
+        path = fields.get("path", "").strip("/")
+        name = f"{path}/{filename}" if path else filename
+        with self._lock:
+            if any(_.name == name for _ in self._files.get(int(project_id), {}).values()):
+                raise StandinError(400, f"File {name} already exists")
+            file = self._add_file(int(project_id), name, content)
+            return 200, {"file": file.to_json(), "status": "new"}, {}
+
+    def _get_file(self, project_id: str, file_id: str, **kwargs) -> Response:
+        with self._lock:
+            return 200, self._file(int(project_id), int(file_id)).to_json(), {}
+
+    def _update_file(self, project_id: str, file_id: str, *, files: dict, **kwargs) -> Response:
+        """translations of strings whose original did not change are kept"""
+        filename, content = self._upload(files)
+        with self._lock:
+            file = self._file(int(project_id), int(file_id))
+            existing = {_["key"]: _ for _ in file.strings}
+            strings = self._strings(content)
+            for string in strings:
+                if (old := existing.get(string["key"])) is not None and old["original"] == string["original"] and old["stage"] > 0:
+                    string.update(id=old["id"], translation=old["translation"], stage=old["stage"])
+            file.strings = strings
+            file.updated_at = self._now()
+            return 200, {"file": file.to_json(), "status": "updated"}, {}
+
+    def _delete_file(self, project_id: str, file_id: str, **kwargs) -> Response:
+        with self._lock:
+            self._file(int(project_id), int(file_id))
+            del self._files[int(project_id)][int(file_id)]
+            return 200, {}, {}
+
+    def _update_file_translation(self, project_id: str, file_id: str, *, fields: dict, files: dict, **kwargs) -> Response:
+        filename, content = self._upload(files)
+        force = fields.get("force", "").lower() in ("1", "true")
+        translations = {_["key"]: _["translation"] for _ in content if _.get("translation")}
+        with self._lock:
+            file = self._file(int(project_id), int(file_id))
+            for string in file.strings:
+                if string["key"] in translations and (force or string["stage"] == 0):
+                    string.update(translation=translations[string["key"]], stage=1)
+            file.updated_at = self._now()
+            return 200, {"file": file.to_json(), "status": "updated"}, {}
+
+    def _trigger_artifacts(self, project_id: str, **kwargs) -> Response:
+        """the export is built right away, paratranz takes a while"""
+        buffer = io.BytesIO()
+        with self._lock:
+            files = list(self._files.get(int(project_id), {}).values())
+            with ZipFile(buffer, "w", compression=ZIP_DEFLATED) as zfp:
+                for file in files:
+                    content = json.dumps(file.export(), ensure_ascii=False, indent=2)
+                    zfp.writestr(f"utf8/{file.name}", content)
+                    zfp.writestr(f"raw/{file.name}", content)
+            self._artifacts[int(project_id)] = buffer.getvalue()
+            total = sum(len(_.strings) for _ in files)
+            translated = sum(_.to_json()["translated"] for _ in files)
+        return 200, {"id": int(project_id), "createdAt": self._now(), "total": total, "translated": translated}, {}
+
+    def _download_artifacts(self, project_id: str, **kwargs) -> Response:
+        with self._lock:
+            if int(project_id) not in self._artifacts:
+                raise StandinError(404, "No artifact, trigger an export first")
+        return 302, None, {"Location": f"/artifacts/{project_id}/export.zip"}
+
+    def _artifacts_zip(self, project_id: str, **kwargs) -> Response:
+        with self._lock:
+            if (content := self._artifacts.get(int(project_id))) is None:
+                raise StandinError(404, "No artifact")
+        return 200, content, {"Content-Type": "application/zip"}
+
+    def _get_strings(self, project_id: str, *, query: dict, **kwargs) -> Response:
+        page = int(query.get("page", 1))
+        page_size = min(int(query.get("pageSize", 50)), 800)
+        with self._lock:
+            files = self._files.get(int(project_id), {})
+            if "file" in query:
+                files = {int(query["file"]): self._file(int(project_id), int(query["file"]))}
+            strings = [
+                {**string, "fileId": file.id}
+                for file in files.values()
+                for string in file.strings
+                if "stage" not in query or string["stage"] == int(query["stage"])
+            ]
+        return 200, {
+            "page": page,
+            "pageSize": page_size,
+            "rowCount": len(strings),
+            "pageCount": -(-len(strings) // page_size),
+            "results": strings[(page - 1) * page_size:page * page_size],
+        }, {}
+
+    def _get_string(self, project_id: str, string_id: str, **kwargs) -> Response:
+        with self._lock:
+            file, string = self._string(int(project_id), int(string_id))
+            return 200, {**string, "fileId": file.id}, {}
+
+    def _update_string(self, project_id: str, string_id: str, *, body: bytes, **kwargs) -> Response:
+        update = json.loads(body or b"{}")
+        with self._lock:
+            file, string = self._string(int(project_id), int(string_id))
+            if "translation" in update:
+                string["translation"] = update["translation"]
+                string["stage"] = update.get("stage", 1 if update["translation"] else 0)
+            elif "stage" in update:
+                string["stage"] = update["stage"]
+            file.updated_at = self._now()
+            return 200, {**string, "fileId": file.id}, {}
+
+    def _string(self, project_id: int, string_id: int) -> tuple[StandinFile, dict]:
+        for file in self._files.get(project_id, {}).values():
+            for string in file.strings:
+                if string["id"] == string_id:
+                    return file, string
+        raise StandinError(404, f"String {string_id} not found")
+
+    """ HTTP """
+    def handle(self, method: str, url: str, headers, body: bytes) -> Response:
+        """route one request after the injected latency, rate limit and failures"""
+        if self._latency or self._jitter:
+            time.sleep(self._latency + self._random.uniform(0, self._jitter))
+        if not self._take_token():
+            return 429, {"message": "Too many requests"}, {"Retry-After": "1"}
+        if self._failure_rate and self._random.random() < self._failure_rate:
+            return 500, {"message": "Injected failure"}, {}
+
+        split = urlsplit(url)
+        for route_method, pattern, function in self._routes:
+            if route_method == method and (match := pattern.fullmatch(split.path.rstrip("/"))):
+                with self._lock:
+                    self._calls[function.__name__.lstrip("_")] = self._calls.get(function.__name__.lstrip("_"), 0) + 1
+                fields, files = self._parse_form(headers.get("Content-Type", ""), body)
+                query = {key: values[-1] for key, values in parse_qs(split.query).items()}
+                try:
+                    return function(*match.groups(), query=query, fields=fields, files=files, body=body)
+                except StandinError as e:
+                    return e.status, {"message": e.message}, {}
+                except (ValueError, KeyError, TypeError) as e:
+                    return 400, {"message": f"Bad request: {e}"}, {}
+        return 404, {"message": f"No route for {method} {split.path}"}, {}
+
+    def _take_token(self) -> bool:
+        if not self._rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(max(1.0, self._rate_limit), self._tokens + (now - self._refilled) * self._rate_limit)
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @staticmethod
+    def _parse_form(content_type: str, body: bytes) -> tuple[dict[str, str], dict[str, tuple[str, bytes]]]:
+        """multipart fields and files, the stdlib email parser reads form data well enough"""
+        fields, files = {}, {}
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {key: values[-1] for key, values in parse_qs(body.decode()).items()}, files
+        if not content_type.startswith("multipart/form-data"):
+            return fields, files
+        message = BytesParser(policy=policy.HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if (filename := part.get_filename()) is not None:
+                files[name] = (filename, payload)
+            else:
+                fields[name] = payload.decode()
+        return fields, files
+
+    @staticmethod
+    def _upload(files: dict) -> tuple[str, list[dict]]:
+        if "file" not in files:
+            raise StandinError(400, "Missing file")
+        filename, content = files["file"]
+        datas = json.loads(content)
+        if not isinstance(datas, list):
+            raise StandinError(400, "Only json files in paratranz format are supported")
+        return filename, datas
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    @property
+    def files(self) -> dict[int, dict[int, StandinFile]]:
+        return self._files
+
+    @property
+    def calls(self) -> dict[str, int]:
+        """requests answered by each route, for benchmarks"""
+        return self._calls
+
+
+class _StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status, payload, headers = self.server.standin.handle(self.command, self.path, self.headers, body)
+        if payload is None:
+            content = b""
+        elif isinstance(payload, bytes):
+            content = payload
+        else:
+            content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            headers = {"Content-Type": "application/json; charset=utf-8", **headers}
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, format: str, *args):
+        logger.bind(filepath=self.path).debug(f"{self.command} {args[1] if len(args) > 1 else ''}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="standin", description="offline stand-in for the paratranz api")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--seed-dir", type=Path, help="load paratranz json files from this folder, e.g. 3-TranslatedParatranzFile")
+    parser.add_argument("--latency", type=float, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, help="random extra seconds up to this")
+    parser.add_argument("--rate-limit", type=float, help="requests per second, 0 for no limit")
+    parser.add_argument("--failure-rate", type=float, help="chance of answering 500")
+    return parser
+
+
+def serve(args: argparse.Namespace):
+    """options left out fall back to the STANDIN_ settings"""
+    options = {
+        key: value
+        for key in ("host", "port", "latency", "jitter", "rate_limit", "failure_rate")
+        if (value := getattr(args, key, None)) is not None
+    }
+    standin = ParatranzStandin(**options)
+    if args.seed_dir:
+        standin.load(args.seed_dir)
+    standin.serve_forever()
+
+
+def main(argv: Sequence[str] | None = None):
+    setup_logger()
+    serve(build_parser().parse_args(argv))
+
+
+__all__ = [
+    "ParatranzStandin",
+    "StandinFile",
+]
+
+if __name__ == '__main__':
+    main()
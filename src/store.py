@@ -0,0 +1,149 @@
+"""Sqlite store of entries across pipeline stages, for cross-file queries."""
+import hashlib
+import os
+import sqlite3
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import Iterable
+
+from src.config import settings
+from src.log import logger, setup_logger
+
+
+class Stage(str, Enum):
+    CONVERTED = "converted"
+    DOWNLOADED = "downloaded"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    stage       TEXT NOT NULL,
+    file        TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    original    TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    context     TEXT NOT NULL,
+    hash        TEXT NOT NULL,
+    changed     INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (stage, file, key)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_file ON entries (file, stage);
+CREATE INDEX IF NOT EXISTS idx_entries_original ON entries (original);
+CREATE INDEX IF NOT EXISTS idx_entries_hash ON entries (hash);
+CREATE INDEX IF NOT EXISTS idx_entries_changed ON entries (stage, changed);
+"""
+
+
+class StringStore:
+    """
+    One row per (stage, file, key), files are written incrementally.
+
+    `changed` is set when the original/translation of a key differs from
+    the one stored by the previous write of the same file.
+    """
+    def __init__(self, filepath: Path = settings.filepath.root / settings.store.path):
+        os.makedirs(filepath.parent, exist_ok=True)
+        self._filepath = filepath
+        self._connection = sqlite3.connect(filepath, check_same_thread=False)
+        self._lock = threading.Lock()  # conversion and restoration may run in different threads
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def write_file(self, stage: Stage, file: Path | str, entries: Iterable[dict]):
+        file = Path(file).as_posix()
+        rows = {}
+        for entry in entries:
+            original, translation = entry.get("original") or "", entry.get("translation") or ""  # exports may hold nulls
+            rows[entry["key"]] = (
+                stage.value,
+                file,
+                entry["key"],
+                original,
+                translation,
+                entry.get("context") or "",
+                self.hash(original, translation),
+            )
+        with self._lock, self.connection:
+            existing = {
+                key
+                for key, in self.connection.execute(
+                    "SELECT key FROM entries WHERE stage = ? AND file = ?", (stage.value, file)
+                )
+            }
+            self.connection.executemany(
+                "DELETE FROM entries WHERE stage = ? AND file = ? AND key = ?",
+                ((stage.value, file, key) for key in existing - rows.keys()),
+            )
+            self.connection.executemany(
+                """
+                INSERT INTO entries (stage, file, key, original, translation, context, hash, changed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT (stage, file, key) DO UPDATE SET
+                    original = excluded.original,
+                    translation = excluded.translation,
+                    context = excluded.context,
+                    changed = entries.hash != excluded.hash,
+                    hash = excluded.hash
+                """,
+                rows.values(),
+            )
+        logger.bind(filepath=file).debug(f"Stored {len(rows)} entries ({stage.value})")
+
+    def changed(self, stage: Stage, prefix: str = "") -> list[tuple[str, str]]:
+        """(file, key) whose content changed in the last write"""
+        return self.connection.execute(
+            "SELECT file, key FROM entries WHERE stage = ? AND changed = 1 AND substr(file, 1, ?) = ? ORDER BY file, key",
+            (stage.value, len(prefix), prefix),
+        ).fetchall()
+
+    def usages(self, original: str, stage: Stage = Stage.CONVERTED) -> list[tuple[str, str]]:
+        """(file, key) where the original text is used"""
+        return self.connection.execute(
+            "SELECT file, key FROM entries WHERE stage = ? AND original = ? ORDER BY file, key",
+            (stage.value, original),
+        ).fetchall()
+
+    def progress(self, prefix: str = "", stage: Stage = Stage.DOWNLOADED) -> tuple[int, int]:
+        """(translated, total) of files under the prefix, e.g. "CustomNPCs/" """
+        translated, total = self.connection.execute(
+            "SELECT COALESCE(SUM(translation != ''), 0), COUNT(*) FROM entries WHERE stage = ? AND substr(file, 1, ?) = ?",
+            (stage.value, len(prefix), prefix),
+        ).fetchone()
+        return translated, total
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def hash(original: str, translation: str) -> str:
+        return hashlib.sha1(f"{original}\0{translation}".encode("utf-8")).hexdigest()
+
+    @property
+    def filepath(self) -> Path:
+        return self._filepath
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self._connection
+
+
+__all__ = [
+    "Stage",
+    "StringStore",
+]
+
+if __name__ == '__main__':
+    setup_logger()
+    store = StringStore()
+    mods = [
+        mod
+        for mod, in store.connection.execute(
+            "SELECT DISTINCT substr(file, 1, instr(file, '/') - 1) FROM entries WHERE stage = ?",
+            (Stage.DOWNLOADED.value,),
+        )
+    ]
+    for mod in sorted(mods):
+        translated, total = store.progress(f"{mod}/")
+        print(f"{mod}: {translated}/{total} ({translated / total:.2%})")
@@ -0,0 +1,220 @@
+"""Generate synthetic source trees of any size, for benchmarks."""
+import json
+import os
+import random
+from pathlib import Path
+
+from src.core import FileType
+
+SYLLABLES_RU = ["ра", "до", "ми", "ло", "ван", "гор", "эль", "дин", "ар", "ну", "ст", "ок", "ве", "зи", "ха"]
+SYLLABLES_EN = ["ra", "do", "mi", "lo", "van", "gor", "el", "din", "ar", "nu", "st", "ok", "ve", "zi", "ha"]
+SYLLABLES_ZH = ["甘", "道", "夫", "霍", "比", "特", "精", "灵", "矮", "人", "王", "国", "山", "河", "剑"]
+
+DIALOG_TEMPLATE = """{{
+    "DialogShowWheel": 0b,
+    "Options": [
+{options}
+    ],
+    "DialogTitle": "{title}",
+    "ModRev": 16,
+    "DialogText": "{text}",
+    "DialogQuest": -1
+}}
+"""
+DIALOG_OPTION_TEMPLATE = """        {{
+            "OptionSlot": {slot},
+            "Option": {{
+                "DialogCommand": "",
+                "Dialog": {dialog},
+                "Title": "{title}",
+                "DialogColor": 14737632,
+                "OptionType": 1
+            }}
+        }}"""
+QUEST_TEMPLATE = """{{
+    "CompleterNpc": "{npc}",
+    "NextQuestId": -1,
+    "Title": "{title}",
+    "Text": "{text}",
+    "RewardExp": 0,
+    "CompleteText": "{complete_text}",
+    "QuestLocation": "{location}"
+}}
+"""
+
+# how many entries a single file holds by default, lang files are typically one large file per mod
+ENTRIES_PER_FILE = {
+    FileType.LANG: 50000,
+    FileType.JSON_LANG: 50000,
+    FileType.PLAINTEXT_IN_LINES: 200,
+    FileType.PLAINTEXT: 1,
+    FileType.CUSTOM_NPCS_DIALOGS: 4,
+    FileType.CUSTOM_NPCS_QUESTS: 2,
+    FileType.LOTR_LEGACY_NAMES: 300,
+    FileType.LOTR_LEGACY_SPEECH: 50,
+    FileType.LOTR_RENEWED_SPEECH: 60,
+}
+
+
+class CorpusGenerator:
+    """
+    Write original / reference / translation (/ translation_extra) files
+    of one file type under `root`, laid out like 1-SourceFile.
+
+    Part of the entries are left untranslated, some reference and
+    translation files miss or add keys and lines like real packs do.
+    """
+    def __init__(self, root: Path, seed: int = 0):
+        self._root = root
+        self._random = random.Random(seed)
+
+    def generate(self, type_: FileType, entries: int, entries_per_file: int | None = None) -> int:
+        """:return: number of original files written"""
+        entries_per_file = entries_per_file or ENTRIES_PER_FILE[type_]
+        files = max(1, -(-entries // entries_per_file))
+        for idx in range(files):
+            count = min(entries_per_file, entries - idx * entries_per_file) if entries > idx * entries_per_file else 1
+            self._generate_file(type_, idx, count)
+        return files
+
+    def _generate_file(self, type_: FileType, idx: int, count: int):
+        match type_:
+            case FileType.LANG:
+                self._lang(Path(f"SyntheticMod{idx}") / "lang", count)
+            case FileType.JSON_LANG:
+                self._json_lang(Path(f"SyntheticMod{idx}") / "lang", count)
+            case FileType.PLAINTEXT_IN_LINES:
+                self._lines(Path("SyntheticMod") / "texts" / f"text{idx}.txt", count, extra=False)
+            case FileType.PLAINTEXT:
+                self._plaintext(Path("LOTRSynthetic") / "lore" / f"lore{idx}.txt")
+            case FileType.LOTR_LEGACY_NAMES:
+                self._lines(Path("LOTRSynthetic") / "names" / f"names{idx}.txt", count, extra=True, words=(1, 2))
+            case FileType.LOTR_LEGACY_SPEECH:
+                self._lines(Path("LOTRSynthetic") / "speech" / f"race{idx % 10}" / f"speech{idx}.txt", count, extra=True)
+            case FileType.LOTR_RENEWED_SPEECH:
+                self._renewed_speech(Path("LOTRSynthetic") / "speech" / f"race{idx % 10}" / f"speech{idx}.json", count)
+            case FileType.CUSTOM_NPCS_DIALOGS:
+                self._dialog(Path("CustomNPCs") / "dialogs" / f"Category{idx % 20}" / f"{idx}.json", count)
+            case FileType.CUSTOM_NPCS_QUESTS:
+                self._quest(Path("CustomNPCs") / "quests" / f"Category{idx % 20}" / f"{idx}.json")
+
+    """ FORMATS """
+    def _lang(self, folder: Path, count: int):
+        keys = [f"synthetic.{self._word(SYLLABLES_EN)}.{idx}" for idx in range(count)]
+        original, reference, translation = [], [], []
+        for idx, key in enumerate(keys):
+            if idx % 50 == 0:
+                original.append(f"# {self._sentence(SYLLABLES_EN, 3)}\n")
+                original.append("\n")
+            original.append(f"{key}={self._sentence(SYLLABLES_RU)}\n")
+            if self._random.random() < 0.95:
+                reference.append(f"{key}={self._sentence(SYLLABLES_EN)}\n")
+            if self._random.random() < 0.6:
+                translation.append(f"{key}={self._sentence(SYLLABLES_ZH, joiner='')}\n")
+        reference.extend(f"synthetic.reference_only.{idx}={self._sentence(SYLLABLES_EN)}\n" for idx in range(count // 100))
+        translation.extend(f"synthetic.translation_only.{idx}={self._sentence(SYLLABLES_ZH, joiner='')}\n" for idx in range(count // 200))
+
+        self._write("original", folder / "ru_RU.lang", "".join(original))
+        self._write("reference", folder / "en_US.lang", "".join(reference))
+        self._write("translation", folder / "zh_CN.lang", "".join(translation))
+
+    def _json_lang(self, folder: Path, count: int):
+        keys = [f"synthetic.{self._word(SYLLABLES_EN)}.{idx}" for idx in range(count)]
+        original = {key: self._sentence(SYLLABLES_RU) for key in keys}
+        reference = {key: self._sentence(SYLLABLES_EN) for key in keys if self._random.random() < 0.95}
+        reference.update({f"synthetic.reference_only.{idx}": self._sentence(SYLLABLES_EN) for idx in range(count // 100)})
+        translation = {key: self._sentence(SYLLABLES_ZH, joiner="") for key in keys if self._random.random() < 0.6}
+
+        self._write("original", folder / "ru_ru.json", json.dumps(original, ensure_ascii=False, indent=2))
+        self._write("reference", folder / "en_us.json", json.dumps(reference, ensure_ascii=False, indent=2))
+        self._write("translation", folder / "zh_cn.json", json.dumps(translation, ensure_ascii=False, indent=2))
+
+    def _lines(self, filepath: Path, count: int, *, extra: bool, words: tuple[int, int] = (3, 12)):
+        original = [self._sentence(SYLLABLES_RU, self._random.randint(*words)) for _ in range(count)]
+        reference = [self._sentence(SYLLABLES_EN, self._random.randint(*words)) for _ in range(count)]
+        translation = [self._sentence(SYLLABLES_ZH, self._random.randint(*words), joiner="") for _ in range(count)]
+        if self._random.random() < 0.2:  # reference files sometimes drift from the original
+            del reference[self._random.randrange(len(reference))]
+        if self._random.random() < 0.1:
+            translation.append(self._sentence(SYLLABLES_ZH, joiner=""))
+
+        self._write("original", filepath, "\n".join(original) + "\n")
+        self._write("reference", filepath, "\n".join(reference) + "\n")
+        if self._random.random() < 0.7:
+            self._write("translation", filepath, "\n".join(translation) + "\n")
+        if extra and self._random.random() < 0.1:
+            self._write("translation_extra", filepath, self._sentence(SYLLABLES_ZH, joiner="") + "\n")
+
+    def _plaintext(self, filepath: Path):
+        paragraphs = [self._sentence(SYLLABLES_RU, 40) for _ in range(self._random.randint(2, 6))]
+        self._write("original", filepath, "\n\n".join(paragraphs))
+        self._write("reference", filepath, "\n\n".join(self._sentence(SYLLABLES_EN, 40) for _ in paragraphs))
+
+    def _renewed_speech(self, filepath: Path, count: int):
+        speech, left = [], count
+        while left > 0:
+            lines = min(left, self._random.randint(1, 5))
+            speech.append({
+                "conditions": [{"type": "lotr:faction", "faction": self._word(SYLLABLES_EN)}],
+                "lines": [self._sentence(SYLLABLES_EN) for _ in range(lines)],
+            })
+            left -= lines
+        self._write("original", filepath, json.dumps({"speech": speech}, ensure_ascii=False, indent=2))
+
+    def _dialog(self, filepath: Path, count: int):
+        def render(syllables: list[str], joiner: str = " ") -> str:
+            options = ",\n".join(
+                DIALOG_OPTION_TEMPLATE.format(slot=slot, dialog=self._random.randint(1, 9999), title=self._sentence(syllables, joiner=joiner))
+                for slot in range(max(0, count - 1))
+            )
+            return DIALOG_TEMPLATE.format(
+                options=options,
+                title=self._word(SYLLABLES_EN).title(),
+                text=self._paragraphs(syllables, joiner=joiner),
+            )
+
+        self._write("original", filepath, render(SYLLABLES_EN))
+        if self._random.random() < 0.3:
+            self._write("translation", filepath, render(SYLLABLES_ZH, joiner=""))
+
+    def _quest(self, filepath: Path):
+        def render(syllables: list[str], joiner: str = " ") -> str:
+            return QUEST_TEMPLATE.format(
+                npc=self._word(SYLLABLES_EN).title(),
+                title=self._sentence(syllables, 3, joiner=joiner),
+                text=self._paragraphs(syllables, joiner=joiner),
+                complete_text=self._paragraphs(syllables, joiner=joiner),
+                location=self._word(SYLLABLES_EN),
+            )
+
+        self._write("original", filepath, render(SYLLABLES_EN))
+        if self._random.random() < 0.3:
+            self._write("translation", filepath, render(SYLLABLES_ZH, joiner=""))
+
+    """ HELPERS """
+    def _word(self, syllables: list[str]) -> str:
+        return "".join(self._random.choices(syllables, k=self._random.randint(1, 4)))
+
+    def _sentence(self, syllables: list[str], words: int | None = None, joiner: str = " ") -> str:
+        words = words or self._random.randint(3, 12)
+        sentence = joiner.join(self._word(syllables) for _ in range(words))
+        if self._random.random() < 0.2:
+            sentence = f"{sentence}, #!"
+        elif self._random.random() < 0.1:
+            sentence = f"§e{sentence} %s§r"
+        return sentence
+
+    def _paragraphs(self, syllables: list[str], joiner: str = " ") -> str:
+        """multiline text as in CustomNPCs files, where newlines are raw"""
+        return "\n\n".join(self._sentence(syllables, joiner=joiner) for _ in range(self._random.randint(1, 3)))
+
+    def _write(self, kind: str, relative_path: Path, content: str):
+        filepath = self._root / kind / relative_path
+        os.makedirs(filepath.parent, exist_ok=True)
+        with open(filepath, "w", encoding="utf-8") as fp:
+            fp.write(content)
+
+
+__all__ = [
+    "CorpusGenerator",
+]
@@ -0,0 +1,184 @@
+"""
+Round trip of every source file through convert and restore with no translations, in memory.
+
+    python cli.py verify              # every file under 1-SourceFile/original
+    python cli.py verify --jobs 1     # in this process, for debugging
+"""
+import datetime
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from typing import Sequence
+
+from src.core import DIR_ORIGINAL, Project
+from src.log import logger
+from src.metrics import DIR_REPORTS
+
+CHUNKSIZE = 16  # files handed to a worker at once
+SNIPPET = 40  # bytes shown on each side of the first difference
+
+
+def round_trip(relative_path: Path) -> dict:
+    """
+    converting with only the original, no reference nor translation, then
+    restoring the entries untouched, has to give the original bytes back.
+    The original is decoded like convert reads it and the result encoded
+    like restore writes it, then both are compared as bytes: line endings
+    turned into \n or a final newline added are "newline", any other
+    change is "different".
+    :param relative_path: 相对于 original 文件夹的路径
+    """
+    started = time.perf_counter()
+    result = {"path": relative_path.as_posix(), "file_type": None, "status": "identical", "bytes": 0}
+    try:
+        if not (file_type := Project.categorize(relative_path)):
+            return {**result, "status": "unknown"}
+        result["file_type"] = file_type.name
+        handler = Project.handler(file_type)
+
+        expected = (DIR_ORIGINAL / relative_path).read_bytes()
+        result["bytes"] = len(expected)
+        try:
+            text = io.TextIOWrapper(io.BytesIO(expected), encoding="utf-8").read()  # universal newlines, as convert reads
+        except UnicodeDecodeError:
+            return {**result, "status": "encoding"}
+
+        datas = handler.extract(
+            relative_path,
+            original=handler.read(io.StringIO(text)),
+            reference=None, reference_flag=False,
+            translation=None, translation_flag=False,
+            translation_extra=None, translation_extra_flag=False,
+        )
+        download = json.loads(json.dumps([asdict(_) for _ in datas], ensure_ascii=False))  # as paratranz gives it back
+        restored = handler.restore(
+            relative_path,
+            original=handler.read(io.StringIO(text)),
+            download=download,
+            translation_extra_flag=False,
+            filepath_translation_extra=None,
+            output=None,
+        )
+        buffer = io.BytesIO()
+        fp = io.TextIOWrapper(buffer, encoding="utf-8")  # default newlines, as restore writes
+        Project.write(restored, fp, file_type)
+        fp.flush()
+        fp.detach()
+        actual = buffer.getvalue()
+    except Exception as e:
+        return {**result, "status": "failed", "detail": f"{type(e).__name__}: {e}", "seconds": time.perf_counter() - started}
+
+    result["seconds"] = time.perf_counter() - started
+    if actual != expected:
+        status = "newline" if _lines(actual) == _lines(expected) else "different"
+        result.update(status=status, **_difference(expected, actual))
+    return result
+
+
+def _lines(content: bytes) -> bytes:
+    """content with every line ending as \n and no final newline"""
+    return content.replace(b"\r\n", b"\n").replace(b"\r", b"\n").removesuffix(b"\n")
+
+
+def _difference(expected: bytes, actual: bytes) -> dict:
+    offset = next((idx for idx, (a, b) in enumerate(zip(expected, actual)) if a != b), min(len(expected), len(actual)))
+    line = expected.count(b"\n", 0, offset) + 1
+    return {
+        "offset": offset,
+        "line": line,
+        "size": len(actual) - len(expected),
+        "expected": expected[max(0, offset - SNIPPET):offset + SNIPPET].decode("utf-8", "ignore"),  # cut characters dropped
+        "actual": actual[max(0, offset - SNIPPET):offset + SNIPPET].decode("utf-8", "ignore"),
+    }
+
+
+class Verification:
+    """Round trips the whole original folder in worker processes, nothing is written but the report."""
+    def __init__(self, jobs: int | None = None):
+        self._jobs = jobs or os.cpu_count() or 1
+        self._results: list[dict] = []
+        self._seconds = 0.0
+
+    def run(self, relative_paths: Sequence[Path] | None = None) -> list[dict]:
+        """:param relative_paths: 相对于 original 文件夹的路径，默认为全部文件"""
+        logger.info("")
+        logger.info("======= VERIFY START =======")
+        if relative_paths is None:
+            relative_paths = sorted(
+                (Path(root) / file).relative_to(DIR_ORIGINAL)
+                for root, dirs, files in os.walk(DIR_ORIGINAL) for file in files
+            )
+
+        started = time.perf_counter()
+        if self._jobs == 1:
+            self._results = [round_trip(_) for _ in relative_paths]
+        else:
+            with ProcessPoolExecutor(max_workers=self._jobs) as executor:
+                self._results = list(executor.map(round_trip, relative_paths, chunksize=CHUNKSIZE))
+        self._seconds = time.perf_counter() - started
+
+        for result in self._results:
+            if result["status"] == "different":
+                logger.bind(filepath=result["path"]).warning(f"Round trip differs at line {result['line']}, {result['size']:+} bytes")
+            elif result["status"] == "newline":
+                logger.bind(filepath=result["path"]).info(f"Round trip changes line endings from line {result['line']}, {result['size']:+} bytes")
+            elif result["status"] in ("failed", "encoding"):
+                logger.bind(filepath=result["path"]).error(f"Round trip {result['status']} {result.get('detail', '')}")
+        for name, total in sorted(self.file_types().items()):
+            logger.info(
+                f"{name:<24}{total['files']:>6} files {total['identical']:>6} identical {total['newline']:>6} newline {total['different']:>6} different "
+                f"{total['failed']:>4} failed  {total['bytes'] / 1024 / 1024 / total['seconds'] if total['seconds'] else 0:>7.1f}MB/s"
+            )
+        size = sum(_["bytes"] for _ in self._results)
+        logger.success(
+            f"Verified {len(self._results)} files in {self._seconds:.2f}s with {self._jobs} jobs, "
+            f"{len(self._results) / self._seconds if self._seconds else 0:.0f} files/s, {size / 1024 / 1024 / self._seconds if self._seconds else 0:.1f}MB/s"
+        )
+        return self._results
+
+    def file_types(self) -> dict[str, dict]:
+        """totals per file type, seconds are summed over workers"""
+        totals = {}
+        for result in self._results:
+            total = totals.setdefault(result["file_type"] or "UNKNOWN", {
+                "files": 0, "identical": 0, "newline": 0, "different": 0, "failed": 0, "bytes": 0, "seconds": 0.0,
+            })
+            total["files"] += 1
+            total["bytes"] += result["bytes"]
+            total["seconds"] += result.get("seconds", 0.0)
+            status = result["status"]
+            total[status if status in ("identical", "newline", "different") else "failed"] += 1
+        return totals
+
+    def save(self) -> Path:
+        os.makedirs(DIR_REPORTS, exist_ok=True)
+        filepath = DIR_REPORTS / f'{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.verify.json'
+        report = {
+            "jobs": self._jobs,
+            "seconds": self._seconds,
+            "file_types": self.file_types(),
+            "files": [_ for _ in self._results if _["status"] != "identical"],
+        }
+        with open(filepath, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=2)
+        logger.bind(filepath=filepath).success("Verify report saved")
+        return filepath
+
+    @property
+    def results(self) -> list[dict]:
+        return self._results
+
+    @property
+    def ok(self) -> bool:
+        """only line endings changed counts as surviving, the report still lists those files"""
+        return all(_["status"] in ("identical", "newline") for _ in self._results)
+
+
+__all__ = [
+    "Verification",
+    "round_trip",
+]
@@ -0,0 +1,183 @@
+"""Reconvert source files incrementally when they change."""
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from src.config import settings
+from src.core import (
+    DIR_ORIGINAL,
+    DIR_REFERENCE,
+    DIR_TRANSLATION,
+    DIR_TRANSLATION_EXTRA,
+    Conversion,
+    FileType,
+    Project,
+)
+from src.log import logger, setup_logger
+
+try:
+    from watchdog.events import FileSystemEvent, FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional, falls back to polling
+    Observer = None
+
+SOURCE_DIRS = (DIR_ORIGINAL, DIR_REFERENCE, DIR_TRANSLATION, DIR_TRANSLATION_EXTRA)
+
+
+class SourceWatcher:
+    """
+    Watch the four source folders, collect events until none arrived for
+    `debounce` seconds, then convert only the original files they affect.
+
+    Uses watchdog (inotify / FSEvents / ReadDirectoryChangesW) when installed,
+    otherwise scans modification times every `interval` seconds.
+    """
+    def __init__(
+        self,
+        conversion: Conversion | None = None,
+        debounce: float = settings.watch.debounce,
+        interval: float = settings.watch.interval,
+    ):
+        self._conversion = conversion or Conversion()
+        self._debounce = debounce
+        self._interval = interval
+        self._events: queue.Queue[Path] = queue.Queue()
+        self._stopped = threading.Event()
+
+    def run(self):
+        for directory in SOURCE_DIRS:
+            os.makedirs(directory, exist_ok=True)
+
+        if Observer is not None:
+            observer = Observer()
+            handler = _EventHandler(self._events)
+            for directory in SOURCE_DIRS:
+                observer.schedule(handler, str(directory), recursive=True)
+            observer.start()
+        else:
+            observer = None
+            threading.Thread(target=self._poll, daemon=True).start()
+        logger.info(f"Watching source files ({'events' if observer else 'polling'}), press Ctrl+C to stop")
+
+        try:
+            while not self._stopped.is_set():
+                try:
+                    filepaths = {self._events.get(timeout=self._interval)}
+                except queue.Empty:
+                    continue
+                while True:  # debounce bursts, e.g. editors saving via temp files
+                    try:
+                        filepaths.add(self._events.get(timeout=self._debounce))
+                    except queue.Empty:
+                        break
+                self.handle(filepaths)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def stop(self):
+        self._stopped.set()
+
+    def handle(self, filepaths: set[Path]):
+        affected: set[Path] = set()
+        for filepath in filepaths:
+            affected |= self.affected(filepath)
+
+        for relative_path in sorted(affected):
+            if not (DIR_ORIGINAL / relative_path).exists():
+                self._remove_converted(relative_path)
+                continue
+            start = time.perf_counter()
+            if self.conversion.convert_file(relative_path):
+                logger.bind(filepath=relative_path).success(f"Reconverted in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    @staticmethod
+    def affected(filepath: Path) -> set[Path]:
+        """original files (relative to original folder) whose conversion reads the changed file"""
+        for directory in SOURCE_DIRS:
+            if filepath.is_relative_to(directory):
+                relative_path = filepath.relative_to(directory)
+                break
+        else:
+            return set()
+
+        if directory == DIR_ORIGINAL:
+            return {relative_path}
+        if (DIR_ORIGINAL / relative_path).exists():
+            return {relative_path}
+
+        # lang siblings are named after their own language, e.g. en_US.lang for ru_RU.lang
+        file_type = Project.categorize(relative_path)
+        if file_type not in {FileType.LANG, FileType.JSON_LANG} or not (DIR_ORIGINAL / relative_path.parent).is_dir():
+            return set()
+        return {
+            relative_path.parent / file.name
+            for file in (DIR_ORIGINAL / relative_path.parent).iterdir()
+            if file.is_file() and Project.categorize(relative_path.parent / file.name) == file_type
+        }
+
+    @staticmethod
+    def _remove_converted(relative_path: Path):
+        filepath = settings.filepath.root / settings.filepath.converted / relative_path.parent / f"{relative_path.name}.json"
+        if filepath.exists():
+            filepath.unlink()
+            logger.bind(filepath=relative_path).success("Original removed, converted file deleted")
+
+    def _poll(self):
+        snapshot = self._snapshot()
+        while not self._stopped.wait(self._interval):
+            current = self._snapshot()
+            for filepath in current.keys() | snapshot.keys():
+                if current.get(filepath) != snapshot.get(filepath):
+                    self._events.put(filepath)
+            snapshot = current
+
+    @staticmethod
+    def _snapshot() -> dict[Path, tuple[int, int]]:
+        snapshot = {}
+        for directory in SOURCE_DIRS:
+            for root, dirs, files in os.walk(directory):
+                for file in files:
+                    filepath = Path(root) / file
+                    try:
+                        stat = filepath.stat()
+                    except FileNotFoundError:
+                        continue
+                    snapshot[filepath] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    @property
+    def conversion(self) -> Conversion:
+        return self._conversion
+
+
+if Observer is not None:
+    class _EventHandler(FileSystemEventHandler):
+        def __init__(self, events: queue.Queue[Path]):
+            self._events = events
+
+        def on_any_event(self, event: FileSystemEvent):
+            if event.is_directory or event.event_type in {"opened", "closed_no_write"}:
+                return
+            self._events.put(Path(os.fsdecode(event.src_path)))
+            if dest_path := getattr(event, "dest_path", ""):
+                self._events.put(Path(os.fsdecode(dest_path)))
+
+
+def main():
+    setup_logger()
+    SourceWatcher().run()
+
+
+__all__ = [
+    "SourceWatcher",
+]
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,29 @@
 import asyncio
-import json
-
-import paratranz_client
-from selenium import webdriver
 
+from src.codec import codec
 from src.config import settings
 from src.huijiwiki import LoTRWiki
-from src.log import logger
+from src.log import logger, setup_logger
+from src.metrics import metrics
 
 
 async def main(force: bool = False):
+    import paratranz_client
+    from selenium import webdriver
+
     with webdriver.Edge() as driver:
         wiki = LoTRWiki(driver)
 
         filepath = settings.filepath.root / settings.filepath.resource / wiki.project_name / "translations.json"
         if filepath.exists() and not force:
             with filepath.open("r", encoding="utf-8") as fp:
-                results = json.load(fp)
+                results = codec.load(fp)
         else:
             urls = wiki.get_target_urls()
             datas = wiki.get_data(urls)
             results = wiki.process_paratranz_models(datas)
 
-    configuration = paratranz_client.Configuration(host="https://paratranz.cn/api")
+    configuration = paratranz_client.Configuration(host=settings.paratranz.base_url)
     configuration.api_key["Token"] = settings.paratranz.token
     async with paratranz_client.ApiClient(configuration) as api_client:
         files_api = paratranz_client.FilesApi(api_client)
@@ -50,4 +51,10 @@ async def main(force: bool = False):
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    setup_logger()
+    if settings.project.profile_memory:
+        metrics.profile_memory()
+    try:
+        asyncio.run(main())
+    finally:
+        metrics.finish()
@@ -0,0 +1,6 @@
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("PARATRANZ_PROJECT_ID", "0")  # settings need one, nothing here talks to paratranz
+sys.path.insert(0, str(Path(__file__).parent.parent))
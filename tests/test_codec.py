@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from src.codec import Codec
+
+orjson = pytest.importorskip("orjson")
+
+ENTRIES = [
+    {"key": "item.sword.name", "original": "Sword of the Dúnedain", "translation": "杜内丹之剑", "context": ""},
+    {"key": "BLANK_3", "original": "", "translation": "", "context": "lang/en_US.lang"},
+    {"key": "quote", "original": 'say "hi" \\ then\tleave\n', "translation": "", "context": "\x00\x1f\x7f    😀"},
+    {"key": "nested", "original": [], "translation": {"count": 3, "negative": -2 ** 63, "flag": True, "none": None}},
+]
+
+
+@pytest.mark.parametrize("indent", [2, None])
+def test_orjson_text_is_that_of_json(indent: int | None):
+    """entries of the converters, written by orjson, byte for byte what json writes"""
+    fast, slow = Codec("orjson"), Codec("json")
+    assert fast.name == "orjson"
+    for obj in (ENTRIES, *ENTRIES, []):
+        assert fast.dumps(obj, indent, exact=True).encode("utf-8") == slow.dumps(obj, indent).encode("utf-8")
+
+
+@pytest.mark.parametrize("obj", [
+    {"too big": 2 ** 64},
+    {1: "key other than a string"},
+    {"lone surrogate": "\ud800"},
+], ids=["int", "key", "surrogate"])
+def test_orjson_refusals_fall_back_to_json(obj):
+    assert Codec("orjson").dumps(obj, exact=True) == json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+def test_floats_not_marked_exact_go_to_json():
+    obj = {"big": 1e16, "small": 1e-7, "nan": float("nan")}
+    assert Codec("orjson").dumps(obj) == json.dumps(obj, ensure_ascii=False, indent=2)
+    assert Codec("orjson").dumps(obj, indent=None) == json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def test_indent_other_than_two_goes_to_json():
+    assert Codec("orjson").dumps(ENTRIES, indent=4, exact=True) == json.dumps(ENTRIES, ensure_ascii=False, indent=4)
+
+
+def test_loads_falls_back_to_json():
+    codec = Codec("orjson")
+    assert codec.loads('{"a": [1, "二"]}') == {"a": [1, "二"]}
+    assert json.dumps(codec.loads('[NaN, 18446744073709551616]')) == "[NaN, 18446744073709551616]"
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads("{")
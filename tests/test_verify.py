@@ -0,0 +1,31 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from src.core import DIR_ORIGINAL
+from src.verify import round_trip
+
+SAMPLES = sorted(
+    (Path(root) / file).relative_to(DIR_ORIGINAL)
+    for root, dirs, files in os.walk(DIR_ORIGINAL) for file in files
+)
+
+
+@pytest.mark.parametrize("relative_path", SAMPLES, ids=lambda _: _.as_posix())
+def test_round_trip_samples(relative_path: Path):
+    """crlf, stray cr and missing final newlines in the samples only change line endings"""
+    result = round_trip(relative_path)
+    assert result["status"] in ("identical", "newline"), result
+
+
+def test_round_trip_reports_newline_changes():
+    """the lang sample has no final newline, restoring adds one"""
+    result = round_trip(Path("LOTRReworked/lang/ru_RU.lang"))
+    assert result["status"] == "newline", result
+    assert (result["size"], result["offset"]) == (1, result["bytes"])
+
+
+def test_round_trip_keeps_identical_bytes():
+    result = round_trip(Path("LOTRReworked/lore/a dwarf.txt"))
+    assert result["status"] == "identical", result